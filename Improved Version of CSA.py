@@ -11,12 +11,24 @@ import pandas as pd
 from matplotlib import pyplot as plt
 import seaborn as sns
 
+from csa import dedup, features, timeseries, topk
+from csa.customers import customer_metrics
+from csa.dates import normalize_order_dates
+from csa.schema import compact, memory_report
+from csa.trace import stage
+
 
 # In[2]:
 
 
-df = pd.read_csv('sales_data_sample.csv', encoding='unicode_escape')
-df
+with stage('ingest'):
+    df = pd.read_csv('sales_data_sample.csv', encoding='unicode_escape')
+
+# Categorical string columns and the smallest lossless integer types
+df_compact = compact(df)
+compact_report = memory_report(df, df_compact)
+df = df_compact
+compact_report
 
 
 # In[3]:
@@ -54,8 +66,9 @@ pd.isnull(df).sum()
 # In[8]:
 
 
-df.drop(columns=['ADDRESS_LINE2'], inplace=True)
-# Shouldn't run this during analysis again, as this column is removed already
+with stage('clean'):
+    df.drop(columns=['ADDRESS_LINE2'], inplace=True)
+    # Shouldn't run this during analysis again, as this column is removed already
 
 
 # In[9]:
@@ -81,28 +94,31 @@ df.describe()
 # In[12]:
 
 
-plt.figure(figsize=(7, 4))
-plt.boxplot(df['SALES'])
-plt.show()
+with stage('render:sales_boxplot'):
+    plt.figure(figsize=(7, 4))
+    plt.boxplot(df['SALES'])
+    plt.show()
 
 
 # In[13]:
 
 
-df.duplicated()
+# Row fingerprints, as the index that deduplicates across loads uses
+dedup.duplicated(df)
 
 
 # In[14]:
 
 
-df[df.duplicated()]
+df[dedup.duplicated(df)]
 
 
 # In[15]:
 
 
 # Rename column
-df.rename(columns= {'PRICE_EACH':'UNIT_PRICE'}, inplace=True)
+with stage('clean'):
+    df.rename(columns= {'PRICE_EACH':'UNIT_PRICE'}, inplace=True)
 
 
 # In[16]:
@@ -119,14 +135,10 @@ df.columns
 
 
 # standardizing the 'ORDER_DATE' Column
-def standardize_date(date_str):
-    try:
-        return pd.to_datetime(date_str)
-    except ValueError:
-        return None
-    
-df['ORDER_DATE'] = df['ORDER_DATE'].apply(standardize_date)
-df
+# Both layouts (M/D/YYYY H:MM and MM-DD-YYYY HH:MM) are parsed with an explicit
+# format, once per distinct date string, instead of row by row
+df['ORDER_DATE'], date_report = normalize_order_dates(df['ORDER_DATE'])
+date_report
 
 
 # ## Date Handling
@@ -137,7 +149,8 @@ df
 
 
 # Adding a column for the day of the week
-df['DAY_OF_WEEK'] = df['ORDER_DATE'].dt.day_name()
+with stage('derive'):
+    df['DAY_OF_WEEK'] = features.day_of_week(df['ORDER_DATE'])
 
 
 # In[19]:
@@ -150,15 +163,16 @@ df['DAY_OF_WEEK']
 
 
 # Grouping and Summarizing
-df.groupby('DAY_OF_WEEK')['SALES'].sum()
+df.groupby('DAY_OF_WEEK', observed=True)['SALES'].sum()
 
 
 # In[21]:
 
 
-sales_by_day = df.groupby('DAY_OF_WEEK', 
-                          as_index=False)['SALES'].sum().sort_values(
-    by='SALES', ascending=False)
+with stage('rollup:sales_by_day'):
+    sales_by_day = df.groupby('DAY_OF_WEEK', observed=True,
+                              as_index=False)['SALES'].sum().sort_values(
+        by='SALES', ascending=False)
 
 sales_by_day
 
@@ -167,24 +181,26 @@ sales_by_day
 
 
 # Analyzing if Sales are higher on certain Days
-plt.figure(figsize=(7, 3))
-plt.barh(sales_by_day['DAY_OF_WEEK'], sales_by_day['SALES'], color = '#94fc03')
-plt.title('Total Sales by Day of the Week')
-plt.xlabel('Day of the Week')
-plt.ylabel('Total Sales')
-plt.show()
+with stage('render:sales_by_day_barh'):
+    plt.figure(figsize=(7, 3))
+    plt.barh(sales_by_day['DAY_OF_WEEK'], sales_by_day['SALES'], color = '#94fc03')
+    plt.title('Total Sales by Day of the Week')
+    plt.xlabel('Day of the Week')
+    plt.ylabel('Total Sales')
+    plt.show()
 
 
 # In[23]:
 
 
 # Same as above
-plt.figure(figsize=(7, 3))
-sns.barplot(data = sales_by_day, x = 'DAY_OF_WEEK', y = 'SALES', color = '#94fc03')
-plt.title('Total Sales by Day of the Week')
-plt.xlabel('Day of the Week')
-plt.ylabel('Total Sales')
-plt.show()
+with stage('render:sales_by_day_bar'):
+    plt.figure(figsize=(7, 3))
+    sns.barplot(data = sales_by_day, x = 'DAY_OF_WEEK', y = 'SALES', color = '#94fc03')
+    plt.title('Total Sales by Day of the Week')
+    plt.xlabel('Day of the Week')
+    plt.ylabel('Total Sales')
+    plt.show()
 
 
 # <b style="color:blue; font-size:16px">Seasonal Trends</b>
@@ -192,26 +208,20 @@ plt.show()
 # In[24]:
 
 
-def get_season(month):
-    if month in [12, 1, 2]:
-        return 'Winter'
-    elif month in [3, 4, 5]:
-        return 'Spring'
-    elif month in [6, 7, 8]:
-        return 'Summer'
-    else:
-        return 'Fall'
+# Winter: Dec-Feb, Spring: Mar-May, Summer: Jun-Aug, Fall: Sep-Nov
+with stage('derive'):
+    df['SEASON'] = features.season(df['ORDER_DATE'])
 
-df['SEASON'] = df['ORDER_DATE'].dt.month.apply(get_season)
 df[['ORDER_DATE', 'SEASON']].head()
 
 
 # In[25]:
 
 
-sales_by_season = df.groupby('SEASON', 
-                          as_index=False)['SALES'].sum().sort_values(
-    by='SALES', ascending=False)
+with stage('rollup:sales_by_season'):
+    sales_by_season = df.groupby('SEASON', observed=True,
+                              as_index=False)['SALES'].sum().sort_values(
+        by='SALES', ascending=False)
 
 sales_by_season
 
@@ -220,27 +230,29 @@ sales_by_season
 
 
 # Analyzing if there are any Seasonal effects on Sales
-plt.figure(figsize=(7, 3))
-plt.barh(sales_by_season['SEASON'], sales_by_season['SALES'], color = '#94fc03')
-plt.title('Total Sales by Season')
-plt.xlabel('Season')
-plt.ylabel('Total Sales')
-plt.show()
+with stage('render:sales_by_season_barh'):
+    plt.figure(figsize=(7, 3))
+    plt.barh(sales_by_season['SEASON'], sales_by_season['SALES'], color = '#94fc03')
+    plt.title('Total Sales by Season')
+    plt.xlabel('Season')
+    plt.ylabel('Total Sales')
+    plt.show()
 
 
 # In[27]:
 
 
 # Analyzing if there are any Seasonal effects on Sales (Same as Above)
-plt.figure(figsize=(7, 3))
-plt.fill_between(sales_by_season['SEASON'], sales_by_season['SALES'], 
-                 color = '#94fc03', alpha = 0.5)
-plt.plot(sales_by_season['SEASON'], sales_by_season['SALES'], 
-         marker = 'o', color = 'g')
-plt.title('Total Sales by Season')
-plt.xlabel('Season')
-plt.ylabel('Total Sales')
-plt.show()
+with stage('render:sales_by_season_area'):
+    plt.figure(figsize=(7, 3))
+    plt.fill_between(sales_by_season['SEASON'], sales_by_season['SALES'], 
+                     color = '#94fc03', alpha = 0.5)
+    plt.plot(sales_by_season['SEASON'], sales_by_season['SALES'], 
+             marker = 'o', color = 'g')
+    plt.title('Total Sales by Season')
+    plt.xlabel('Season')
+    plt.ylabel('Total Sales')
+    plt.show()
 
 
 # ### Time Series Analysis
@@ -262,7 +274,8 @@ df['SALES'].head(3).mean()
 # In[30]:
 
 
-df['SALES'].rolling(window=3).mean().head(10)
+daily_sales = timeseries.sales_series(df, freq='D')
+timeseries.rolling_stats(daily_sales, windows=[3], stats=['mean']).head(10)
 
 
 # - <p style="color:purple">In time series analysis, 
@@ -288,9 +301,10 @@ df['SALES'].rolling(window=3).mean().head(10)
 # In[31]:
 
 
-sales_by_qtr = df.groupby('QTR_ID', 
-           as_index=False)['SALES'].sum().sort_values(
-    by='SALES', ascending=False)
+with stage('rollup:sales_by_qtr'):
+    sales_by_qtr = df.groupby('QTR_ID', 
+               as_index=False)['SALES'].sum().sort_values(
+        by='SALES', ascending=False)
 
 sales_by_qtr
 
@@ -298,13 +312,14 @@ sales_by_qtr
 # In[32]:
 
 
-plt.figure(figsize=(10, 4))
-plt.plot(sales_by_qtr['SALES'], sales_by_qtr['QTR_ID'], 
-         '*', ms = 10, ls = '-.', lw = 2, c = '#5604b5')
-plt.title('Total Sales Quarterly')
-plt.xlabel('Quarter')
-plt.ylabel('Total Sales')
-plt.show()
+with stage('render:sales_by_qtr'):
+    plt.figure(figsize=(10, 4))
+    plt.plot(sales_by_qtr['SALES'], sales_by_qtr['QTR_ID'], 
+             '*', ms = 10, ls = '-.', lw = 2, c = '#5604b5')
+    plt.title('Total Sales Quarterly')
+    plt.xlabel('Quarter')
+    plt.ylabel('Total Sales')
+    plt.show()
 
 
 # <div style="color:purple; border:2px solid green; padding:5px; ">
@@ -319,9 +334,10 @@ plt.show()
 # In[33]:
 
 
-sales_by_month = df.groupby('MONTH_ID', 
-           as_index=False)['SALES'].sum().sort_values(
-    by='SALES', ascending=False)
+with stage('rollup:sales_by_month'):
+    sales_by_month = df.groupby('MONTH_ID', 
+               as_index=False)['SALES'].sum().sort_values(
+        by='SALES', ascending=False)
 
 sales_by_month
 
@@ -329,13 +345,14 @@ sales_by_month
 # In[34]:
 
 
-plt.figure(figsize=(10, 4))
-plt.plot(sales_by_month['SALES'], sales_by_month['MONTH_ID'], 
-         'p', ms = 15, mfc = 'w', mec = '#05a30b', ls = '-', lw = 3, c = '#06d40a')
-plt.title('Total Sales by Month')
-plt.xlabel('Month')
-plt.ylabel('Total Sales')
-plt.show()
+with stage('render:sales_by_month'):
+    plt.figure(figsize=(10, 4))
+    plt.plot(sales_by_month['SALES'], sales_by_month['MONTH_ID'], 
+             'p', ms = 15, mfc = 'w', mec = '#05a30b', ls = '-', lw = 3, c = '#06d40a')
+    plt.title('Total Sales by Month')
+    plt.xlabel('Month')
+    plt.ylabel('Total Sales')
+    plt.show()
 
 
 # <div style="color:purple; border:2px solid green; padding:5px; ">
@@ -350,9 +367,10 @@ plt.show()
 # In[35]:
 
 
-sales_by_year = df.groupby('YEAR_ID', 
-           as_index=False)['SALES'].sum().sort_values(
-    by='SALES', ascending=False)
+with stage('rollup:sales_by_year'):
+    sales_by_year = df.groupby('YEAR_ID', 
+               as_index=False)['SALES'].sum().sort_values(
+        by='SALES', ascending=False)
 
 sales_by_year
 
@@ -360,13 +378,14 @@ sales_by_year
 # In[36]:
 
 
-plt.figure(figsize=(10, 4))
-plt.plot(sales_by_year['SALES'], sales_by_year['YEAR_ID'], 
-        'H', ms = 10, ls = ':', lw = 2, c = '#0758fa')
-plt.title('Total Sales by Year')
-plt.xlabel('Year')
-plt.ylabel('Total Sales')
-plt.show()
+with stage('render:sales_by_year'):
+    plt.figure(figsize=(10, 4))
+    plt.plot(sales_by_year['SALES'], sales_by_year['YEAR_ID'], 
+            'H', ms = 10, ls = ':', lw = 2, c = '#0758fa')
+    plt.title('Total Sales by Year')
+    plt.xlabel('Year')
+    plt.ylabel('Total Sales')
+    plt.show()
 
 
 # <div style="color:purple; border:2px solid green; padding:5px; ">
@@ -389,24 +408,28 @@ plt.show()
 
 
 # Adding a discount column
-df['DISCOUNT'] = ((df['MSRP'] - df['UNIT_PRICE']) / df['MSRP']) * 100
-df['DISCOUNT'] = round(df['DISCOUNT'].apply(lambda x: max(x, 0)), 2)
+# (MSRP - UNIT_PRICE) / MSRP in percent, floored at 0 and rounded to 2 places
+with stage('derive'):
+    df['DISCOUNT'] = features.discount(df['MSRP'], df['UNIT_PRICE'])
 
 
 # In[38]:
 
 
 # Categorize Discounts
-bins = [0, 10, 20, 30, 50, 100]
-labels = ['0-10%', '10-20%', '20-30%', '30-50%', '50-100%']
-df['DISCOUNT_CATEGORY'] = pd.cut(df['DISCOUNT'], bins=bins, labels=labels, right=False)
+with stage('derive'):
+    bins = [0, 10, 20, 30, 50, 100]
+    labels = ['0-10%', '10-20%', '20-30%', '30-50%', '50-100%']
+    df['DISCOUNT_CATEGORY'] = features.discount_category(df['DISCOUNT'], bins, labels)
 
 
 # In[39]:
 
 
-sales_vol_by_discount = df.groupby('DISCOUNT_CATEGORY', 
-                                   observed=False)['QUANTITY_ORDERED'].sum().reset_index()
+with stage('rollup:sales_vol_by_discount'):
+    sales_vol_by_discount = df.groupby('DISCOUNT_CATEGORY', 
+                                       observed=False)['QUANTITY_ORDERED'].sum().reset_index()
+
 sales_vol_by_discount
 
 
@@ -414,13 +437,14 @@ sales_vol_by_discount
 
 
 # Sales vs. Discounts
-plt.figure(figsize=(10, 4))
-sns.barplot(data = sales_vol_by_discount, x = 'DISCOUNT_CATEGORY', y = 'QUANTITY_ORDERED', 
-            hue = 'DISCOUNT_CATEGORY', palette = 'gist_rainbow')
-plt.title('Sales Volume by Discount Category')
-plt.xlabel('Discount Category')
-plt.ylabel('Sales Volume')
-plt.show()
+with stage('render:sales_vol_by_discount'):
+    plt.figure(figsize=(10, 4))
+    sns.barplot(data = sales_vol_by_discount, x = 'DISCOUNT_CATEGORY', y = 'QUANTITY_ORDERED', 
+                hue = 'DISCOUNT_CATEGORY', palette = 'gist_rainbow')
+    plt.title('Sales Volume by Discount Category')
+    plt.xlabel('Discount Category')
+    plt.ylabel('Sales Volume')
+    plt.show()
 
 
 # <p style="color:purple">The 
@@ -432,7 +456,9 @@ plt.show()
 # In[41]:
 
 
-sales_by_prod_cat = df.groupby('PRODUCT_LINE')['SALES'].sum().reset_index()
+with stage('rollup:sales_by_prod_cat'):
+    sales_by_prod_cat = df.groupby('PRODUCT_LINE', observed=True)['SALES'].sum().reset_index()
+
 sales_by_prod_cat
 
 
@@ -440,13 +466,14 @@ sales_by_prod_cat
 
 
 # Sales by Product Category
-plt.figure(figsize=(10, 4))
-sns.barplot(data = sales_by_prod_cat, x = 'SALES', y = 'PRODUCT_LINE',
-            hue = 'PRODUCT_LINE', palette = 'gist_rainbow')
-plt.title('Sales by Product Category')
-plt.xlabel('Sales')
-plt.ylabel('Product Category')
-plt.show()
+with stage('render:sales_by_prod_cat'):
+    plt.figure(figsize=(10, 4))
+    sns.barplot(data = sales_by_prod_cat, x = 'SALES', y = 'PRODUCT_LINE',
+                hue = 'PRODUCT_LINE', palette = 'gist_rainbow')
+    plt.title('Sales by Product Category')
+    plt.xlabel('Sales')
+    plt.ylabel('Product Category')
+    plt.show()
 
 
 # - <p style="color:purple">
@@ -468,28 +495,31 @@ plt.show()
 
 
 # Customer distribution by COUNTRY
-customer_distribution = df.groupby('COUNTRY')['CUSTOMER_NAME']. \
-                        nunique().sort_values(ascending=False).head(7)
+with stage('customer_distribution'):
+    customer_distribution = topk.top_k(
+        df.groupby('COUNTRY', observed=True)['CUSTOMER_NAME'].nunique(), 7)
+
 customer_distribution
 
 
 # In[44]:
 
 
-cmap = plt.get_cmap('Greens_r')
-colors = cmap(np.linspace(0, 1, len(customer_distribution)))
+with stage('render:customer_distribution'):
+    cmap = plt.get_cmap('Greens_r')
+    colors = cmap(np.linspace(0, 1, len(customer_distribution)))
 
-plt.figure(figsize=(5, 5))
-plt.pie(
-    customer_distribution.values,
-    labels = customer_distribution.index,
-    startangle = 180,
-    colors=colors,
-    autopct='%1.1f%%',  # Shows percentage with 1 decimal place
-    pctdistance=0.85,   # Position of the percentage labels
-)
-plt.title('Customer Distribution by Country')
-plt.show()
+    plt.figure(figsize=(5, 5))
+    plt.pie(
+        customer_distribution.values,
+        labels = customer_distribution.index,
+        startangle = 180,
+        colors=colors,
+        autopct='%1.1f%%',  # Shows percentage with 1 decimal place
+        pctdistance=0.85,   # Position of the percentage labels
+    )
+    plt.title('Customer Distribution by Country')
+    plt.show()
 
 
 # - <p style="color:purple">
@@ -514,20 +544,23 @@ plt.show()
 
 
 # Quantity ordered vs. ORDER_LINE_NUMBER
-qty_ordered_per_line = df.groupby('ORDER_LINE_NUMBER')['QUANTITY_ORDERED'].sum()
+with stage('rollup:qty_ordered_per_line'):
+    qty_ordered_per_line = df.groupby('ORDER_LINE_NUMBER')['QUANTITY_ORDERED'].sum()
+
 qty_ordered_per_line
 
 
 # In[46]:
 
 
-sns.set(rc = {'figure.figsize':(12, 4)})
-sns.barplot(data = qty_ordered_per_line, color = '#04b509')
+with stage('render:qty_ordered_per_line'):
+    sns.set(rc = {'figure.figsize':(12, 4)})
+    sns.barplot(data = qty_ordered_per_line, color = '#04b509')
 
-plt.title('Total Quantity Ordered by Order Line Number')
-plt.xlabel('Order Line Number')
-plt.ylabel('Total Quantity Ordered')
-plt.show()
+    plt.title('Total Quantity Ordered by Order Line Number')
+    plt.xlabel('Order Line Number')
+    plt.ylabel('Total Quantity Ordered')
+    plt.show()
 
 
 # - <p style="color:purple">The chart clearly shows a descending trend in the total quantity ordered as the order line number increases. This suggests that the first few order lines typically have a higher demand compared to later ones.
@@ -549,16 +582,17 @@ plt.get_cmap('prism')
 
 
 # Relationship between QUANTITY_ORDERED and SALES.
-colors = np.linspace(0, 1, len(df['QUANTITY_ORDERED']))
+with stage('render:quantity_vs_sales'):
+    colors = np.linspace(0, 1, len(df['QUANTITY_ORDERED']))
 
-plt.figure(figsize=(10, 4))
-plt.scatter(df['QUANTITY_ORDERED'], df['SALES'], c = colors, cmap='prism')
-plt.title('Relationship between Quantity Ordered and Sales')
-plt.xlabel('Quantity Ordered')
-plt.ylabel('Sales')
-plt.grid(True)
-plt.tight_layout()  # Adjust layout to prevent clipping of tick-labels
-plt.show()
+    plt.figure(figsize=(10, 4))
+    plt.scatter(df['QUANTITY_ORDERED'], df['SALES'], c = colors, cmap='prism')
+    plt.title('Relationship between Quantity Ordered and Sales')
+    plt.xlabel('Quantity Ordered')
+    plt.ylabel('Sales')
+    plt.grid(True)
+    plt.tight_layout()  # Adjust layout to prevent clipping of tick-labels
+    plt.show()
 
 
 # - <p style="color:purple">
@@ -586,41 +620,39 @@ plt.show()
 # In[49]:
 
 
-recency = df.groupby('CUSTOMER_NAME', 
-                     as_index=False)['ORDER_DATE'].max().sort_values(
-    by='ORDER_DATE', ascending=False)
+# All per-customer metrics (first/last order date, order lines, distinct
+# orders, total sales) in one grouped pass; RFM and CLV both use them
+customers = customer_metrics(df)
 
-frequency = df.groupby('CUSTOMER_NAME', 
-                       as_index=False)['ORDER_NUMBER'].count().sort_values(
-    by='ORDER_NUMBER', ascending=False)
-
-monetary = df.groupby('CUSTOMER_NAME', 
-                      as_index=False)['SALES'].sum().sort_values(
-    by='SALES', ascending=False)
+recency = customers['LAST_ORDER_DATE']
+frequency = customers['FREQUENCY']
+monetary = customers['MONETARY']
 
 
 # In[50]:
 
 
-# Merging the metrics into a single DataFrame
-rfm = recency.merge(frequency, on='CUSTOMER_NAME').merge(monetary, on='CUSTOMER_NAME')
-
-# Renaming columns for clarity
-rfm.columns = ['CUSTOMER_NAME', 'LAST_ORDER_DATE', 'FREQUENCY', 'MONETARY']
+# The metrics share the customer index, so no merge is needed; most recent
+# customers first, as the merge on LAST_ORDER_DATE left them
+with stage('rfm'):
+    rfm = pd.concat([recency, frequency, monetary], axis=1).reset_index()
+    rfm = rfm.sort_values(by='LAST_ORDER_DATE', ascending=False,
+                          kind='mergesort', ignore_index=True)
 
 # Top 5 Customers sorted by Frequency
-rfm.sort_values(by='FREQUENCY', ascending=False).head()
+topk.top_rows(rfm, 'FREQUENCY', 5)
 
 
 # In[51]:
 
 
-rfm['R_SCORE'] = rfm['LAST_ORDER_DATE'].rank(ascending=False)
-rfm['F_SCORE'] = rfm['FREQUENCY'].rank(ascending=True)
-rfm['M_SCORE'] = rfm['MONETARY'].rank(ascending=True)
+with stage('rfm'):
+    rfm['R_SCORE'] = rfm['LAST_ORDER_DATE'].rank(ascending=False)
+    rfm['F_SCORE'] = rfm['FREQUENCY'].rank(ascending=True)
+    rfm['M_SCORE'] = rfm['MONETARY'].rank(ascending=True)
 
-# Combine the RFM scores into a single score
-rfm['RFM_SCORE'] = rfm['R_SCORE'] + rfm['F_SCORE'] + rfm['M_SCORE']
+    # Combine the RFM scores into a single score
+    rfm['RFM_SCORE'] = rfm['R_SCORE'] + rfm['F_SCORE'] + rfm['M_SCORE']
 
 rfm.head()
 
@@ -645,16 +677,21 @@ rfm.head()
 # In[52]:
 
 
-aov = round(df['SALES'].sum() / df['ORDER_NUMBER'].count(), 2)
+with stage('clv'):
+    aov = round(customers['MONETARY'].sum() / customers['FREQUENCY'].sum(), 2)
+
 aov
 
 
 # In[53]:
 
 
-unique_orders = df['ORDER_NUMBER'].nunique()
-unique_customers = df['CUSTOMER_NAME'].nunique()
-pf = round(unique_orders / unique_customers, 2)
+# Every order belongs to one customer, so the per-customer counts add up
+with stage('clv'):
+    unique_orders = customers['ORDERS'].sum()
+    unique_customers = len(customers)
+    pf = round(unique_orders / unique_customers, 2)
+
 pf
 
 
@@ -662,19 +699,23 @@ pf
 
 
 # First and last order dates
-first_order = df.groupby('CUSTOMER_NAME')['ORDER_DATE'].min()
-last_order = df.groupby('CUSTOMER_NAME')['ORDER_DATE'].max()
+with stage('clv'):
+    first_order = customers['FIRST_ORDER_DATE']
+    last_order = customers['LAST_ORDER_DATE']
+
+    # Let's merge to get customer lifespan
+    cls = (last_order - first_order).dt.days
+    avg_ls_years = round(cls.mean() / 365, 2)
 
-# Let's merge to get customer lifespan
-cls = (last_order - first_order).dt.days
-avg_ls_years = round(cls.mean() / 365, 2)
 avg_ls_years
 
 
 # In[55]:
 
 
-clv = round(aov * pf * avg_ls_years, 2)
+with stage('clv'):
+    clv = round(aov * pf * avg_ls_years, 2)
+
 clv
 
 
@@ -686,13 +727,16 @@ clv
 
 
 # Assuming cost is 70% of the unit price (As it's not available in our data)
-df['COST'] = df['UNIT_PRICE'] * 0.7  
+# PROFIT = SALES - COST * QUANTITY_ORDERED
+with stage('profit'):
+    df['COST'], df['PROFIT'] = features.cost_and_profit(
+        df['UNIT_PRICE'].to_numpy(), df['SALES'].to_numpy(),
+        df['QUANTITY_ORDERED'].to_numpy(), 0.7)
 
-df['PROFIT'] = df['SALES'] - (df['COST'] * df['QUANTITY_ORDERED'])
-
-profit_by_product = df.groupby('PRODUCT_LINE', 
-                               as_index=False)['PROFIT'].sum().sort_values(
-    by='PROFIT', ascending=False)
+with stage('rollup:profit_by_product'):
+    profit_by_product = df.groupby('PRODUCT_LINE', observed=True,
+                                   as_index=False)['PROFIT'].sum().sort_values(
+        by='PROFIT', ascending=False)
 
 profit_by_product
 
@@ -700,13 +744,14 @@ profit_by_product
 # In[57]:
 
 
-sns.set(rc = {'figure.figsize':(10, 4)})
-sns.barplot(data = profit_by_product, x = 'PRODUCT_LINE', y = 'PROFIT', 
-            hue = 'PRODUCT_LINE', palette = 'gist_rainbow')
-plt.title('Profit by Product Line')
-plt.xlabel('Product Line')
-plt.ylabel('Total Profit')
-plt.show()
+with stage('render:profit_by_product'):
+    sns.set(rc = {'figure.figsize':(10, 4)})
+    sns.barplot(data = profit_by_product, x = 'PRODUCT_LINE', y = 'PROFIT', 
+                hue = 'PRODUCT_LINE', palette = 'gist_rainbow')
+    plt.title('Profit by Product Line')
+    plt.xlabel('Product Line')
+    plt.ylabel('Total Profit')
+    plt.show()
 
 
 # <p style="color:purple;">From the above Analysis, we can identify 
@@ -723,27 +768,30 @@ plt.show()
 
 
 # Profit over Time
-profit_over_qtr = df.groupby('QTR_ID')['PROFIT'].sum().reset_index()
+with stage('rollup:profit_over_qtr'):
+    profit_over_qtr = df.groupby('QTR_ID')['PROFIT'].sum().reset_index()
+
 profit_over_qtr
 
 
 # In[59]:
 
 
-qtr_labels = {1: 'Q1', 2: 'Q2', 3: 'Q3', 4: 'Q4'}
+with stage('render:profit_over_qtr'):
+    qtr_labels = {1: 'Q1', 2: 'Q2', 3: 'Q3', 4: 'Q4'}
 
-plt.figure(figsize=(10, 4))
-plt.plot(profit_over_qtr['QTR_ID'], profit_over_qtr['PROFIT'], 
-         'p', ms = 15, mfc = 'w', mec = '#05a30b', ls = '-', lw = 3, c = '#06d40a')
-plt.title('Total Profit Quarterly')
-plt.xlabel('Quarter')
-plt.ylabel('Total Profit')
+    plt.figure(figsize=(10, 4))
+    plt.plot(profit_over_qtr['QTR_ID'], profit_over_qtr['PROFIT'], 
+             'p', ms = 15, mfc = 'w', mec = '#05a30b', ls = '-', lw = 3, c = '#06d40a')
+    plt.title('Total Profit Quarterly')
+    plt.xlabel('Quarter')
+    plt.ylabel('Total Profit')
 
-plt.xticks(ticks=profit_over_qtr['QTR_ID'], 
-           labels=[qtr_labels[q] for q in profit_over_qtr['QTR_ID']])
+    plt.xticks(ticks=profit_over_qtr['QTR_ID'], 
+               labels=[qtr_labels[q] for q in profit_over_qtr['QTR_ID']])
 
-plt.grid(True, linestyle='--', alpha=0.6)
-plt.show()
+    plt.grid(True, linestyle='--', alpha=0.6)
+    plt.show()
 
 
 # <p style="color:purple">From this graph, we can see the overall trend of profits across each quarter. There's an indication of profit fluctuation from one quarter to the next.</p>
@@ -754,13 +802,14 @@ plt.show()
 
 
 # Distribution of PROFIT
-plt.figure(figsize=(10, 4))
-plt.hist(df['PROFIT'], bins=20, color='#06d40a', edgecolor='black', alpha=0.7)
-plt.title('Distribution of Profit')
-plt.xlabel('Profit')
-plt.ylabel('Frequency')
-plt.grid(True, linestyle=':', alpha=0.7)
-plt.show()
+with stage('render:profit_distribution'):
+    plt.figure(figsize=(10, 4))
+    plt.hist(df['PROFIT'], bins=20, color='#06d40a', edgecolor='black', alpha=0.7)
+    plt.title('Distribution of Profit')
+    plt.xlabel('Profit')
+    plt.ylabel('Frequency')
+    plt.grid(True, linestyle=':', alpha=0.7)
+    plt.show()
 
 
 # <div style="color:purple; border:2px solid green; padding:5px; ">
@@ -780,22 +829,26 @@ plt.show()
 # In[61]:
 
 
-sales_by_month_and_product = df.pivot_table(
-    index='MONTH_ID', columns='PRODUCT_LINE', values='SALES', aggfunc='sum')
+with stage('pivot:sales_by_month_and_product'):
+    sales_by_month_and_product = df.pivot_table(
+        index='MONTH_ID', columns='PRODUCT_LINE', values='SALES', aggfunc='sum',
+        observed=True)
+
 sales_by_month_and_product
 
 
 # In[62]:
 
 
-plt.figure(figsize=(12, 5))
-sns.heatmap(data = sales_by_month_and_product, cmap = 'gist_rainbow', 
-            annot = True, fmt = '.1f')
+with stage('render:sales_by_month_and_product'):
+    plt.figure(figsize=(12, 5))
+    sns.heatmap(data = sales_by_month_and_product, cmap = 'gist_rainbow', 
+                annot = True, fmt = '.1f')
 
-plt.title('Sales by Month and Product Line')
-plt.xlabel('Product Line')
-plt.ylabel('Month')
-plt.show()
+    plt.title('Sales by Month and Product Line')
+    plt.xlabel('Product Line')
+    plt.ylabel('Month')
+    plt.show()
 
 
 # <p style="color:purple;">The heatmap displays the 
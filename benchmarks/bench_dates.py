@@ -0,0 +1,60 @@
+"""Benchmark ORDER_DATE parsing: per-row ``apply`` vs ``normalize_order_dates``.
+
+Run from the repository root::
+
+    python benchmarks/bench_dates.py --scale 1000
+
+The per-row ``apply`` is linear in the row count; ``--legacy-rows`` times it
+on the first N rows only and extrapolates, for quick runs.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csa.dates import normalize_order_dates, standardize_date  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='sales_data_sample.csv')
+    parser.add_argument('--scale', type=int, default=1000,
+                        help='how many times to repeat the sample rows')
+    parser.add_argument('--legacy-rows', type=int, default=None,
+                        help='time the per-row apply on this many rows only')
+    args = parser.parse_args(argv)
+
+    sample = pd.read_csv(args.csv, encoding='unicode_escape',
+                         usecols=['ORDER_DATE'])['ORDER_DATE']
+    dates = pd.concat([sample] * args.scale, ignore_index=True)
+    print(f'rows: {len(dates):,}  distinct: {dates.nunique():,}')
+
+    start = time.perf_counter()
+    parsed, report = normalize_order_dates(dates)
+    fast = time.perf_counter() - start
+    print(f'normalize_order_dates: {fast:.3f}s')
+    print(f'  {report}')
+
+    legacy_input = dates if args.legacy_rows is None else dates.iloc[:args.legacy_rows]
+    start = time.perf_counter()
+    legacy = pd.to_datetime(legacy_input.apply(standardize_date))
+    slow = time.perf_counter() - start
+    if len(legacy_input) < len(dates):
+        slow *= len(dates) / len(legacy_input)
+        print(f'apply(standardize_date): {slow:.3f}s (extrapolated from '
+              f'{len(legacy_input):,} rows)')
+    else:
+        print(f'apply(standardize_date): {slow:.3f}s')
+    print(f'speedup: {slow / fast:,.0f}x')
+
+    if not legacy.equals(parsed.iloc[:len(legacy)].astype(legacy.dtype)):
+        raise SystemExit('parsed dates differ from the per-row apply')
+
+
+if __name__ == '__main__':
+    main()
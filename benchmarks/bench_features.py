@@ -0,0 +1,73 @@
+"""Benchmark the derived columns: the notebook's cells vs ``csa.features``.
+
+Run from the repository root::
+
+    python benchmarks/bench_features.py --scale 300
+
+Both versions run on the same cleaned frame, and the script fails if any
+derived column differs from the notebook's.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csa.cleaning import (COST_RATIO, DISCOUNT_BINS, DISCOUNT_LABELS,  # noqa: E402
+                          add_derived_columns, clean, get_season)
+from csa.schema import DAY_OF_WEEK_DTYPE, SEASON_DTYPE, load_compact  # noqa: E402
+
+DERIVED = ['DAY_OF_WEEK', 'SEASON', 'DISCOUNT', 'DISCOUNT_CATEGORY', 'COST',
+           'PROFIT']
+
+
+def notebook_cells(df):
+    """The derived columns as the notebook's cells compute them."""
+    df['DAY_OF_WEEK'] = df['ORDER_DATE'].dt.day_name().astype(DAY_OF_WEEK_DTYPE)
+    df['SEASON'] = df['ORDER_DATE'].dt.month.apply(get_season).astype(SEASON_DTYPE)
+    df['DISCOUNT'] = ((df['MSRP'] - df['UNIT_PRICE']) / df['MSRP']) * 100
+    df['DISCOUNT'] = round(df['DISCOUNT'].apply(lambda x: max(x, 0)), 2)
+    df['DISCOUNT_CATEGORY'] = pd.cut(df['DISCOUNT'], bins=DISCOUNT_BINS,
+                                     labels=DISCOUNT_LABELS, right=False)
+    df['COST'] = df['UNIT_PRICE'] * COST_RATIO
+    df['PROFIT'] = df['SALES'] - (df['COST'] * df['QUANTITY_ORDERED'])
+    return df
+
+
+def timed(function, df, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        frame = df.copy()
+        start = time.perf_counter()
+        function(frame)
+        best = min(best, time.perf_counter() - start)
+    return best, frame
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='sales_data_sample.csv')
+    parser.add_argument('--scale', type=int, default=300,
+                        help='how many times to repeat the sample rows')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    sample, _ = clean(load_compact(args.csv))
+    df = pd.concat([sample] * args.scale, ignore_index=True)
+    print(f'rows: {len(df):,}')
+
+    slow, expected = timed(notebook_cells, df, args.repeat)
+    fast, actual = timed(add_derived_columns, df, args.repeat)
+    print(f'notebook cells: {slow:.3f}s')
+    print(f'csa.features:   {fast:.3f}s')
+    print(f'speedup: {slow / fast:,.1f}x')
+
+    pd.testing.assert_frame_equal(actual[DERIVED], expected[DERIVED])
+
+
+if __name__ == '__main__':
+    main()
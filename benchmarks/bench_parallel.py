@@ -0,0 +1,79 @@
+"""Benchmark the sharded multi-process analysis against the chunked run.
+
+Run from the repository root::
+
+    python benchmarks/bench_parallel.py --scale 200 --workers 1 8 32
+
+The sample is repeated ``--scale`` times into a temporary CSV. Splitting
+into shards is timed separately from the parallel analysis of the shards,
+since pre-partitioned exports skip it. Splitting again into a directory
+that holds more parts from an earlier split is checked too: the stale parts
+must be replaced, not counted.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from csa.engines.results import compare_results  # noqa: E402
+from csa.ingest import analyze_chunked  # noqa: E402
+from csa.parallel import analyze_shards, split_by_key  # noqa: E402
+from csa.schema import ENCODING  # noqa: E402
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--csv', default='sales_data_sample.csv')
+    parser.add_argument('--scale', type=int, default=200,
+                        help='how many times to repeat the sample rows')
+    parser.add_argument('--key', default='YEAR_ID')
+    parser.add_argument('--workers', type=int, nargs='+',
+                        default=[1, os.cpu_count() or 1])
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='csa-bench-') as tmp:
+        sample = pd.read_csv(args.csv, encoding=ENCODING, dtype=str,
+                             keep_default_na=False)
+        path = os.path.join(tmp, 'sales.csv')
+        pd.concat([sample] * args.scale).to_csv(path, index=False,
+                                                encoding=ENCODING)
+        print(f'rows: {len(sample) * args.scale:,}')
+
+        start = time.perf_counter()
+        expected = analyze_chunked(path).results()
+        serial = time.perf_counter() - start
+        print(f'chunked, one process: {serial:.2f}s')
+
+        start = time.perf_counter()
+        shards = split_by_key(path, args.key, os.path.join(tmp, 'shards'))
+        print(f'split by {args.key} into {len(shards)} shards: '
+              f'{time.perf_counter() - start:.2f}s')
+
+        for workers in args.workers:
+            start = time.perf_counter()
+            actual = analyze_shards(shards, workers).results()
+            elapsed = time.perf_counter() - start
+            print(f'{workers:>3} workers: {elapsed:.2f}s '
+                  f'({serial / elapsed:.1f}x)')
+            problems = compare_results(expected, actual)
+            if problems:
+                raise SystemExit(f'sharded results differ: {problems}')
+
+        # A reused shard directory holds the last split's parts only
+        reused = os.path.join(tmp, 'reused')
+        split_by_key(path, args.key, reused, chunksize=len(sample) * args.scale // 7)
+        shards = split_by_key(path, args.key, reused)
+        problems = compare_results(expected, analyze_shards(shards, 1).results())
+        if problems:
+            raise SystemExit(f'results differ after a second split: {problems}')
+        print('second split into the same directory: ok')
+
+
+if __name__ == '__main__':
+    main()
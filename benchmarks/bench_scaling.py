@@ -0,0 +1,251 @@
+"""Time and memory-profile every stage of the analysis on synthetic exports.
+
+Run from the repository root::
+
+    python benchmarks/bench_scaling.py --sizes 1e4 1e5 1e6 --output scaling.json
+    python benchmarks/bench_scaling.py --sizes 1e4 1e5 1e6 --baseline scaling.json
+
+Exports of each size are generated with ``csa.synthetic`` (kept in
+``--data-dir`` for reuse). Each stage of the script runs in order on them:
+load, date standardization, derived columns, each rollup, the pivot, the
+sales cube and the rollups read off it, the daily rolling windows per
+product line, a batch of cost-ratio and discount-bucket scenarios,
+customer distribution, RFM, CLV, monthly cohorts, the charts drawn as the
+notebook does (off-screen) and the headless report of ``csa.charts``. Its
+wall and CPU time and resident memory (at the start, and the peak above
+it) are measured with ``csa.trace`` and go to a JSON file together with
+the revision and library versions. ``--baseline`` prints the time ratio of
+every stage to an earlier file.
+"""
+
+import argparse
+import gc
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+from datetime import datetime, timezone
+
+import matplotlib
+
+matplotlib.use('Agg')
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import seaborn as sns  # noqa: E402
+from matplotlib import pyplot as plt  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from csa.charts import render_report  # noqa: E402
+from csa.cleaning import add_derived_columns, clean  # noqa: E402
+from csa.cohorts import CohortTable  # noqa: E402
+from csa.cube import SalesCube, cube_rollups  # noqa: E402
+from csa.customers import clv_from_metrics, customer_metrics, rfm_table  # noqa: E402
+from csa.rollups import ROLLUPS, compute_rollup, compute_rollups  # noqa: E402
+from csa.scenarios import ScenarioBase  # noqa: E402
+from csa.schema import load_compact  # noqa: E402
+from csa.synthetic import write_csv  # noqa: E402
+from csa.timeseries import rolling_stats, sales_series  # noqa: E402
+from csa.trace import Tracer  # noqa: E402
+
+
+def render(draw):
+    """Draw one figure with ``draw`` and render it to PNG in memory."""
+    figure = plt.figure(figsize=(10, 4))
+    draw()
+    figure.savefig(io.BytesIO(), format='png')
+    plt.close(figure)
+
+
+def stages(path):
+    """``(name, function)`` pairs; each function takes and updates ``state``."""
+    def load(state):
+        state['df'] = load_compact(path)
+
+    def dates(state):
+        state['df'], _ = clean(state['df'])
+
+    def derived(state):
+        add_derived_columns(state['df'])
+
+    def rollup(name):
+        return lambda state: state.setdefault('rollups', {}).update(
+            {name: compute_rollup(state['df'], name)})
+
+    def pivot(state):
+        state['rollups']['sales_by_month_and_product'] = state['df'].pivot_table(
+            index='MONTH_ID', columns='PRODUCT_LINE', values='SALES',
+            aggfunc='sum', observed=True)
+
+    def single_scan(state):
+        compute_rollups(state['df'])
+
+    def cube(state):
+        state['cube'] = SalesCube.from_frame(state['df'])
+
+    def rollups_from_cube(state):
+        cube_rollups(state['cube'])
+
+    def rolling(state):
+        rolling_stats(sales_series(state['df'], freq='D', by='PRODUCT_LINE'))
+
+    def scenarios(state):
+        ratios = list(np.linspace(0.5, 0.9, 41))
+        ScenarioBase(state['df']).evaluate(
+            ratios, [[0, 10, 20, 30, 50, 100], [0, 5, 15, 25, 100]])
+
+    def customer_distribution(state):
+        state['customer_distribution'] = state['df'].groupby(
+            'COUNTRY', observed=True)['CUSTOMER_NAME'].nunique().sort_values(
+            ascending=False).head(7)
+
+    def rfm(state):
+        state['customers'] = customer_metrics(state['df'])
+        state['rfm'] = rfm_table(state['customers'])
+
+    def clv(state):
+        state['clv'] = clv_from_metrics(state['customers'])
+
+    def cohorts(state):
+        table = CohortTable.from_frame(state['df'], freq='M')
+        table.retention()
+        table.clv()
+
+    def chart_boxplot(state):
+        render(lambda: plt.boxplot(state['df']['SALES']))
+
+    def chart_scatter(state):
+        df = state['df']
+        colors = np.linspace(0, 1, len(df))
+        render(lambda: plt.scatter(df['QUANTITY_ORDERED'], df['SALES'],
+                                   c=colors, cmap='prism'))
+
+    def chart_hist(state):
+        render(lambda: plt.hist(state['df']['PROFIT'], bins=20))
+
+    def chart_aggregates(state):
+        rollups = state['rollups']
+        for name in ['sales_by_day', 'sales_by_season', 'sales_by_year',
+                     'sales_by_prod_cat', 'profit_by_product']:
+            by, measure, _ = ROLLUPS[name]
+            render(lambda: sns.barplot(data=rollups[name], x=by, y=measure))
+        distribution = state['customer_distribution']
+        render(lambda: plt.pie(distribution.values, labels=distribution.index,
+                               autopct='%1.1f%%'))
+        render(lambda: sns.heatmap(rollups['sales_by_month_and_product'],
+                                   annot=True, fmt='.1f'))
+
+    def report(state):
+        results = dict(state['rollups'],
+                       customer_distribution=state['customer_distribution'])
+        with tempfile.TemporaryDirectory(prefix='csa-report-') as out_dir:
+            render_report(results, out_dir, df=state['df'])
+
+    named = [('load', load), ('dates', dates), ('derived', derived)]
+    named += [(f'rollup:{name}', rollup(name)) for name, (_, _, layout)
+              in ROLLUPS.items() if layout != 'pivot']
+    named += [('pivot', pivot), ('rollups_single_scan', single_scan),
+              ('cube', cube), ('cube_rollups', rollups_from_cube),
+              ('rolling', rolling), ('scenarios', scenarios),
+              ('customer_distribution', customer_distribution), ('rfm', rfm),
+              ('clv', clv), ('cohorts', cohorts), ('chart:boxplot', chart_boxplot),
+              ('chart:scatter', chart_scatter), ('chart:hist', chart_hist),
+              ('chart:aggregates', chart_aggregates),
+              ('render_report', report)]
+    return named
+
+
+def run(path, rows, skip=()):
+    results, state, tracer = [], {}, Tracer()
+    for name, stage in stages(path):
+        if name.startswith(tuple(skip)):
+            continue
+        gc.collect()
+        with tracer.stage(name):
+            stage(state)
+        record = tracer.records[-1]
+        results.append({'rows': rows, 'stage': name, 'seconds': record.wall_s,
+                        'cpu_seconds': record.cpu_s,
+                        'rss_start': record.rss_start,
+                        'peak_rss_delta': record.peak_rss_delta})
+        print(f'{rows:>12,} {name:<40} {record.wall_s:9.3f}s '
+              f'{(record.peak_rss_delta or 0) / 2**20:9.0f} MiB peak delta')
+    tracer.close()
+    return results
+
+
+def metadata():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=ROOT,
+                                  capture_output=True, text=True).stdout.strip()
+    except OSError:
+        revision = ''
+    return {
+        'revision': revision or None,
+        'timestamp': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'matplotlib': matplotlib.__version__,
+    }
+
+
+def compare(baseline, results, threshold):
+    """Print each stage's time relative to ``baseline``; flag slowdowns."""
+    before = {(entry['rows'], entry['stage']): entry['seconds']
+              for entry in baseline['results']}
+    for entry in results:
+        old = before.get((entry['rows'], entry['stage']))
+        if not old:
+            continue
+        ratio = entry['seconds'] / old
+        flag = '  SLOWER' if ratio > threshold else ''
+        print(f'{entry["rows"]:>12,} {entry["stage"]:<40} {ratio:6.2f}x{flag}')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', nargs='+', default=['1e4', '1e5', '1e6'],
+                        type=lambda text: int(float(text)),
+                        help='row counts, up to 1e8')
+    parser.add_argument('--data-dir', default=None,
+                        help='where to keep the generated exports '
+                             '(default: a temporary directory)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--skip', nargs='*', default=[],
+                        help='skip stages starting with these names')
+    parser.add_argument('--output', default='bench_scaling.json')
+    parser.add_argument('--baseline', default=None,
+                        help='earlier output to compare the times with')
+    parser.add_argument('--threshold', type=float, default=1.1,
+                        help='flag stages slower than the baseline by this factor')
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix='csa-scaling-') as tmp:
+        data_dir = args.data_dir or tmp
+        os.makedirs(data_dir, exist_ok=True)
+        results = []
+        for rows in args.sizes:
+            path = os.path.join(data_dir, f'synthetic-{rows}-seed{args.seed}.csv')
+            if not os.path.exists(path):
+                write_csv(path + '.tmp', rows, seed=args.seed)
+                os.replace(path + '.tmp', path)
+            results += run(path, rows, args.skip)
+
+    with open(args.output, 'w') as out:
+        json.dump({'meta': metadata(), 'results': results}, out, indent=1)
+    print(f'wrote {args.output}')
+    if args.baseline:
+        with open(args.baseline) as baseline:
+            compare(json.load(baseline), results, args.threshold)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+"""Reusable building blocks for the Customer Sales Analysis.
+
+The notebook (``Improved Version of CSA.ipynb``) and its exported script
+remain the narrative of the analysis; the modules in this package hold the
+pieces that have to scale beyond ``sales_data_sample.csv``.
+"""
@@ -0,0 +1,7 @@
+"""``python -m csa``: see ``csa.cli``."""
+
+import sys
+
+from csa.cli import main
+
+sys.exit(main())
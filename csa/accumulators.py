@@ -0,0 +1,147 @@
+"""Mergeable partial aggregates.
+
+Each accumulator is fed frames with ``update`` and combined with another
+accumulator of the same kind with ``merge``. The state it keeps is bounded by
+the number of groups (days, product lines, customers, ...), never by the
+number of rows, so a file can be folded in chunk by chunk, or in shards that
+are merged at the end.
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.customers import CUSTOMER_COLUMNS
+from csa.sketches import DEFAULT_PRECISION, SketchTable
+
+
+def _combine(parts, how, observed=True):
+    # Concatenate partial results and reduce them again per group
+    parts = [part for part in parts if part is not None]
+    if not parts:
+        return None
+    if len(parts) == 1:
+        return parts[0]
+    combined = pd.concat(parts)
+    levels = list(range(combined.index.nlevels))
+    return combined.groupby(level=levels, observed=observed).agg(how)
+
+
+class SumAccumulator:
+    """Sum of ``measure`` per ``by`` group(s).
+
+    ``observed=False`` keeps every category of a categorical key, with a sum
+    of zero, as ``sales_vol_by_discount`` does in the notebook.
+    """
+
+    def __init__(self, by, measure, observed=True):
+        self.by = by
+        self.measure = measure
+        self.observed = observed
+        self.totals = None
+
+    def update(self, frame):
+        part = frame.groupby(self.by, observed=self.observed)[self.measure].sum()
+        return self.add(part)
+
+    def add(self, part):
+        """Fold in per-group sums computed elsewhere (e.g. by ``aggregate``)."""
+        self.totals = _combine([self.totals, part], 'sum', self.observed)
+        return self
+
+    def merge(self, other):
+        self.totals = _combine([self.totals, other.totals], 'sum', self.observed)
+        return self
+
+    def result(self):
+        return self.totals
+
+
+class DistinctAccumulator:
+    """Distinct values (or value combinations) of ``columns``."""
+
+    def __init__(self, columns):
+        self.columns = list(columns)
+        self.values = None
+
+    def _add(self, values):
+        if self.values is not None:
+            values = pd.concat([self.values, values], ignore_index=True)
+        self.values = values.drop_duplicates(ignore_index=True)
+
+    def update(self, frame):
+        self._add(frame[self.columns].drop_duplicates())
+        return self
+
+    def merge(self, other):
+        if other.values is not None:
+            self._add(other.values)
+        return self
+
+    def count(self, by=None):
+        """Number of distinct values, overall or per ``by`` column."""
+        if self.values is None:
+            return 0 if by is None else pd.Series(dtype='int64')
+        if by is None:
+            return len(self.values)
+        return self.values.groupby(by, observed=True).size()
+
+
+class DistinctSketchAccumulator:
+    """Approximate ``DistinctAccumulator``: a HyperLogLog sketch of the last
+    of ``columns`` per value of the others (see ``csa.sketches``), in
+    memory bounded by the number of groups."""
+
+    def __init__(self, columns, precision=DEFAULT_PRECISION):
+        self.columns = list(columns)
+        self.table = SketchTable(self.columns[-1], self.columns[:-1], precision)
+
+    def update(self, frame):
+        self.table.update(frame)
+        return self
+
+    def merge(self, other):
+        self.table.merge(other.table)
+        return self
+
+    def count(self, by=None):
+        """Estimated number of distinct values, overall or per ``by`` column
+        (rounded to whole values)."""
+        if by is None:
+            return int(round(self.table.count()))
+        return self.table.count(by=by).round().astype(np.int64)
+
+
+class CustomerAccumulator:
+    """First/last order date, row count and sales sum per customer."""
+
+    def __init__(self):
+        self.customers = None
+
+    def update(self, frame):
+        part = frame.groupby('CUSTOMER_NAME', observed=True).agg(
+            FIRST_ORDER_DATE=('ORDER_DATE', 'min'),
+            LAST_ORDER_DATE=('ORDER_DATE', 'max'),
+            FREQUENCY=('ORDER_NUMBER', 'count'),
+            MONETARY=('SALES', 'sum'),
+        )
+        self.customers = self._combine(part)
+        return self
+
+    def merge(self, other):
+        if other.customers is not None:
+            self.customers = self._combine(other.customers)
+        return self
+
+    def _combine(self, part):
+        if self.customers is None:
+            return part
+        return pd.concat([self.customers, part]).groupby(
+            level=0, observed=True).agg({
+            'FIRST_ORDER_DATE': 'min',
+            'LAST_ORDER_DATE': 'max',
+            'FREQUENCY': 'sum',
+            'MONETARY': 'sum',
+        })[CUSTOMER_COLUMNS]
+
+    def result(self):
+        return self.customers
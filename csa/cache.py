@@ -0,0 +1,97 @@
+"""On-disk cache of the cleaned and enriched sales frame.
+
+The first run over an export cleans it and writes the result to a columnar
+file (Parquet, or uncompressed Arrow IPC) named after a hash of the source
+file and ``CLEANING_VERSION``. Later runs memory-map that file and read only
+the columns they ask for. Changing either the source or the cleaning logic
+changes the name, so a stale copy is never read.
+
+Needs ``pyarrow``.
+"""
+
+import hashlib
+import os
+import tempfile
+
+from csa.cleaning import CLEANING_VERSION, load
+
+DEFAULT_CACHE_DIR = '.csa_cache'
+FORMATS = {'parquet': '.parquet', 'arrow': '.arrow'}
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover
+    pa = None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError('the sales cache needs pyarrow: pip install pyarrow')
+
+
+def source_hash(path, block_size=1 << 20):
+    """SHA-256 of the file at ``path``, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cache_path(source, cache_dir=DEFAULT_CACHE_DIR, fmt='parquet'):
+    """Where the cleaned copy of ``source`` is (or would be) stored."""
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown cache format {fmt!r}, expected one of '
+                         f'{sorted(FORMATS)}')
+    stem = os.path.splitext(os.path.basename(source))[0].replace(' ', '_')
+    name = f'{stem}-{source_hash(source)[:16]}-v{CLEANING_VERSION}{FORMATS[fmt]}'
+    return os.path.join(cache_dir, name)
+
+
+def write_cache(df, path, fmt='parquet'):
+    """Write a cleaned frame to ``path`` atomically."""
+    _require_pyarrow()
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    # A temporary file of its own, so writers of the same source (parallel
+    # workers) never write into each other's
+    with tempfile.NamedTemporaryFile(dir=os.path.dirname(path) or '.',
+                                     suffix='.tmp', delete=False) as partial:
+        pass
+    try:
+        if fmt == 'arrow':
+            # Uncompressed, so numeric columns can be used straight from the map
+            feather.write_feather(table, partial.name, compression='uncompressed')
+        else:
+            pq.write_table(table, partial.name)
+        os.replace(partial.name, path)
+    except BaseException:
+        os.remove(partial.name)
+        raise
+
+
+def read_cache(path, columns=None, fmt='parquet'):
+    """Memory-map a cached frame and load only ``columns`` (all by default)."""
+    _require_pyarrow()
+    if fmt == 'arrow':
+        table = feather.read_table(path, columns=columns, memory_map=True)
+    else:
+        table = pq.read_table(path, columns=columns, memory_map=True)
+    return table.to_pandas()
+
+
+def load_cached(source, columns=None, cache_dir=DEFAULT_CACHE_DIR,
+                fmt='parquet', refresh=False):
+    """The cleaned, enriched frame of ``source``, through the cache.
+
+    The cache file is built on the first call (or with ``refresh=True``);
+    after that only the requested ``columns`` are read from it.
+    """
+    path = cache_path(source, cache_dir, fmt)
+    if refresh or not os.path.exists(path):
+        df = load(source)
+        write_cache(df, path, fmt)
+        return df if columns is None else df[list(columns)]
+    return read_cache(path, columns, fmt)
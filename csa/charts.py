@@ -0,0 +1,317 @@
+"""Headless rendering of the notebook's charts to image files.
+
+Every chart of the notebook is a draw function working on a matplotlib
+``Axes`` and a small, picklable payload: the rollup tables, or summaries of
+the row-level columns computed up front in the parent process. Charts are
+rendered on standalone ``Figure`` objects (the Agg canvas, no pyplot and no
+display) in a process pool, one file each.
+
+The row-level charts never ship the rows to a worker: the profit histogram
+is binned with ``np.histogram`` (the same picture ``plt.hist`` draws), the
+sales boxplot gets its statistics, and above ``DENSITY_THRESHOLD`` points
+the quantity-vs-sales scatter becomes a 2-D histogram, so drawing costs
+depend on the image size rather than the row count. Above the threshold the
+boxplot and histogram are read off quantile sketches (``csa.quantiles``)
+instead of sorting the columns; sketches streamed over chunks or shards
+(``SalesAnalysis.distributions``) draw them without any rows at all.
+
+Run ``python -m csa.charts sales_data_sample.csv charts/ --format svg``.
+"""
+
+import argparse
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, NamedTuple, Optional
+
+import numpy as np
+
+from csa.quantiles import QuantileTable
+from csa.trace import stage, traced
+
+try:
+    import seaborn as sns
+    from matplotlib import cbook, colormaps, colors
+    from matplotlib.figure import Figure
+except ImportError:  # pragma: no cover
+    Figure = None
+
+DENSITY_THRESHOLD = 100_000
+DENSITY_BINS = (100, 100)
+HIST_BINS = 20
+MAX_FLIERS = 1_000
+FORMATS = ('png', 'svg')
+QTR_LABELS = {1: 'Q1', 2: 'Q2', 3: 'Q3', 4: 'Q4'}
+
+
+def _labels(ax, title, xlabel, ylabel):
+    ax.set_title(title)
+    ax.set_xlabel(xlabel)
+    ax.set_ylabel(ylabel)
+
+
+def draw_sales_boxplot(ax, stats):
+    ax.bxp([stats])
+
+
+def draw_sales_by_day_barh(ax, table):
+    ax.barh(table['DAY_OF_WEEK'].astype(str), table['SALES'], color='#94fc03')
+    _labels(ax, 'Total Sales by Day of the Week', 'Day of the Week', 'Total Sales')
+
+
+def draw_sales_by_day_bar(ax, table):
+    sns.barplot(data=table, x='DAY_OF_WEEK', y='SALES', color='#94fc03', ax=ax)
+    _labels(ax, 'Total Sales by Day of the Week', 'Day of the Week', 'Total Sales')
+
+
+def draw_sales_by_season_barh(ax, table):
+    ax.barh(table['SEASON'].astype(str), table['SALES'], color='#94fc03')
+    _labels(ax, 'Total Sales by Season', 'Season', 'Total Sales')
+
+
+def draw_sales_by_season_area(ax, table):
+    seasons = table['SEASON'].astype(str)
+    ax.fill_between(seasons, table['SALES'], color='#94fc03', alpha=0.5)
+    ax.plot(seasons, table['SALES'], marker='o', color='g')
+    _labels(ax, 'Total Sales by Season', 'Season', 'Total Sales')
+
+
+def draw_sales_by_qtr(ax, table):
+    ax.plot(table['SALES'], table['QTR_ID'], '*', ms=10, ls='-.', lw=2,
+            c='#5604b5')
+    _labels(ax, 'Total Sales Quarterly', 'Quarter', 'Total Sales')
+
+
+def draw_sales_by_month(ax, table):
+    ax.plot(table['SALES'], table['MONTH_ID'], 'p', ms=15, mfc='w',
+            mec='#05a30b', ls='-', lw=3, c='#06d40a')
+    _labels(ax, 'Total Sales by Month', 'Month', 'Total Sales')
+
+
+def draw_sales_by_year(ax, table):
+    ax.plot(table['SALES'], table['YEAR_ID'], 'H', ms=10, ls=':', lw=2,
+            c='#0758fa')
+    _labels(ax, 'Total Sales by Year', 'Year', 'Total Sales')
+
+
+def draw_sales_vol_by_discount(ax, table):
+    sns.barplot(data=table, x='DISCOUNT_CATEGORY', y='QUANTITY_ORDERED',
+                hue='DISCOUNT_CATEGORY', palette='gist_rainbow', ax=ax)
+    _labels(ax, 'Sales Volume by Discount Category', 'Discount Category',
+            'Sales Volume')
+
+
+def draw_sales_by_prod_cat(ax, table):
+    sns.barplot(data=table, x='SALES', y='PRODUCT_LINE', hue='PRODUCT_LINE',
+                palette='gist_rainbow', ax=ax)
+    _labels(ax, 'Sales by Product Category', 'Sales', 'Product Category')
+
+
+def draw_customer_distribution(ax, distribution):
+    shades = colormaps['Greens_r'](np.linspace(0, 1, len(distribution)))
+    ax.pie(distribution.values, labels=distribution.index, startangle=180,
+           colors=shades, autopct='%1.1f%%', pctdistance=0.85)
+    ax.set_title('Customer Distribution by Country')
+
+
+def draw_qty_ordered_per_line(ax, totals):
+    sns.barplot(data=totals, color='#04b509', ax=ax)
+    _labels(ax, 'Total Quantity Ordered by Order Line Number',
+            'Order Line Number', 'Total Quantity Ordered')
+
+
+def draw_quantity_vs_sales(ax, payload):
+    kind, data = payload
+    if kind == 'points':
+        quantity, sales = data
+        ax.scatter(quantity, sales, c=np.linspace(0, 1, len(quantity)),
+                   cmap='prism')
+    else:
+        counts, x_edges, y_edges = data
+        mesh = ax.pcolormesh(x_edges, y_edges, np.ma.masked_equal(counts.T, 0),
+                             norm=colors.LogNorm(), cmap='viridis')
+        ax.figure.colorbar(mesh, ax=ax, label='Rows')
+    _labels(ax, 'Relationship between Quantity Ordered and Sales',
+            'Quantity Ordered', 'Sales')
+    ax.grid(True)
+
+
+def draw_profit_by_product(ax, table):
+    sns.barplot(data=table, x='PRODUCT_LINE', y='PROFIT', hue='PRODUCT_LINE',
+                palette='gist_rainbow', ax=ax)
+    _labels(ax, 'Profit by Product Line', 'Product Line', 'Total Profit')
+
+
+def draw_profit_over_qtr(ax, table):
+    ax.plot(table['QTR_ID'], table['PROFIT'], 'p', ms=15, mfc='w',
+            mec='#05a30b', ls='-', lw=3, c='#06d40a')
+    _labels(ax, 'Total Profit Quarterly', 'Quarter', 'Total Profit')
+    ax.set_xticks(table['QTR_ID'], [QTR_LABELS[q] for q in table['QTR_ID']])
+    ax.grid(True, linestyle='--', alpha=0.6)
+
+
+def draw_profit_distribution(ax, histogram):
+    counts, edges = histogram
+    # A histogram of the bin left edges weighted by the counts draws exactly
+    # the bars plt.hist draws for the raw values
+    ax.hist(edges[:-1], bins=edges, weights=counts, color='#06d40a',
+            edgecolor='black', alpha=0.7)
+    _labels(ax, 'Distribution of Profit', 'Profit', 'Frequency')
+    ax.grid(True, linestyle=':', alpha=0.7)
+
+
+def draw_sales_by_month_and_product(ax, pivot):
+    sns.heatmap(data=pivot, cmap='gist_rainbow', annot=True, fmt='.1f', ax=ax)
+    _labels(ax, 'Sales by Month and Product Line', 'Product Line', 'Month')
+
+
+class Chart(NamedTuple):
+    """How to draw one chart, and what it is drawn from.
+
+    ``source`` is the results key of the table it draws, or ``None`` for
+    the charts drawn from row-level summaries (see ``row_payloads``).
+    """
+
+    draw: Callable
+    figsize: tuple
+    source: Optional[str]
+    # The notebook switches to seaborn's darkgrid style at the order line chart
+    style: Optional[str] = None
+
+
+CHARTS = {
+    'sales_boxplot': Chart(draw_sales_boxplot, (7, 4), None),
+    'sales_by_day_barh': Chart(draw_sales_by_day_barh, (7, 3), 'sales_by_day'),
+    'sales_by_day_bar': Chart(draw_sales_by_day_bar, (7, 3), 'sales_by_day'),
+    'sales_by_season_barh': Chart(draw_sales_by_season_barh, (7, 3),
+                                  'sales_by_season'),
+    'sales_by_season_area': Chart(draw_sales_by_season_area, (7, 3),
+                                  'sales_by_season'),
+    'sales_by_qtr': Chart(draw_sales_by_qtr, (10, 4), 'sales_by_qtr'),
+    'sales_by_month': Chart(draw_sales_by_month, (10, 4), 'sales_by_month'),
+    'sales_by_year': Chart(draw_sales_by_year, (10, 4), 'sales_by_year'),
+    'sales_vol_by_discount': Chart(draw_sales_vol_by_discount, (10, 4),
+                                   'sales_vol_by_discount'),
+    'sales_by_prod_cat': Chart(draw_sales_by_prod_cat, (10, 4),
+                               'sales_by_prod_cat'),
+    'customer_distribution': Chart(draw_customer_distribution, (5, 5),
+                                   'customer_distribution'),
+    'qty_ordered_per_line': Chart(draw_qty_ordered_per_line, (12, 4),
+                                  'qty_ordered_per_line', 'darkgrid'),
+    'quantity_vs_sales': Chart(draw_quantity_vs_sales, (10, 4), None, 'darkgrid'),
+    'profit_by_product': Chart(draw_profit_by_product, (10, 4),
+                               'profit_by_product', 'darkgrid'),
+    'profit_over_qtr': Chart(draw_profit_over_qtr, (10, 4), 'profit_over_qtr',
+                             'darkgrid'),
+    'profit_distribution': Chart(draw_profit_distribution, (10, 4), None,
+                                 'darkgrid'),
+    'sales_by_month_and_product': Chart(draw_sales_by_month_and_product,
+                                        (12, 5), 'sales_by_month_and_product',
+                                        'darkgrid'),
+}
+
+
+def _boxplot_stats(values, max_fliers=MAX_FLIERS):
+    stats = cbook.boxplot_stats(values)[0]
+    fliers = np.sort(stats['fliers'])
+    if len(fliers) > max_fliers:
+        # Evenly spaced order statistics, extremes included: overlapping
+        # markers beyond that add nothing to the picture
+        fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).astype(int)]
+    stats['fliers'] = fliers
+    return stats
+
+
+def distribution_payloads(distributions):
+    """Payloads of the boxplot and histogram from a ``QuantileTable`` of
+    ``SALES`` and ``PROFIT`` (merged over its groups, if any)."""
+    return {
+        'sales_boxplot': distributions.sketch('SALES').boxplot_stats(MAX_FLIERS),
+        'profit_distribution': distributions.sketch('PROFIT').histogram(HIST_BINS),
+    }
+
+
+def row_payloads(df, threshold=DENSITY_THRESHOLD):
+    """Payloads of the row-level charts, summarized from ``df``."""
+    quantity = df['QUANTITY_ORDERED'].to_numpy(dtype=np.float64)
+    sales = df['SALES'].to_numpy(dtype=np.float64)
+    if len(df) > threshold:
+        scatter = ('density', np.histogram2d(quantity, sales, bins=DENSITY_BINS))
+        payloads = distribution_payloads(QuantileTable(['SALES', 'PROFIT'])
+                                         .update(df))
+    else:
+        scatter = ('points', (quantity, sales))
+        profit = df['PROFIT'].to_numpy(dtype=np.float64)
+        payloads = {'sales_boxplot': _boxplot_stats(sales),
+                    'profit_distribution': np.histogram(profit, bins=HIST_BINS)}
+    payloads['quantity_vs_sales'] = scatter
+    return payloads
+
+
+def render_chart(name, payload, path):
+    """Draw chart ``name`` from ``payload`` and save it to ``path``."""
+    if Figure is None:
+        raise ImportError('rendering charts needs matplotlib and seaborn: '
+                          'pip install matplotlib seaborn')
+    chart = CHARTS[name]
+    with stage(f'render:{name}'), sns.axes_style(chart.style):
+        figure = Figure(figsize=chart.figsize)
+        chart.draw(figure.subplots(), payload)
+        figure.tight_layout()
+        figure.savefig(path)
+    return path
+
+
+@traced('render')
+def render_report(results, out_dir, df=None, fmt='png', workers=None,
+                  threshold=DENSITY_THRESHOLD, distributions=None):
+    """Render every chart to ``out_dir/<name>.<fmt>`` in a process pool.
+
+    ``results`` holds the notebook's tables (as returned by the engines);
+    the boxplot, scatter and histogram are drawn from the row-level frame
+    ``df``, or without it the boxplot and histogram from the
+    ``distributions`` sketches. Returns ``{chart name: path}``.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'unknown image format {fmt!r}, expected one of '
+                         f'{list(FORMATS)}')
+    payloads = {name: results[chart.source] for name, chart in CHARTS.items()
+                if chart.source is not None}
+    if df is not None:
+        payloads.update(row_payloads(df, threshold))
+    elif distributions is not None:
+        payloads.update(distribution_payloads(distributions))
+    os.makedirs(out_dir, exist_ok=True)
+    names = [name for name in CHARTS if name in payloads]
+    paths = [os.path.join(out_dir, f'{name}.{fmt}') for name in names]
+    workers = min(workers or os.cpu_count() or 1, len(names))
+    if workers <= 1:
+        list(map(render_chart, names, [payloads[n] for n in names], paths))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            list(pool.map(render_chart, names, [payloads[n] for n in names],
+                          paths))
+    return dict(zip(names, paths))
+
+
+def main(argv=None):
+    from csa.engines.pandas_engine import analyze_frame, load_source
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', default='sales_data_sample.csv')
+    parser.add_argument('out_dir', nargs='?', default='charts')
+    parser.add_argument('--format', choices=FORMATS, default='png')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--threshold', type=int, default=DENSITY_THRESHOLD,
+                        help='rows above which the scatter is drawn as a density')
+    args = parser.parse_args(argv)
+
+    df = load_source(args.source)
+    paths = render_report(analyze_frame(df), args.out_dir, df=df,
+                          fmt=args.format, workers=args.workers,
+                          threshold=args.threshold)
+    for path in paths.values():
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Cleaning and derived columns of the sales frame.
+
+These are the notebook's cleaning cells as functions, so the same steps can
+run on a whole file or on one chunk of it at a time.
+"""
+
+from csa import features
+from csa.dates import normalize_order_dates
+from csa.schema import load_compact
+from csa.trace import stage, traced
+
+# Bump whenever the output of ``prepare`` changes, so cached copies of the
+# cleaned frame (see ``csa.cache``) are rebuilt
+CLEANING_VERSION = 1
+
+# Assuming cost is 70% of the unit price (As it's not available in our data)
+COST_RATIO = 0.7
+
+DISCOUNT_BINS = [0, 10, 20, 30, 50, 100]
+DISCOUNT_LABELS = ['0-10%', '10-20%', '20-30%', '30-50%', '50-100%']
+
+
+def get_season(month):
+    """The notebook's per-month season; ``features.season`` is the array form."""
+    if month in [12, 1, 2]:
+        return 'Winter'
+    elif month in [3, 4, 5]:
+        return 'Spring'
+    elif month in [6, 7, 8]:
+        return 'Summer'
+    else:
+        return 'Fall'
+
+
+@traced('clean')
+def clean(df, date_cache=None):
+    """Drop ``ADDRESS_LINE2``, rename ``PRICE_EACH`` and parse ``ORDER_DATE``.
+
+    Returns the cleaned frame and the ``DateParseReport`` of the date parse.
+    """
+    df = df.drop(columns=['ADDRESS_LINE2'], errors='ignore')
+    df = df.rename(columns={'PRICE_EACH': 'UNIT_PRICE'})
+    df['ORDER_DATE'], report = normalize_order_dates(df['ORDER_DATE'],
+                                                     cache=date_cache)
+    return df, report
+
+
+@traced('derive')
+def add_derived_columns(df):
+    """Add ``DAY_OF_WEEK``, ``SEASON``, ``DISCOUNT``, ``DISCOUNT_CATEGORY``,
+    ``COST`` and ``PROFIT`` to a cleaned frame, in place."""
+    dates = df['ORDER_DATE']
+    df['DAY_OF_WEEK'] = features.day_of_week(dates)
+    df['SEASON'] = features.season(dates)
+
+    df['DISCOUNT'] = features.discount(df['MSRP'], df['UNIT_PRICE'])
+    df['DISCOUNT_CATEGORY'] = features.discount_category(
+        df['DISCOUNT'], DISCOUNT_BINS, DISCOUNT_LABELS)
+
+    with stage('profit', rows_in=len(df)):
+        df['COST'], df['PROFIT'] = features.cost_and_profit(
+            df['UNIT_PRICE'].to_numpy(), df['SALES'].to_numpy(),
+            df['QUANTITY_ORDERED'].to_numpy(), COST_RATIO)
+    return df
+
+
+def prepare(df, date_cache=None):
+    """``clean`` followed by ``add_derived_columns``."""
+    df, report = clean(df, date_cache=date_cache)
+    return add_derived_columns(df), report
+
+
+def load(path, **read_csv_kwargs):
+    """Read a sales export and return the cleaned, enriched, compact frame."""
+    df, _ = prepare(load_compact(path, **read_csv_kwargs))
+    return df
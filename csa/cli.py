@@ -0,0 +1,160 @@
+"""Command-line entry point: selected reports of an export, written as CSV.
+
+The notebook's script imports pandas, matplotlib and seaborn up front and
+runs every cell, displays and charts included. Here only the reports asked
+for are computed, and the plotting libraries are imported only when the
+``charts`` stage is selected::
+
+    python -m csa sales.csv --stages rfm,clv --out reports/
+    python -m csa sales.csv --stages rollups,charts --engine duckdb
+
+Stages are report names (every rollup, ``customer_distribution``, ``rfm``,
+``clv``), ``rollups`` for all rollups, and ``charts``. Each table is
+written to ``<out>/<name>.csv``; the CLV figures go to one ``clv.csv``.
+"""
+
+import argparse
+import os
+import sys
+import warnings
+
+DEFAULT_OUT_DIR = 'reports'
+ROLLUPS_STAGE = 'rollups'
+CHARTS_STAGE = 'charts'
+# Engines whose analysis carries distribution sketches for the charts
+SKETCH_ENGINES = ('chunked', 'parallel')
+
+
+def resolve_stages(stages):
+    """The reports to compute for ``stages``, and whether to draw charts."""
+    from csa.engines.results import REPORTS
+    from csa.rollups import ROLLUPS
+
+    reports, charts = [], False
+    for name in stages:
+        if name == CHARTS_STAGE:
+            charts = True
+        elif name == ROLLUPS_STAGE:
+            reports += list(ROLLUPS)
+        elif name in REPORTS:
+            reports.append(name)
+        else:
+            raise ValueError(f'unknown stage {name!r}, expected {ROLLUPS_STAGE}, '
+                             f'{CHARTS_STAGE} or one of {list(REPORTS)}')
+    return list(dict.fromkeys(reports)), charts
+
+
+def write_reports(results, out_dir):
+    """Write each result to ``out_dir`` as CSV; returns the paths written."""
+    import pandas as pd
+
+    from csa.engines.results import CLV_FIGURES
+
+    os.makedirs(out_dir, exist_ok=True)
+    paths = []
+    for name, value in results.items():
+        if isinstance(value, (pd.Series, pd.DataFrame)):
+            path = os.path.join(out_dir, f'{name}.csv')
+            # Labels live in the index of Series and pivots only
+            value.to_csv(path, index=isinstance(value, pd.Series)
+                         or value.index.name is not None)
+            paths.append(path)
+    figures = {name: results[name] for name in CLV_FIGURES if name in results}
+    if figures:
+        path = os.path.join(out_dir, 'clv.csv')
+        pd.Series(figures, name='value').rename_axis('figure').to_csv(path)
+        paths.append(path)
+    return paths
+
+
+def _analyze_partial(source, engine):
+    if engine == 'chunked':
+        from csa.ingest import analyze_chunked
+
+        return analyze_chunked(source)
+    from csa.parallel import analyze_partitioned
+
+    return analyze_partitioned(source)
+
+
+def run(source, stages, out_dir=DEFAULT_OUT_DIR, engine='pandas', fmt='png'):
+    """Compute the reports of ``stages`` on ``source``, write them and, with
+    the ``charts`` stage, render the charts; returns the paths written.
+
+    The row-level charts need the rows: the chunked and parallel engines
+    draw the boxplot and histogram from their sketches instead, the SQL and
+    polars engines none of them. Charts that can't be drawn are named in a
+    warning rather than left out silently.
+    """
+    from csa.engines.results import CLV_FIGURES
+    from csa.rollups import ROLLUPS
+
+    reports, charts = resolve_stages(stages)
+    # The charts draw the rollups and the customer distribution
+    needed = (list(dict.fromkeys(reports + list(ROLLUPS)
+                                 + ['customer_distribution']))
+              if charts else reports)
+    df = distributions = None
+    if engine == 'auto':
+        from csa.engines import choose_engine
+
+        engine = choose_engine(source)
+    if engine == 'pandas':
+        from csa.engines.pandas_engine import analyze_frame, load_source
+
+        df = load_source(source)
+        results = analyze_frame(df, needed) if needed else {}
+    elif engine in SKETCH_ENGINES and needed:
+        # Their partial analyses keep the quantile sketches the boxplot and
+        # histogram are drawn from when there are no rows at hand
+        analysis = _analyze_partial(source, engine)
+        results = analysis.results()
+        distributions = analysis.distributions
+    else:
+        from csa.engines import analyze
+
+        # Other engines compute every report
+        results = analyze(source, engine=engine) if needed else {}
+    wanted = set(reports) | (set(CLV_FIGURES) if 'clv' in reports else set())
+    paths = write_reports({name: value for name, value in results.items()
+                           if name in wanted}, out_dir)
+    if charts:
+        from csa.charts import CHARTS, render_report
+
+        rendered = render_report(results, os.path.join(out_dir, 'charts'), df=df,
+                                 fmt=fmt, distributions=distributions)
+        skipped = [name for name in CHARTS if name not in rendered]
+        if skipped:
+            warnings.warn(f'the {engine} engine keeps no rows, so these charts '
+                          f'were not drawn: {", ".join(skipped)}; use '
+                          '--engine pandas for every chart', stacklevel=2)
+        paths += list(rendered.values())
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog='python -m csa',
+                                     description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', default='sales_data_sample.csv')
+    parser.add_argument('--stages', default='rollups,customer_distribution,rfm,clv',
+                        help='comma-separated reports: rollups, a rollup name, '
+                             'customer_distribution, rfm, clv, charts')
+    parser.add_argument('--out', default=DEFAULT_OUT_DIR)
+    parser.add_argument('--engine', default='pandas',
+                        help='pandas, chunked, parallel, duckdb, polars, '
+                             'sqlite or auto')
+    parser.add_argument('--format', choices=('png', 'svg'), default='png')
+    args = parser.parse_args(argv)
+
+    stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    try:
+        resolve_stages(stages)
+    except ValueError as error:
+        parser.error(str(error))
+    for path in run(args.source, stages, args.out, args.engine, args.format):
+        print(path)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
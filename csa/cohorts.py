@@ -0,0 +1,202 @@
+"""Acquisition cohorts: retention and revenue by cohort and age, and CLV
+per cohort.
+
+The CLV cells reduce every customer's first and last order to one average
+lifespan. Here each customer belongs to the cohort of the month (or
+quarter) of their first order, and each order line to the cell (cohort,
+age), the age being the number of periods since that first one. One pass
+over the rows gives, per cell, the customers active in it and the revenue;
+only the cells that have any, typically a small fraction of cohorts x ages,
+are stored, as coordinates and values::
+
+    table = CohortTable.from_frame(df, freq='M')
+    table.retention()          # share of each cohort active at each age
+    table.revenue()
+    table.update(next_month)   # later periods, folded into the same cells
+    table.clv()                # aov, pf, avg_ls_years and clv per cohort
+
+``to_scipy`` hands a matrix over as a ``scipy.sparse`` one where SciPy is
+installed.
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.customers import customer_metrics
+from csa.trace import stage
+
+try:
+    from scipy import sparse
+except ImportError:  # pragma: no cover
+    sparse = None
+
+MEASURES = ('CUSTOMERS', 'REVENUE')
+
+
+def _period_ordinals(dates, freq):
+    return pd.PeriodIndex(dates, freq=freq).asi8
+
+
+def _agg_customers(parts):
+    # Per-customer state of several batches, combined
+    combined = pd.concat(parts)
+    if len(parts) == 1 or combined.index.is_unique:
+        return combined
+    return combined.groupby(level=0, sort=False).agg({
+        'COHORT': 'min', 'LAST_ACTIVE': 'max',
+        'FIRST_ORDER_DATE': 'min', 'LAST_ORDER_DATE': 'max',
+        'FREQUENCY': 'sum', 'ORDERS': 'sum', 'MONETARY': 'sum'})
+
+
+def cohort_clv(customers):
+    """``aov``, ``pf``, ``avg_ls_years`` and ``clv`` per ``COHORT``, from
+    per-customer metrics with a ``COHORT`` column, rounded as
+    ``csa.customers.clv_summary`` rounds the global figures."""
+    lifespan = (customers['LAST_ORDER_DATE']
+                - customers['FIRST_ORDER_DATE']).dt.days
+    groups = customers.assign(LIFESPAN=lifespan).groupby('COHORT')
+    totals = groups.agg(MONETARY=('MONETARY', 'sum'),
+                        FREQUENCY=('FREQUENCY', 'sum'),
+                        ORDERS=('ORDERS', 'sum'),
+                        CUSTOMERS=('MONETARY', 'size'),
+                        LIFESPAN=('LIFESPAN', 'mean'))
+    clv = pd.DataFrame({
+        'customers': totals['CUSTOMERS'],
+        'aov': (totals['MONETARY'] / totals['FREQUENCY']).round(2),
+        'pf': (totals['ORDERS'] / totals['CUSTOMERS']).round(2),
+        'avg_ls_years': (totals['LIFESPAN'] / 365).round(2),
+    })
+    clv['clv'] = (clv['aov'] * clv['pf'] * clv['avg_ls_years']).round(2)
+    return clv
+
+
+class CohortTable:
+    """Customers active and revenue per (cohort, age) cell, kept sparse,
+    and the per-customer state that extends them batch by batch."""
+
+    def __init__(self, freq='M'):
+        self.freq = freq
+        # (COHORT, AGE) -> CUSTOMERS, REVENUE; cohorts as period ordinals
+        self.cells = pd.DataFrame(
+            {'CUSTOMERS': pd.Series(dtype=np.int64),
+             'REVENUE': pd.Series(dtype=np.float64)},
+            index=pd.MultiIndex.from_arrays([[], []], names=['COHORT', 'AGE']))
+        self.customers = None
+        self.latest = None
+
+    @classmethod
+    def from_frame(cls, df, freq='M'):
+        """The cohorts of a cleaned, enriched frame."""
+        return cls(freq).update(df)
+
+    def update(self, df):
+        """Add the rows of a batch of later orders; returns the table.
+
+        Orders must arrive whole and in period order: a batch may continue
+        the latest period seen but not reach before it.
+        """
+        with stage('cohorts', rows_in=len(df)):
+            return self._update(df)
+
+    def _update(self, df):
+        keep = (df['ORDER_DATE'].notna() & df['CUSTOMER_NAME'].notna()).to_numpy()
+        df = df[keep]
+        if not len(df):
+            return self
+        periods = _period_ordinals(df['ORDER_DATE'], self.freq)
+        if self.latest is not None and periods.min() < self.latest:
+            raise ValueError(f'rows from {self._label(periods.min())} are before '
+                             f'the latest period seen, {self._label(self.latest)}; '
+                             'rebuild the table with CohortTable.from_frame')
+
+        codes, names = pd.factorize(np.asarray(df['CUSTOMER_NAME'], dtype=object))
+        first = np.full(len(names), np.iinfo(np.int64).max)
+        np.minimum.at(first, codes, periods)
+        last_active = np.full(len(names), np.iinfo(np.int64).min)
+        if self.customers is not None:
+            known = self.customers.index.get_indexer(names)
+            seen = known >= 0
+            first[seen] = self.customers['COHORT'].to_numpy()[known[seen]]
+            last_active[seen] = self.customers['LAST_ACTIVE'].to_numpy()[known[seen]]
+
+        cohorts = first[codes]
+        ages = periods - cohorts
+        span = int(ages.max()) + 1
+        cell_keys = cohorts * span + ages
+        # A customer counts once per period, and not again for a period an
+        # earlier batch already counted
+        _, pair_rows = np.unique(codes.astype(np.int64) * span + ages,
+                                     return_index=True)
+        new = periods[pair_rows] > last_active[codes[pair_rows]]
+        sales = np.nan_to_num(df['SALES'].to_numpy(dtype=np.float64))
+
+        keys, inverse = np.unique(cell_keys, return_inverse=True)
+        revenue = np.bincount(inverse, weights=sales, minlength=len(keys))
+        active = np.bincount(inverse[pair_rows[new]], minlength=len(keys))
+        part = pd.DataFrame({'CUSTOMERS': active, 'REVENUE': revenue},
+                            index=pd.MultiIndex.from_arrays(
+                                [keys // span, keys % span],
+                                names=['COHORT', 'AGE']))
+        self.cells = part if not len(self.cells) else self.cells.add(
+            part, fill_value=0).astype({'CUSTOMERS': np.int64})
+
+        metrics = customer_metrics(df).reindex(names)
+        metrics.insert(0, 'COHORT', first)
+        last = np.full(len(names), np.iinfo(np.int64).min)
+        np.maximum.at(last, codes, periods)
+        metrics.insert(1, 'LAST_ACTIVE', last)
+        parts = [metrics] if self.customers is None else [self.customers, metrics]
+        self.customers = _agg_customers(parts)
+        self.latest = int(periods.max())
+        return self
+
+    def _label(self, ordinal):
+        return pd.Period(ordinal=int(ordinal), freq=self.freq)
+
+    def _cohort_index(self, ordinals):
+        return pd.PeriodIndex.from_ordinals(ordinals, freq=self.freq).rename('COHORT')
+
+    def matrix(self, measure='CUSTOMERS'):
+        """``measure`` per cohort (rows) and age (columns), dense: zero
+        where a cohort had nothing at an age, NaN past the latest period."""
+        if measure not in MEASURES:
+            raise KeyError(f'unknown measure {measure!r}, expected one of {MEASURES}')
+        if not len(self.cells):
+            return pd.DataFrame()
+        cohorts = np.arange(self.cells.index.get_level_values('COHORT').min(),
+                            self.latest + 1)
+        ages = np.arange(self.latest - cohorts[0] + 1)
+        dense = np.zeros((len(cohorts), len(ages)))
+        rows = self.cells.index.get_level_values('COHORT') - cohorts[0]
+        dense[rows, self.cells.index.get_level_values('AGE')] = self.cells[measure]
+        dense[ages[None, :] > (self.latest - cohorts)[:, None]] = np.nan
+        return pd.DataFrame(dense, index=self._cohort_index(cohorts),
+                            columns=pd.Index(ages, name='AGE'))
+
+    def retention(self):
+        """Share of each cohort's customers active at each age."""
+        customers = self.matrix('CUSTOMERS')
+        return customers.div(customers[0], axis=0)
+
+    def revenue(self):
+        """``SALES`` per cohort and age."""
+        return self.matrix('REVENUE')
+
+    def to_scipy(self, measure='CUSTOMERS'):
+        """``measure`` as a ``scipy.sparse`` CSR matrix of cohorts (from the
+        first) by ages, and the cohort labels of its rows."""
+        if sparse is None:
+            raise ImportError('sparse matrices need scipy: pip install scipy')
+        first = self.cells.index.get_level_values('COHORT').min()
+        rows = self.cells.index.get_level_values('COHORT') - first
+        ages = self.cells.index.get_level_values('AGE')
+        shape = (self.latest - first + 1, self.latest - first + 1)
+        matrix = sparse.csr_matrix((self.cells[measure].to_numpy(), (rows, ages)),
+                                   shape=shape)
+        return matrix, self._cohort_index(np.arange(first, self.latest + 1))
+
+    def clv(self):
+        """CLV figures per cohort (see ``cohort_clv``)."""
+        customers = self.customers.assign(
+            COHORT=self._cohort_index(self.customers['COHORT'].to_numpy()))
+        return cohort_clv(customers)
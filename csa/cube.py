@@ -0,0 +1,276 @@
+"""A materialized sales cube for slice, dice, roll-up and drill-down queries.
+
+``SalesCube`` holds dense NumPy arrays over the dimensions in ``DIMENSIONS``:
+the sums of ``SALES``, ``QUANTITY_ORDERED`` and ``PROFIT``, the number of
+order lines and the number of distinct orders per cell. A query sums the
+axes it does not keep, after selecting the labels it filters on, so its
+cost depends on the number of cells, not the number of rows::
+
+    cube = SalesCube.from_frame(df)
+    cube.pivot('SALES', 'MONTH_ID', 'PRODUCT_LINE')         # the heatmap
+    cube.query('SALES', by=['QTR_ID', 'COUNTRY'])           # drill down
+    cube.query('PROFIT', by='YEAR_ID', where={'TERRITORY': 'EMEA'})
+
+``update`` folds new rows into the arrays, growing an axis when a new label
+(a new year, country, ...) shows up.
+
+Dimensions that are functions of another (``QTR_ID`` of ``MONTH_ID``, see
+``DERIVED``) are not stored: with both as axes, three quarters of the cells
+could never hold a row. A query on them runs on the dimension they derive
+from, and its labels are mapped and summed afterwards.
+
+Distinct orders don't add up across ``PRODUCT_LINE`` and ``DEAL_SIZE``: one
+order has lines of several product lines and deal sizes, while its date and
+customer (so its country and territory) are the same on every line. The
+cube therefore keeps one order count array per subset of those two
+dimensions, with the others summed away exactly, and a query uses the one
+matching the line dimensions it keeps or filters on.
+"""
+
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+
+from csa.rollups import ROLLUPS, shape_rollup
+from csa.trace import stage
+
+DIMENSIONS = ('YEAR_ID', 'MONTH_ID', 'PRODUCT_LINE', 'COUNTRY', 'TERRITORY',
+              'DEAL_SIZE')
+# Dimension -> (stored dimension, function of its labels giving this one's)
+DERIVED = {
+    'QTR_ID': ('MONTH_ID',
+               lambda months: (np.asarray(months, dtype=object) - 1) // 3 + 1),
+}
+MEASURES = ('SALES', 'QUANTITY_ORDERED', 'PROFIT')
+# Dimensions that can differ between the lines of one order
+LINE_DIMENSIONS = ('PRODUCT_LINE', 'DEAL_SIZE')
+# Measures that are counts rather than sums of a column
+LINES = 'LINES'
+ORDERS = 'ORDERS'
+
+
+def _as_list(value):
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple)):
+        return list(value)
+    return [value]
+
+
+class SalesCube:
+    """Sums and counts of sales rows over every combination of dimensions."""
+
+    def __init__(self, dimensions=DIMENSIONS, measures=MEASURES):
+        self.dimensions = list(dimensions)
+        self.measures = list(measures)
+        self.line_dimensions = [d for d in LINE_DIMENSIONS if d in self.dimensions]
+        self.axes = {dimension: pd.Index([], dtype=object)
+                     for dimension in self.dimensions}
+        empty = (0,) * len(self.dimensions)
+        self.sums = {measure: np.zeros(empty) for measure in self.measures}
+        self.lines = np.zeros(empty, dtype=np.int64)
+        # Line dimensions kept -> distinct orders, the other line dimensions
+        # summed away (their axes have length 1)
+        self.orders = {
+            kept: np.zeros(empty, dtype=np.int64)
+            for size in range(len(self.line_dimensions) + 1)
+            for kept in combinations(self.line_dimensions, size)}
+        self._seen_orders = np.empty(0, dtype=np.int64)
+
+    @classmethod
+    def from_frame(cls, df, dimensions=DIMENSIONS, measures=MEASURES):
+        """The cube of a cleaned, enriched frame (with ``PROFIT``)."""
+        return cls(dimensions, measures).update(df)
+
+    @property
+    def queryable(self):
+        """The stored dimensions and those derived from them."""
+        return self.dimensions + [d for d, (source, _) in DERIVED.items()
+                                  if source in self.dimensions
+                                  and d not in self.dimensions]
+
+    @property
+    def shape(self):
+        return tuple(len(self.axes[dimension]) for dimension in self.dimensions)
+
+    def _order_shape(self, kept):
+        return tuple(1 if d in self.line_dimensions and d not in kept else n
+                     for d, n in zip(self.dimensions, self.shape))
+
+    def _codes(self, df):
+        # Axis positions of every row, adding labels not seen before
+        codes = []
+        for dimension in self.dimensions:
+            row_codes, labels = pd.factorize(np.asarray(df[dimension], dtype=object),
+                                             use_na_sentinel=False)
+            axis = self.axes[dimension]
+            new = pd.Index(labels, dtype=object).difference(axis, sort=False)
+            if len(new):
+                axis = self.axes[dimension] = axis.append(new)
+            codes.append(axis.get_indexer(labels)[row_codes])
+        self._grow()
+        return codes
+
+    def _grow(self):
+        # Pad every array with zeros up to the current axis lengths
+        def padded(array, shape):
+            if array.shape == shape:
+                return array
+            return np.pad(array, [(0, n - m) for m, n in zip(array.shape, shape)])
+
+        self.sums = {m: padded(a, self.shape) for m, a in self.sums.items()}
+        self.lines = padded(self.lines, self.shape)
+        self.orders = {kept: padded(a, self._order_shape(kept))
+                       for kept, a in self.orders.items()}
+
+    def update(self, df):
+        """Add the rows of ``df``; returns the cube.
+
+        Orders must arrive whole: lines of an order already in the cube
+        would make its distinct order counts wrong, so they are refused.
+        """
+        with stage('cube', rows_in=len(df)):
+            return self._update(df)
+
+    def _update(self, df):
+        order_numbers = df['ORDER_NUMBER'].to_numpy(dtype=np.int64)
+        batch_orders, order_codes = np.unique(order_numbers, return_inverse=True)
+        if np.isin(batch_orders, self._seen_orders, assume_unique=True).any():
+            raise ValueError('rows of orders already in the cube; rebuild it '
+                             'with SalesCube.from_frame instead')
+
+        codes = self._codes(df)
+        cells = np.ravel_multi_index(codes, self.shape)
+        size = int(np.prod(self.shape))
+        self.lines += np.bincount(cells, minlength=size).reshape(self.shape)
+        for measure in self.measures:
+            weights = np.nan_to_num(df[measure].to_numpy(dtype=np.float64))
+            self.sums[measure] += np.bincount(cells, weights=weights,
+                                              minlength=size).reshape(self.shape)
+
+        for kept, counts in self.orders.items():
+            shape = self._order_shape(kept)
+            order_cells = np.ravel_multi_index(
+                [c if n > 1 or d not in self.line_dimensions else np.zeros_like(c)
+                 for c, d, n in zip(codes, self.dimensions, shape)], shape)
+            # Each (order, cell) pair counts once
+            pairs = np.unique(order_codes.astype(np.int64) * counts.size
+                              + order_cells)
+            counts += np.bincount(pairs % counts.size,
+                                  minlength=counts.size).reshape(shape)
+        self._seen_orders = np.union1d(self._seen_orders, batch_orders)
+        return self
+
+    def _array(self, measure, by, where):
+        if measure == LINES:
+            return self.lines
+        if measure in self.sums:
+            return self.sums[measure]
+        if measure != ORDERS:
+            raise KeyError(f'unknown measure {measure!r}, expected one of '
+                           f'{self.measures + [LINES, ORDERS]}')
+        kept = []
+        for dimension in self.line_dimensions:
+            if dimension in by:
+                kept.append(dimension)
+            elif dimension in where:
+                if len(_as_list(where[dimension])) > 1:
+                    raise ValueError(f'distinct orders cannot be added up '
+                                     f'across several {dimension} values')
+                kept.append(dimension)
+        return self.orders[tuple(kept)]
+
+    def _select(self, array, where):
+        for dimension, labels in where.items():
+            axis = self.dimensions.index(dimension)
+            if array.shape[axis] == 1 and len(self.axes[dimension]) != 1:
+                continue  # summed away already (an order count array)
+            positions = self.axes[dimension].get_indexer(_as_list(labels))
+            array = array.take(positions[positions >= 0], axis=axis)
+        return array
+
+    def query(self, measure, by=None, where=None):
+        """``measure`` per combination of the ``by`` dimensions.
+
+        ``where`` maps dimensions to a label or a list of labels to keep
+        (slice and dice). Returns a Series indexed by the ``by`` labels,
+        sorted, with only the combinations that have rows (like a
+        ``groupby``), or a single number without ``by``.
+        """
+        by, where = _as_list(by), dict(where or {})
+        for dimension in by + list(where):
+            if dimension not in self.queryable:
+                raise KeyError(f'unknown dimension {dimension!r}, expected one '
+                               f'of {self.queryable}')
+        if any(d not in self.axes for d in by + list(where)):
+            return self._query_derived(measure, by, where)
+        values = self._select(self._array(measure, by, where), where)
+        lines = self._select(self.lines, where)
+        summed = tuple(i for i, d in enumerate(self.dimensions) if d not in by)
+        values, lines = values.sum(axis=summed), lines.sum(axis=summed)
+        if not by:
+            return values.item()
+
+        # Axes are in cube order after the sum; put them in ``by`` order
+        kept = [d for d in self.dimensions if d in by]
+        order = [kept.index(d) for d in by]
+        values, lines = values.transpose(order), lines.transpose(order)
+        labels = [self._labels(d, where) for d in by]
+        index = pd.MultiIndex.from_product(labels, names=by)
+        result = pd.Series(values.ravel(), index=index, name=measure)
+        result = result[lines.ravel() > 0].sort_index()
+        if len(by) == 1:
+            result.index = result.index.get_level_values(0)
+        return result
+
+    def _query_derived(self, measure, by, where):
+        # The query on the stored dimensions the derived ones come from,
+        # its labels then mapped and summed
+        derived = {d: DERIVED[d] for d in by + list(where) if d not in self.axes}
+        for dimension, (source, func) in derived.items():
+            if dimension not in where:
+                continue
+            labels = self.axes[source]
+            keep = labels[pd.Index(func(labels)).isin(_as_list(where.pop(dimension)))]
+            if source in where:
+                keep = keep.intersection(pd.Index(_as_list(where[source])),
+                                         sort=False)
+            where[source] = list(keep)
+        stored_by = list(dict.fromkeys(derived[d][0] if d in derived else d
+                                       for d in by))
+        totals = self.query(measure, by=stored_by or None, where=where)
+        if not by:
+            return totals
+        rows = totals.reset_index()
+        for dimension, (source, func) in derived.items():
+            if dimension in by:
+                rows[dimension] = func(rows[source])
+        return rows.groupby(by if len(by) > 1 else by[0])[measure].sum()
+
+    def _labels(self, dimension, where):
+        axis = self.axes[dimension]
+        if dimension not in where:
+            return axis
+        positions = axis.get_indexer(_as_list(where[dimension]))
+        return axis[positions[positions >= 0]]
+
+    def pivot(self, measure, index, columns, where=None):
+        """``measure`` with ``index`` labels as rows and ``columns`` labels
+        as columns, like ``pivot_table(..., aggfunc='sum')``."""
+        return self.query(measure, by=[index, columns], where=where).unstack(columns)
+
+
+def cube_rollups(cube, names=None):
+    """The named rollups (by default, all whose dimensions and measure are
+    in the cube) in the notebook's layout, read off ``cube``."""
+    if names is None:
+        names = [name for name, (by, measure, _) in ROLLUPS.items()
+                 if set(_as_list(by)) <= set(cube.queryable)
+                 and measure in cube.measures]
+    results = {}
+    for name in names:
+        by, measure, _ = ROLLUPS[name]
+        totals = cube.query(measure, by=_as_list(by))
+        results[name] = shape_rollup(name, totals)
+    return results
@@ -0,0 +1,132 @@
+"""Customer-level results: the RFM table and the CLV figures.
+
+Both are derived from a per-customer summary indexed by ``CUSTOMER_NAME``
+with the columns in ``CUSTOMER_COLUMNS``, so they can be built from a full
+frame (``customer_metrics``) or from partial summaries merged across chunks.
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.trace import traced
+
+CUSTOMER_COLUMNS = ['FIRST_ORDER_DATE', 'LAST_ORDER_DATE', 'FREQUENCY',
+                    'MONETARY']
+
+
+def _customer_codes(names):
+    if isinstance(names.dtype, pd.CategoricalDtype):
+        return names.cat.codes.to_numpy(), names.cat.categories
+    return pd.factorize(names, sort=True)
+
+
+def _where(mask, values):
+    # Skip the copy of a boolean selection when nothing is masked out
+    return values if mask.all() else values[mask]
+
+
+@traced('customers')
+def customer_metrics(df):
+    """Every per-customer metric of the analysis in one grouped pass.
+
+    Customers are factorized once into integer codes, and the codes drive
+    all reductions: first and last ``ORDER_DATE``, ``FREQUENCY`` (order
+    lines, as the notebook counts them), ``ORDERS`` (distinct order numbers)
+    and ``MONETARY`` (sales sum). Rows without a customer are ignored.
+    """
+    codes, names = _customer_codes(df['CUSTOMER_NAME'])
+    valid = codes >= 0
+    codes = _where(valid, codes).astype(np.intp)
+    n = len(names)
+    rows = np.bincount(codes, minlength=n)
+
+    orders = _where(valid, df['ORDER_NUMBER'].to_numpy())
+    has_order = pd.notna(orders)
+    order_customers = _where(has_order, codes)
+    frequency = np.bincount(order_customers, minlength=n)
+
+    sales = _where(valid, df['SALES'].to_numpy(dtype=np.float64))
+    has_sales = ~np.isnan(sales)
+    monetary = np.bincount(_where(has_sales, codes),
+                           weights=_where(has_sales, sales), minlength=n)
+
+    # Dates as int64 nanoseconds; NaT rows don't take part in min/max
+    dates = _where(valid, df['ORDER_DATE'].to_numpy(dtype='datetime64[ns]'))
+    has_date = ~np.isnat(dates)
+    dated_customers = _where(has_date, codes)
+    ticks = _where(has_date, dates.view(np.int64))
+    first = np.full(n, np.iinfo(np.int64).max)
+    last = np.full(n, np.iinfo(np.int64).min)
+    np.minimum.at(first, dated_customers, ticks)
+    np.maximum.at(last, dated_customers, ticks)
+    dated = np.bincount(dated_customers, minlength=n) > 0
+    nat = np.iinfo(np.int64).min
+    first = np.where(dated, first, nat).view('datetime64[ns]')
+    last = np.where(dated, last, nat).view('datetime64[ns]')
+
+    # Distinct (customer, order) pairs, counted per customer
+    order_codes, order_numbers = pd.factorize(_where(has_order, orders))
+    width = max(len(order_numbers), 1)
+    pairs = pd.unique(order_customers.astype(np.int64) * width + order_codes)
+    distinct_orders = np.bincount(pairs // width, minlength=n)
+
+    metrics = pd.DataFrame({
+        'FIRST_ORDER_DATE': first,
+        'LAST_ORDER_DATE': last,
+        'FREQUENCY': frequency,
+        'ORDERS': distinct_orders,
+        'MONETARY': monetary,
+    }, index=pd.Index(names, name='CUSTOMER_NAME'))
+    # Categories without any row (e.g. filtered out) are not customers here
+    return metrics[rows > 0]
+
+
+def add_rfm_scores(rfm):
+    """Add ``R_SCORE``, ``F_SCORE``, ``M_SCORE`` and ``RFM_SCORE``, in place."""
+    rfm['R_SCORE'] = rfm['LAST_ORDER_DATE'].rank(ascending=False)
+    rfm['F_SCORE'] = rfm['FREQUENCY'].rank(ascending=True)
+    rfm['M_SCORE'] = rfm['MONETARY'].rank(ascending=True)
+    # Combine the RFM scores into a single score
+    rfm['RFM_SCORE'] = rfm['R_SCORE'] + rfm['F_SCORE'] + rfm['M_SCORE']
+    return rfm
+
+
+@traced('rfm')
+def rfm_table(customers):
+    """Build the notebook's ``rfm`` frame from a per-customer summary."""
+    rfm = customers[['LAST_ORDER_DATE', 'FREQUENCY', 'MONETARY']].reset_index()
+    rfm = rfm.sort_values(by='LAST_ORDER_DATE', ascending=False,
+                          kind='mergesort', ignore_index=True)
+    return add_rfm_scores(rfm)
+
+
+def clv_summary(total_sales, order_rows, unique_orders, unique_customers,
+                lifespan_days):
+    """Compute ``aov``, ``pf``, ``avg_ls_years`` and ``clv`` as the notebook does.
+
+    ``lifespan_days`` holds one lifespan (last minus first order, in days)
+    per customer.
+    """
+    aov = round(total_sales / order_rows, 2)
+    pf = round(unique_orders / unique_customers, 2)
+    avg_ls_years = round(lifespan_days.mean() / 365, 2)
+    clv = round(aov * pf * avg_ls_years, 2)
+    return {'aov': aov, 'pf': pf, 'avg_ls_years': avg_ls_years, 'clv': clv}
+
+
+@traced('clv')
+def clv_from_metrics(metrics):
+    """``aov``, ``pf``, ``avg_ls_years`` and ``clv`` from ``customer_metrics``.
+
+    The distinct order count is the sum of the per-customer counts, which
+    equals ``ORDER_NUMBER.nunique()`` as long as every order belongs to a
+    single customer, as in the sales exports.
+    """
+    return clv_summary(
+        total_sales=metrics['MONETARY'].sum(),
+        order_rows=metrics['FREQUENCY'].sum(),
+        unique_orders=metrics['ORDERS'].sum(),
+        unique_customers=len(metrics),
+        lifespan_days=(metrics['LAST_ORDER_DATE']
+                       - metrics['FIRST_ORDER_DATE']).dt.days,
+    )
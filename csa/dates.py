@@ -0,0 +1,121 @@
+"""ORDER_DATE normalization.
+
+The raw export mixes two layouts, ``M/D/YYYY H:MM`` and ``MM-DD-YYYY HH:MM``
+(the same two the ``CSA in MySQL.sql`` UPDATEs special-case). Instead of
+calling ``pd.to_datetime`` once per row, every distinct string is parsed once,
+grouped by layout and with an explicit format, and the result is broadcast
+back to the rows.
+"""
+
+from dataclasses import dataclass, field
+
+import numpy as np
+import pandas as pd
+
+from csa.trace import traced
+
+# Layout marker -> explicit strptime format
+DATE_FORMATS = {
+    '/': '%m/%d/%Y %H:%M',
+    '-': '%m-%d-%Y %H:%M',
+}
+
+
+def standardize_date(date_str):
+    """Parse one date string with format inference (the original notebook cell).
+
+    Only used as the slow path for strings matching neither known layout.
+    """
+    try:
+        return pd.to_datetime(date_str)
+    except ValueError:
+        return None
+
+
+@dataclass
+class DateParseReport:
+    """How the rows of one ``normalize_order_dates`` call were parsed."""
+
+    rows: int = 0
+    distinct: int = 0
+    cached: int = 0
+    by_format: dict = field(default_factory=dict)
+    fallback: int = 0
+    nat: int = 0
+
+    def merge(self, other):
+        """Add the counts of ``other`` (e.g. the next chunk) to this report."""
+        self.rows += other.rows
+        self.distinct += other.distinct
+        self.cached += other.cached
+        for layout, rows in other.by_format.items():
+            self.by_format[layout] = self.by_format.get(layout, 0) + rows
+        self.fallback += other.fallback
+        self.nat += other.nat
+        return self
+
+
+@traced('dates')
+def normalize_order_dates(values, cache=None):
+    """Parse a column of raw ORDER_DATE strings.
+
+    Parameters
+    ----------
+    values : pd.Series
+        Raw ``ORDER_DATE`` strings.
+    cache : dict, optional
+        Mapping of already parsed strings to timestamps. It is consulted
+        before parsing and updated afterwards, so passing the same dict for
+        every chunk of a file parses each distinct string only once.
+
+    Returns
+    -------
+    (pd.Series, DateParseReport)
+        The parsed dates (``NaT`` where nothing could be parsed), aligned to
+        ``values.index``, and the counts of how the rows were parsed.
+    """
+    values = pd.Series(values)
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(np.asarray(uniques, dtype=object))
+    # Rows per distinct string, so the report counts rows, not strings
+    weights = np.bincount(codes[codes >= 0], minlength=len(uniques))
+
+    parsed = pd.Series(pd.NaT, index=uniques.index, dtype='datetime64[ns]')
+    todo = np.ones(len(uniques), dtype=bool)
+    found = np.zeros(len(uniques), dtype=bool)
+    report = DateParseReport(rows=len(values), distinct=len(uniques))
+
+    if cache:
+        hits = uniques.map(cache)
+        found = hits.notna().to_numpy()
+        parsed[found] = pd.to_datetime(hits[found])
+        todo &= ~found
+        report.cached = int(weights[found].sum())
+
+    # One vectorized pass per known layout
+    for marker, fmt in DATE_FORMATS.items():
+        group = todo & uniques.str.contains(marker, regex=False).to_numpy()
+        if not group.any():
+            continue
+        result = pd.to_datetime(uniques[group], format=fmt, errors='coerce')
+        ok = result.notna().to_numpy()
+        parsed[np.flatnonzero(group)[ok]] = result[ok]
+        todo[np.flatnonzero(group)[ok]] = False
+        report.by_format[fmt] = int(weights[np.flatnonzero(group)[ok]].sum())
+
+    # Anything left goes through the per-string inference of the notebook
+    slow = np.flatnonzero(todo)
+    if len(slow):
+        report.fallback = int(weights[slow].sum())
+        parsed[slow] = pd.to_datetime(
+            uniques[slow].map(standardize_date), errors='coerce')
+
+    if cache is not None:
+        fresh = ~found & parsed.notna().to_numpy()
+        cache.update(zip(uniques[fresh], parsed[fresh]))
+
+    result = pd.Series(parsed.to_numpy().take(codes), index=values.index,
+                       name=values.name)
+    result[codes < 0] = pd.NaT
+    report.nat = int(result.isna().sum())
+    return result, report
@@ -0,0 +1,254 @@
+"""Row fingerprints and a persistent index of them, to drop duplicates
+across loads.
+
+``df.duplicated()`` compares every column of the rows in memory, so it only
+finds duplicates within one file. Here each row is reduced to a 64-bit
+fingerprint in one vectorized pass (``pd.util.hash_pandas_object``, whose
+key is fixed, so fingerprints agree between processes and runs), either of
+the whole row or of a business key such as ``BUSINESS_KEY``.
+
+A ``FingerprintIndex`` stores the fingerprints of everything ingested so far
+as sorted, memory-mapped segment files. Checking a new export binary-searches
+the segments for its fingerprints, touching O(log n) pages each, and adding
+it writes one new segment, so the cost follows the size of the new export
+and history is never loaded. The fingerprints of a chunk are only stored
+once the chunk has been processed, so a load that fails halfway can simply
+be retried::
+
+    index = FingerprintIndex('.csa_dedup', key=BUSINESS_KEY)
+    for chunk in read_new_chunks('export.csv', index):
+        analysis.update_raw(chunk)
+
+Two different rows share a fingerprint with probability about
+``n ** 2 / 2 ** 65``: one in 37 million at a million rows.
+"""
+
+import argparse
+import glob
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from csa.ingest import DEFAULT_CHUNKSIZE, read_chunks
+
+DEFAULT_INDEX_DIR = '.csa_dedup'
+BUSINESS_KEY = ('ORDER_NUMBER', 'ORDER_LINE_NUMBER')
+# Segments are merged into one when there are more than this
+MAX_SEGMENTS = 16
+
+
+def _canonical(column):
+    # Numbers as float64, whatever dtype the load gave them
+    if pd.api.types.is_bool_dtype(column):
+        return column
+    if pd.api.types.is_numeric_dtype(column):
+        return column.astype(np.float64)
+    if column.dtype == object:
+        try:
+            # Raises at the first non-number, so text columns cost little
+            return pd.to_numeric(column).astype(np.float64)
+        except (ValueError, TypeError):
+            return column
+    return column
+
+
+def row_fingerprints(df, columns=None):
+    """64-bit fingerprint of each row of ``df`` over ``columns`` (all by
+    default), as a uint64 array.
+
+    Columns are hashed in name order, numbers as float64 (object columns
+    too when every value is a number) and categoricals by their values, so
+    a re-export with its columns reordered, or a column read as int in one
+    load and float or object in another, gives the same fingerprints.
+    """
+    frame = df[sorted(df.columns if columns is None else columns)].apply(
+        _canonical)
+    return pd.util.hash_pandas_object(frame, index=False).to_numpy()
+
+
+def duplicated(df, columns=None):
+    """Like ``df.duplicated(columns)``, comparing fingerprints instead of
+    the values of every column."""
+    fingerprints = row_fingerprints(df, columns)
+    return pd.Series(pd.Series(fingerprints).duplicated().to_numpy(),
+                     index=df.index)
+
+
+class FingerprintIndex:
+    """Fingerprints of all rows ingested so far, in sorted segment files
+    under ``path``.
+
+    ``key`` is the columns identifying a row (``BUSINESS_KEY`` for order
+    lines), or ``None`` to compare whole rows. It is recorded with the index,
+    which refuses to be reopened with another key.
+
+    Fingerprints given to ``stage`` are looked up like stored ones but only
+    written by ``commit``; ``discard`` forgets them.
+    """
+
+    def __init__(self, path=DEFAULT_INDEX_DIR, key=None):
+        self.path = path
+        self.key = None if key is None else list(key)
+        os.makedirs(path, exist_ok=True)
+        key_file = os.path.join(path, 'key.json')
+        if os.path.exists(key_file):
+            with open(key_file) as stored:
+                stored_key = json.load(stored)
+            if stored_key != self.key:
+                raise ValueError(f'the index at {path} fingerprints '
+                                 f'{stored_key or "whole rows"}, not '
+                                 f'{self.key or "whole rows"}')
+        else:
+            with open(key_file, 'w') as stored:
+                json.dump(self.key, stored)
+        self.staged = []
+        self._load()
+
+    def _load(self):
+        self.files = sorted(glob.glob(os.path.join(self.path, 'segment-*.npy')))
+        self.segments = [np.load(name, mmap_mode='r') for name in self.files]
+
+    def __len__(self):
+        return sum(len(segment) for segment in self.segments)
+
+    def contains(self, fingerprints):
+        """Whether each of ``fingerprints`` is in the index."""
+        fingerprints = np.asarray(fingerprints, dtype=np.uint64)
+        found = np.zeros(len(fingerprints), dtype=bool)
+        for segment in self.segments + self.staged:
+            if not len(segment):
+                continue
+            positions = np.searchsorted(segment, fingerprints)
+            positions = np.minimum(positions, len(segment) - 1)
+            found |= segment[positions] == fingerprints
+        return found
+
+    def add(self, fingerprints):
+        """Store ``fingerprints`` (duplicates of stored ones are kept out);
+        returns how many were new."""
+        fingerprints = np.unique(np.asarray(fingerprints, dtype=np.uint64))
+        fingerprints = fingerprints[~self.contains(fingerprints)]
+        self.append(fingerprints)
+        return len(fingerprints)
+
+    def append(self, fingerprints):
+        """Store ``fingerprints``, known to be new and distinct, as one more
+        segment."""
+        if len(fingerprints):
+            self._write(np.sort(fingerprints))
+            self._load()
+        if len(self.segments) > MAX_SEGMENTS:
+            self.compact()
+
+    def stage(self, fingerprints):
+        """Hold ``fingerprints``, known to be new and distinct, until
+        ``commit``."""
+        if len(fingerprints):
+            self.staged.append(np.sort(np.asarray(fingerprints, dtype=np.uint64)))
+
+    def commit(self):
+        """Store the staged fingerprints."""
+        if self.staged:
+            self.append(np.concatenate(self.staged))
+            self.staged = []
+
+    def discard(self):
+        """Forget the staged fingerprints."""
+        self.staged = []
+
+    def _write(self, fingerprints):
+        number = (int(os.path.basename(self.files[-1])[len('segment-'):-4]) + 1
+                  if self.files else 0)
+        name = os.path.join(self.path, f'segment-{number:06d}.npy')
+        # Through a temporary file, so a crash never leaves half a segment
+        with open(name + '.tmp', 'wb') as partial:
+            np.save(partial, fingerprints)
+        os.replace(name + '.tmp', name)
+
+    def compact(self):
+        """Merge all segments into one, so lookups search a single array."""
+        if len(self.files) < 2:
+            return
+        old = self.files
+        # Numbered after the segments it replaces, so a crash before they
+        # are removed leaves only duplicates behind
+        self._write(np.unique(np.concatenate(self.segments)))
+        self.segments = []
+        for name in old:
+            os.remove(name)
+        self._load()
+
+
+class DedupReport:
+    """Rows read, and the duplicates dropped within the load and against
+    earlier loads."""
+
+    def __init__(self):
+        self.rows = 0
+        self.within = 0
+        self.seen_before = 0
+
+    @property
+    def new(self):
+        return self.rows - self.within - self.seen_before
+
+    def __repr__(self):
+        return (f'DedupReport(rows={self.rows}, new={self.new}, '
+                f'within={self.within}, seen_before={self.seen_before})')
+
+
+def drop_seen(df, index, report=None):
+    """The rows of ``df`` not in ``index`` and not repeated within ``df``
+    (first occurrence kept). Their fingerprints are staged in ``index``;
+    ``index.commit()`` stores them once the rows are processed."""
+    fingerprints = row_fingerprints(df, index.key)
+    repeated = pd.Series(fingerprints).duplicated().to_numpy()
+    seen = index.contains(fingerprints)
+    keep = ~repeated & ~seen
+    if report is not None:
+        report.rows += len(df)
+        report.within += int(np.count_nonzero(repeated & ~seen))
+        report.seen_before += int(np.count_nonzero(seen))
+    index.stage(fingerprints[keep])
+    return df[keep]
+
+
+def read_new_chunks(path, index, chunksize=DEFAULT_CHUNKSIZE, report=None):
+    """``read_chunks`` of ``path`` without the rows already in ``index``.
+
+    A chunk's fingerprints are committed when the next chunk is asked for
+    (or the file ends), so if processing a chunk fails, its rows are not
+    taken as seen.
+    """
+    try:
+        for chunk in read_chunks(path, chunksize):
+            yield drop_seen(chunk, index, report)
+            index.commit()
+    finally:
+        index.discard()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('sources', nargs='+')
+    parser.add_argument('--index', default=DEFAULT_INDEX_DIR)
+    parser.add_argument('--key', nargs='*', default=None,
+                        help='columns identifying a row (default: whole rows; '
+                             'with no names: ' + ' '.join(BUSINESS_KEY) + ')')
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    args = parser.parse_args(argv)
+
+    key = args.key if args.key or args.key is None else BUSINESS_KEY
+    index = FingerprintIndex(args.index, key)
+    for source in args.sources:
+        report = DedupReport()
+        for _ in read_new_chunks(source, index, args.chunksize, report):
+            pass
+        print(source, report)
+    print(f'{args.index}: {len(index)} fingerprints')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+"""Interchangeable execution engines for the analysis.
+
+Every engine runs the notebook's cleaning steps and aggregations over a
+CSV export (or a cleaned Parquet file from ``csa.cache``) and returns the
+same dict of tables and figures (see ``csa.engines.results``):
+
+- ``pandas``: in memory, one core; the reference.
+- ``chunked``: pandas over bounded chunks (``csa.ingest``), CSV only.
+- ``parallel``: pandas, one process per ``YEAR_ID`` (or other key) shard
+  (``csa.parallel``), CSV only.
+- ``duckdb``: multi-threaded SQL, spills to disk.
+- ``polars``: lazy, multi-threaded, streaming.
+- ``sqlite``: set-based SQL on an embedded SQLite database, CSV only.
+
+``analyze(source, engine='auto')`` picks one by input size.
+"""
+
+import importlib
+import importlib.util
+import os
+
+ENGINES = {
+    'pandas': 'csa.engines.pandas_engine',
+    'chunked': 'csa.engines.chunked_engine',
+    'parallel': 'csa.engines.parallel_engine',
+    'duckdb': 'csa.engines.duckdb_engine',
+    'polars': 'csa.engines.polars_engine',
+    'sqlite': 'csa.engines.sqlite_engine',
+}
+
+# Out-of-core engines in order of preference, and the package each needs
+OUT_OF_CORE = [('duckdb', 'duckdb'), ('polars', 'polars')]
+
+# A pandas frame of the export takes roughly this many times the CSV size
+PANDAS_EXPANSION = 3
+
+
+def get_engine(name):
+    """The module of engine ``name``; it has an ``analyze(source)`` function."""
+    if name not in ENGINES:
+        raise ValueError(f'unknown engine {name!r}, expected one of '
+                         f'{sorted(ENGINES)}')
+    return importlib.import_module(ENGINES[name])
+
+
+def available_memory():
+    """Physical memory in bytes, or ``None`` where it can't be read."""
+    try:
+        return os.sysconf('SC_PHYS_PAGES') * os.sysconf('SC_PAGE_SIZE')
+    except (AttributeError, ValueError, OSError):
+        return None
+
+
+def choose_engine(source, memory_budget=None):
+    """Pick an engine for ``source``.
+
+    pandas while the in-memory frame fits in ``memory_budget`` bytes (a
+    quarter of physical memory by default), otherwise the first installed
+    out-of-core engine, falling back to chunked pandas.
+    """
+    if memory_budget is None:
+        memory = available_memory()
+        memory_budget = memory // 4 if memory else 1 << 30
+    if os.path.getsize(source) * PANDAS_EXPANSION <= memory_budget:
+        return 'pandas'
+    for name, package in OUT_OF_CORE:
+        if importlib.util.find_spec(package) is not None:
+            return name
+    return 'chunked'
+
+
+def analyze(source, engine='auto', **options):
+    """Run the analysis on ``source`` with the given (or chosen) engine."""
+    if engine == 'auto':
+        engine = choose_engine(source)
+    return get_engine(engine).analyze(source, **options)
@@ -0,0 +1,8 @@
+"""The chunked pandas engine: bounded memory, one core (see ``csa.ingest``)."""
+
+from csa.ingest import DEFAULT_CHUNKSIZE, analyze_chunked
+
+
+def analyze(source, chunksize=DEFAULT_CHUNKSIZE, sketch_error=None):
+    return analyze_chunked(source, chunksize=chunksize,
+                           sketch_error=sketch_error).results()
@@ -0,0 +1,151 @@
+"""DuckDB engine: multi-threaded, spills to disk when memory runs out.
+
+The raw export is streamed into a DuckDB temporary table with the
+notebook's cleaning and derived columns computed in SQL, then reduced with
+three GROUP BY queries (rollup base cube, customers, customers per
+country). Needs ``duckdb``, and ``pyarrow`` to stream CSV input: the exports
+are not valid UTF-8, so they are decoded as Latin-1 by pyarrow's reader.
+"""
+
+import pandas as pd
+
+from csa.aggregate import partial_name
+from csa.cleaning import COST_RATIO, DISCOUNT_BINS, DISCOUNT_LABELS
+from csa.dates import DATE_FORMATS
+from csa.engines.results import assemble_results, rollup_dimensions, rollup_specs
+
+try:
+    import duckdb
+except ImportError:  # pragma: no cover
+    duckdb = None
+
+# Column types of the raw export; everything else is read as text
+RAW_TYPES = {
+    'ORDER_NUMBER': 'int64', 'QUANTITY_ORDERED': 'int64',
+    'PRICE_EACH': 'float64', 'ORDER_LINE_NUMBER': 'int64',
+    'SALES': 'float64', 'QTR_ID': 'int64', 'MONTH_ID': 'int64',
+    'YEAR_ID': 'int64', 'MSRP': 'int64',
+}
+
+
+def _discount_category_sql(column):
+    # pd.cut(..., right=False): [0, 10) -> '0-10%', ..., outside -> NULL
+    cases = ' '.join(
+        f"WHEN {column} >= {low} AND {column} < {high} THEN '{label}'"
+        for low, high, label in zip(DISCOUNT_BINS, DISCOUNT_BINS[1:],
+                                    DISCOUNT_LABELS))
+    return f'CASE {cases} END'
+
+
+def _order_date_sql(column):
+    parsers = [f"try_strptime({column}, '{fmt}')" for fmt in DATE_FORMATS.values()]
+    # Anything else falls back to DuckDB's own timestamp parsing
+    parsers.append(f'TRY_CAST({column} AS TIMESTAMP)')
+    return f"COALESCE({', '.join(parsers)})"
+
+
+def cleaning_sql(raw):
+    """SELECT producing the cleaned, enriched rows of relation ``raw``."""
+    return f"""
+    SELECT *,
+           dayname(ORDER_DATE) AS DAY_OF_WEEK,
+           CASE WHEN month(ORDER_DATE) IN (12, 1, 2) THEN 'Winter'
+                WHEN month(ORDER_DATE) IN (3, 4, 5) THEN 'Spring'
+                WHEN month(ORDER_DATE) IN (6, 7, 8) THEN 'Summer'
+                ELSE 'Fall' END AS SEASON,
+           {_discount_category_sql('DISCOUNT')} AS DISCOUNT_CATEGORY,
+           UNIT_PRICE * {COST_RATIO}::DOUBLE AS COST,
+           SALES - (UNIT_PRICE * {COST_RATIO}::DOUBLE) * QUANTITY_ORDERED AS PROFIT
+    FROM (
+        SELECT * EXCLUDE (ADDRESS_LINE2, PRICE_EACH, ORDER_DATE),
+               PRICE_EACH AS UNIT_PRICE,
+               {_order_date_sql('ORDER_DATE')} AS ORDER_DATE,
+               ROUND(GREATEST((MSRP - PRICE_EACH) / MSRP * 100, 0), 2) AS DISCOUNT
+        FROM {raw}
+    )
+    """
+
+
+def _csv_reader(path, block_size):
+    import pyarrow as pa
+    from pyarrow import csv
+
+    with open(path, encoding='latin-1') as source:
+        header = source.readline().strip().split(',')
+    types = {column: pa.type_for_alias(RAW_TYPES.get(column, 'string'))
+             for column in header}
+    return csv.open_csv(
+        path,
+        read_options=csv.ReadOptions(encoding='latin-1', block_size=block_size),
+        convert_options=csv.ConvertOptions(column_types=types),
+    )
+
+
+def connect(threads=None, memory_limit=None, temp_directory=None):
+    """A DuckDB connection; unset options keep DuckDB's defaults (all cores,
+    80% of RAM, spilling next to the database)."""
+    if duckdb is None:
+        raise ImportError('the duckdb engine needs duckdb: pip install duckdb')
+    config = {'threads': threads, 'memory_limit': memory_limit,
+              'temp_directory': temp_directory}
+    return duckdb.connect(config={key: value for key, value in config.items()
+                                  if value is not None})
+
+
+def load_sales(con, source, block_size=64 << 20):
+    """Create the ``sales`` relation on ``con`` from a CSV or Parquet file.
+
+    A Parquet file written by ``csa.cache`` is already cleaned and is only
+    viewed; raw input is cleaned once into a temporary table.
+    """
+    if str(source).endswith('.parquet'):
+        columns = con.execute('SELECT name FROM parquet_schema(?)',
+                              [str(source)]).fetchall()
+        relation = f"read_parquet('{source}')"
+        if ('UNIT_PRICE',) in columns:
+            con.execute(f'CREATE TEMP VIEW sales AS SELECT * FROM {relation}')
+            return
+    else:
+        con.register('raw_sales', _csv_reader(source, block_size))
+        relation = 'raw_sales'
+    con.execute(f'CREATE TEMP TABLE sales AS {cleaning_sql(relation)}')
+
+
+def reduce_sales(con):
+    """The three reduced frames ``assemble_results`` needs."""
+    dimensions = ', '.join(rollup_dimensions())
+    measures = ', '.join(sorted({
+        f'SUM({spec.measure}) AS {partial_name(spec.measure, "sum")}'
+        for spec in rollup_specs()}))
+    cube = con.execute(
+        f'SELECT {dimensions}, {measures} FROM sales GROUP BY {dimensions}'
+    ).df()
+
+    customers = con.execute("""
+        SELECT CUSTOMER_NAME,
+               MIN(ORDER_DATE) AS FIRST_ORDER_DATE,
+               MAX(ORDER_DATE) AS LAST_ORDER_DATE,
+               COUNT(ORDER_NUMBER) AS FREQUENCY,
+               COUNT(DISTINCT ORDER_NUMBER) AS ORDERS,
+               SUM(SALES) AS MONETARY
+        FROM sales
+        WHERE CUSTOMER_NAME IS NOT NULL
+        GROUP BY CUSTOMER_NAME
+        ORDER BY CUSTOMER_NAME
+    """).df().set_index('CUSTOMER_NAME')
+    for column in ['FIRST_ORDER_DATE', 'LAST_ORDER_DATE']:
+        customers[column] = pd.to_datetime(customers[column])
+
+    customers_per_country = con.execute("""
+        SELECT COUNTRY, COUNT(DISTINCT CUSTOMER_NAME) AS CUSTOMER_NAME
+        FROM sales
+        WHERE COUNTRY IS NOT NULL
+        GROUP BY COUNTRY
+    """).df().set_index('COUNTRY')['CUSTOMER_NAME']
+    return cube, customers, customers_per_country
+
+
+def analyze(source, threads=None, memory_limit=None, temp_directory=None):
+    with connect(threads, memory_limit, temp_directory) as con:
+        load_sales(con, source)
+        return assemble_results(*reduce_sales(con))
@@ -0,0 +1,35 @@
+"""The in-memory pandas engine (the notebook's own path)."""
+
+import pandas as pd
+
+from csa.aggregate import base_cube
+from csa.cleaning import load
+from csa.customers import customer_metrics
+from csa.engines.results import assemble_results, check_reports, rollup_specs
+from csa.trace import traced
+
+
+def load_source(source):
+    """The cleaned, enriched frame of a raw CSV or a cached Parquet file."""
+    if str(source).endswith('.parquet'):
+        return pd.read_parquet(source)
+    return load(source)
+
+
+@traced('analyze')
+def analyze_frame(df, reports=None):
+    """The analysis results of a cleaned, enriched frame; with ``reports``
+    (see ``csa.engines.results.REPORTS``) only what those need is computed."""
+    reports = check_reports(reports)
+    specs = rollup_specs(reports)
+    cube = base_cube(df, specs) if specs else None
+    customers = (customer_metrics(df)
+                 if 'rfm' in reports or 'clv' in reports else None)
+    customers_per_country = (
+        df.groupby('COUNTRY', observed=True)['CUSTOMER_NAME'].nunique()
+        if 'customer_distribution' in reports else None)
+    return assemble_results(cube, customers, customers_per_country, reports)
+
+
+def analyze(source, reports=None):
+    return analyze_frame(load_source(source), reports)
@@ -0,0 +1,8 @@
+"""The parallel pandas engine: one process per shard (see ``csa.parallel``)."""
+
+from csa.parallel import analyze_partitioned
+
+
+def analyze(source, key='YEAR_ID', workers=None, sketch_error=None):
+    return analyze_partitioned(source, key=key, workers=workers,
+                               sketch_error=sketch_error).results()
@@ -0,0 +1,48 @@
+"""Check that engines agree with the pandas engine.
+
+Run from the repository root::
+
+    python -m csa.engines.parity sales_data_sample.csv duckdb polars
+
+Exits non-zero and lists the differing results if any engine disagrees.
+"""
+
+import argparse
+import sys
+
+from csa.engines import ENGINES, get_engine
+from csa.engines.results import compare_results
+
+
+def check_parity(source, engines, reference='pandas', rtol=1e-9):
+    """Compare each engine's results on ``source`` with ``reference``'s.
+
+    Returns ``{engine: [(result name, message), ...]}``; empty lists mean
+    the engine agrees.
+    """
+    expected = get_engine(reference).analyze(source)
+    return {name: compare_results(expected, get_engine(name).analyze(source),
+                                  rtol=rtol)
+            for name in engines}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', default='sales_data_sample.csv')
+    parser.add_argument('engines', nargs='*',
+                        default=[name for name in ENGINES if name != 'pandas'])
+    parser.add_argument('--rtol', type=float, default=1e-9)
+    args = parser.parse_args(argv)
+
+    failed = False
+    for engine, problems in check_parity(args.source, args.engines,
+                                         rtol=args.rtol).items():
+        print(f'{engine}: {"ok" if not problems else "MISMATCH"}')
+        for name, message in problems:
+            print(f'  {name}: {message}')
+        failed |= bool(problems)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""Polars engine: lazy, multi-threaded, streaming execution.
+
+The cleaning and derived columns are Polars expressions over a lazy scan of
+the CSV or Parquet file, and the three reductions are collected together
+with the streaming engine, so they share one scan and never hold the whole
+file in memory. Needs ``polars`` (and ``pyarrow`` for ``to_pandas``).
+
+The CSV is decoded as lossy UTF-8: the few non-UTF-8 bytes of the exports
+are in address and contact columns, which the analysis does not use.
+"""
+
+from csa.aggregate import partial_name
+from csa.cleaning import COST_RATIO, DISCOUNT_BINS, DISCOUNT_LABELS
+from csa.dates import DATE_FORMATS
+from csa.engines.results import assemble_results, rollup_dimensions, rollup_specs
+
+try:
+    import polars as pl
+except ImportError:  # pragma: no cover
+    pl = None
+
+RAW_INTEGER_COLUMNS = ['ORDER_NUMBER', 'QUANTITY_ORDERED', 'ORDER_LINE_NUMBER',
+                       'QTR_ID', 'MONTH_ID', 'YEAR_ID', 'MSRP']
+RAW_FLOAT_COLUMNS = ['PRICE_EACH', 'SALES']
+
+
+def _require_polars():
+    if pl is None:
+        raise ImportError('the polars engine needs polars: pip install polars')
+
+
+def _scan_csv(path):
+    with open(path, encoding='latin-1') as source:
+        header = source.readline().strip().split(',')
+    schema = {column: pl.Utf8 for column in header}
+    schema.update({column: pl.Int64 for column in RAW_INTEGER_COLUMNS})
+    schema.update({column: pl.Float64 for column in RAW_FLOAT_COLUMNS})
+    return pl.scan_csv(path, encoding='utf8-lossy', schema=schema)
+
+
+def _order_date(column):
+    text = pl.col(column)
+    return pl.coalesce(
+        *[text.str.strptime(pl.Datetime('ns'), fmt, strict=False)
+          for fmt in DATE_FORMATS.values()],
+        # Anything else falls back to Polars' own format inference
+        text.str.to_datetime(time_unit='ns', strict=False),
+    )
+
+
+def _season(month):
+    return (pl.when(month.is_in([12, 1, 2])).then(pl.lit('Winter'))
+            .when(month.is_in([3, 4, 5])).then(pl.lit('Spring'))
+            .when(month.is_in([6, 7, 8])).then(pl.lit('Summer'))
+            .otherwise(pl.lit('Fall')))
+
+
+def _discount_category(discount):
+    # pd.cut(..., right=False): [0, 10) -> '0-10%', ..., outside -> null
+    expression = pl.when(pl.lit(False)).then(pl.lit(None, dtype=pl.Utf8))
+    for low, high, label in zip(DISCOUNT_BINS, DISCOUNT_BINS[1:], DISCOUNT_LABELS):
+        expression = expression.when((discount >= low) & (discount < high)).then(
+            pl.lit(label))
+    return expression.otherwise(pl.lit(None, dtype=pl.Utf8))
+
+
+def clean(raw):
+    """The cleaned, enriched rows of a lazy frame of the raw export."""
+    cost = pl.col('UNIT_PRICE') * COST_RATIO
+    discount = pl.col('DISCOUNT')
+    return (
+        raw.drop('ADDRESS_LINE2', strict=False)
+        .rename({'PRICE_EACH': 'UNIT_PRICE'})
+        .with_columns(
+            _order_date('ORDER_DATE').alias('ORDER_DATE'),
+            ((pl.col('MSRP') - pl.col('UNIT_PRICE')) / pl.col('MSRP') * 100)
+            .clip(lower_bound=0).round(2).alias('DISCOUNT'),
+        )
+        .with_columns(
+            pl.col('ORDER_DATE').dt.strftime('%A').alias('DAY_OF_WEEK'),
+            _season(pl.col('ORDER_DATE').dt.month()).alias('SEASON'),
+            _discount_category(discount).alias('DISCOUNT_CATEGORY'),
+            cost.alias('COST'),
+            (pl.col('SALES') - cost * pl.col('QUANTITY_ORDERED')).alias('PROFIT'),
+        )
+    )
+
+
+def scan_sales(source):
+    """A lazy frame of the cleaned rows of a CSV or Parquet file.
+
+    A Parquet file written by ``csa.cache`` is already cleaned.
+    """
+    _require_polars()
+    if str(source).endswith('.parquet'):
+        sales = pl.scan_parquet(source)
+        if 'UNIT_PRICE' in sales.collect_schema().names():
+            return sales
+        return clean(sales)
+    return clean(_scan_csv(source))
+
+
+def reduce_sales(sales):
+    """The three reduced frames ``assemble_results`` needs."""
+    measures = sorted({spec.measure for spec in rollup_specs()})
+    cube = sales.group_by(rollup_dimensions()).agg(
+        pl.col(measure).sum().alias(partial_name(measure, 'sum'))
+        for measure in measures)
+
+    customers = (
+        sales.filter(pl.col('CUSTOMER_NAME').is_not_null())
+        .group_by('CUSTOMER_NAME')
+        .agg(pl.col('ORDER_DATE').min().alias('FIRST_ORDER_DATE'),
+             pl.col('ORDER_DATE').max().alias('LAST_ORDER_DATE'),
+             pl.col('ORDER_NUMBER').count().alias('FREQUENCY'),
+             pl.col('ORDER_NUMBER').drop_nulls().n_unique().alias('ORDERS'),
+             pl.col('SALES').sum().alias('MONETARY'))
+        .sort('CUSTOMER_NAME')
+    )
+
+    customers_per_country = (
+        sales.filter(pl.col('COUNTRY').is_not_null())
+        .group_by('COUNTRY')
+        .agg(pl.col('CUSTOMER_NAME').drop_nulls().n_unique())
+    )
+
+    cube, customers, customers_per_country = pl.collect_all(
+        [cube, customers, customers_per_country], engine='streaming')
+    return (cube.to_pandas(),
+            customers.to_pandas().set_index('CUSTOMER_NAME'),
+            customers_per_country.to_pandas().set_index('COUNTRY')['CUSTOMER_NAME'])
+
+
+def analyze(source):
+    return assemble_results(*reduce_sales(scan_sales(source)))
@@ -0,0 +1,151 @@
+"""Shared shape of an engine's output, and how two outputs are compared.
+
+Every engine reduces the data to three small frames: the base cube of the
+rollup dimensions (see ``csa.aggregate.base_cube``), the per-customer
+metrics (see ``csa.customers.customer_metrics``) and the distinct customer
+count per country. ``assemble_results`` turns them into the notebook's
+tables and figures, so all engines return exactly the same layout.
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.aggregate import rollup
+from csa.cleaning import DISCOUNT_LABELS
+from csa.customers import clv_from_metrics, rfm_table
+from csa.rollups import ROLLUPS, rollup_spec, shape_rollup, stage_name
+from csa.schema import DAY_OF_WEEK_DTYPE, SEASON_DTYPE
+from csa.topk import top_k
+from csa.trace import stage
+
+TOP_COUNTRIES = 7
+
+# Reports that can be asked for by name: every rollup, plus these
+CUSTOMER_REPORTS = ('customer_distribution', 'rfm', 'clv')
+REPORTS = tuple(ROLLUPS) + CUSTOMER_REPORTS
+# The results keys of the ``clv`` report
+CLV_FIGURES = ('aov', 'pf', 'avg_ls_years', 'clv')
+
+# Dimensions an engine returns as plain strings, and their pandas dtypes
+CATEGORY_DTYPES = {
+    'DAY_OF_WEEK': DAY_OF_WEEK_DTYPE,
+    'SEASON': SEASON_DTYPE,
+    'DISCOUNT_CATEGORY': pd.CategoricalDtype(DISCOUNT_LABELS, ordered=True),
+}
+
+
+def rollup_specs(reports=None):
+    """The specs of the notebook rollups among ``reports`` (all by default),
+    for building the base cube."""
+    return [rollup_spec(name) for name in ROLLUPS
+            if reports is None or name in reports]
+
+
+def rollup_dimensions():
+    """Every dimension column the notebook rollups group by."""
+    dimensions = []
+    for spec in rollup_specs():
+        dimensions += [column for column in spec.by if column not in dimensions]
+    return dimensions
+
+
+def check_reports(reports):
+    """``reports`` (all by default) as a list, refusing unknown names."""
+    if reports is None:
+        return list(REPORTS)
+    unknown = [name for name in reports if name not in REPORTS]
+    if unknown:
+        raise ValueError(f'unknown reports {unknown}, expected some of '
+                         f'{list(REPORTS)}')
+    return list(reports)
+
+
+def assemble_results(cube, customers, customers_per_country, reports=None):
+    """The notebook's tables and figures from an engine's reduced frames.
+
+    With ``reports``, only those are built, and the frames they don't use
+    may be ``None``.
+    """
+    reports = check_reports(reports)
+    results = {}
+    if cube is not None:
+        cube = cube.astype({column: dtype
+                            for column, dtype in CATEGORY_DTYPES.items()
+                            if column in cube})
+    for name in ROLLUPS:
+        if name in reports:
+            with stage(stage_name(name), rows_in=len(cube)):
+                results[name] = shape_rollup(name, rollup(cube, rollup_spec(name)))
+    # Engines may label customers and countries with categoricals in any
+    # category order; plain sorted strings make row order engine-independent
+    if 'customer_distribution' in reports:
+        # Countries are in groupby order, and top_k keeps tied ones in it
+        results['customer_distribution'] = top_k(
+            _by_label(customers_per_country).rename('CUSTOMER_NAME'),
+            TOP_COUNTRIES)
+    if 'rfm' in reports or 'clv' in reports:
+        customers = _by_label(customers)
+    if 'rfm' in reports:
+        results['rfm'] = rfm_table(customers)
+    if 'clv' in reports:
+        results.update(clv_from_metrics(customers))
+    return results
+
+
+def _by_label(frame):
+    frame = frame.copy()
+    frame.index = frame.index.astype(str)
+    return frame.sort_index()
+
+
+def _as_series(value, name):
+    # Flatten a result table to float values keyed by its labels, so that
+    # index dtypes (category vs str, int8 vs int64) don't matter
+    if name == 'rfm':
+        value = value.set_index('CUSTOMER_NAME')
+    elif isinstance(value, pd.DataFrame) and name in ROLLUPS:
+        by, measure, layout = ROLLUPS[name]
+        if layout != 'pivot':
+            value = value.set_index(by)[measure]
+    if isinstance(value, pd.DataFrame):
+        value = value.apply(_as_numbers).stack()
+    else:
+        value = _as_numbers(value)
+    value.index = [tuple(map(str, key)) if isinstance(key, tuple) else str(key)
+                   for key in value.index]
+    return value.astype(np.float64).sort_index()
+
+
+def _as_numbers(column):
+    # Timestamps as nanoseconds, so that they stack and compare as numbers
+    if pd.api.types.is_datetime64_any_dtype(column):
+        return column.astype('datetime64[ns]').astype(np.int64)
+    return column.copy()
+
+
+def compare_results(expected, actual, rtol=1e-9, atol=0.0):
+    """List the results that differ between two engines' outputs.
+
+    Tables are compared by label, not by row order or index dtype; numbers
+    within ``rtol`` (relative) or ``atol`` (absolute) of each other are
+    equal. Returns ``(name, message)``
+    pairs, empty when the outputs agree.
+    """
+    problems = []
+    for name, value in expected.items():
+        if name not in actual:
+            problems.append((name, 'missing'))
+            continue
+        other = actual[name]
+        if not isinstance(value, (pd.Series, pd.DataFrame)):
+            if not np.isclose(value, other, rtol=rtol, atol=atol):
+                problems.append((name, f'{value!r} != {other!r}'))
+            continue
+        left, right = _as_series(value, name), _as_series(other, name)
+        if not left.index.equals(right.index):
+            problems.append((name, 'different labels'))
+        else:
+            close = np.isclose(left, right, rtol=rtol, atol=atol, equal_nan=True)
+            if not close.all():
+                problems.append((name, f'{int((~close).sum())} values differ'))
+    return problems
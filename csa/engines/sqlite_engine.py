@@ -0,0 +1,313 @@
+"""SQLite engine: the SQL version of the analysis, set-based and serverless.
+
+``CSA in MySQL.sql`` cleans the dates with two full-table UPDATEs and adds
+cost and profit with ALTER TABLE and two more UPDATEs before any GROUP BY,
+on a table without indexes. Here the raw export is bulk-loaded into an
+embedded SQLite database in one transaction, into a table whose
+``DISCOUNT``, ``COST``, ``PROFIT``, ``DAY_OF_WEEK``, ``SEASON`` and
+``DISCOUNT_CATEGORY`` are stored generated columns: they are computed as
+each row is inserted, in the same pass. SQLite has no strptime, so
+``ORDER_DATE`` is cleaned on its way in, each distinct string parsed once
+by ``csa.dates``. The columns the queries filter and group on are indexed
+after the load.
+
+``analyze`` returns the same results as the other engines. ``QUERIES`` holds
+the MySQL script's reports (sales per customer, per month, quarter and year,
+profit per product line, quantity by order status, ...);
+``python -m csa.engines.sqlite_engine`` runs them and checks each against
+the same report computed with pandas.
+"""
+
+import argparse
+import csv
+import sqlite3
+import sys
+from itertools import islice
+
+import pandas as pd
+
+from csa.aggregate import partial_name
+from csa.cleaning import COST_RATIO, DISCOUNT_BINS, DISCOUNT_LABELS
+from csa.dates import normalize_order_dates
+from csa.engines.results import (assemble_results, compare_results,
+                                 rollup_dimensions, rollup_specs)
+from csa.features import MONTH_SEASON
+from csa.schema import DAY_NAMES, SEASONS
+from csa.trace import stage
+
+# Column types of the raw export; everything else is stored as text
+RAW_TYPES = {
+    'ORDER_NUMBER': 'INTEGER', 'QUANTITY_ORDERED': 'INTEGER',
+    'PRICE_EACH': 'REAL', 'ORDER_LINE_NUMBER': 'INTEGER', 'SALES': 'REAL',
+    'QTR_ID': 'INTEGER', 'MONTH_ID': 'INTEGER', 'YEAR_ID': 'INTEGER',
+    'MSRP': 'INTEGER', 'ORDER_DATE': 'TEXT',
+}
+# Raw columns stored under another name, and raw columns not stored at all
+RENAMED = {'PRICE_EACH': 'UNIT_PRICE'}
+DROPPED = {'ADDRESS_LINE2'}
+# Strings read_csv turns into NaN by default; they are loaded as NULL
+NULL_STRINGS = frozenset([
+    '', '#N/A', '#N/A N/A', '#NA', '-1.#IND', '-1.#QNAN', '-NaN', '-nan',
+    '1.#IND', '1.#QNAN', '<NA>', 'N/A', 'NA', 'NULL', 'NaN', 'None', 'n/a',
+    'nan', 'null'])
+INDEXES = {
+    'sales_customer': ['CUSTOMER_NAME'],
+    'sales_order_date': ['ORDER_DATE'],
+    'sales_product_line': ['PRODUCT_LINE'],
+    'sales_year': ['YEAR_ID'],
+    'sales_quarter': ['QTR_ID'],
+    'sales_month': ['MONTH_ID'],
+}
+BATCH_ROWS = 50_000
+
+
+def _day_of_week_sql(date):
+    # strftime('%w') counts from Sunday
+    cases = ' '.join(f"WHEN '{(number + 1) % 7}' THEN '{name}'"
+                     for number, name in enumerate(DAY_NAMES))
+    return f"CASE strftime('%w', {date}) {cases} END"
+
+
+def _season_sql(date):
+    # Like get_season, a missing date falls through to the last season
+    cases = ' '.join(f"WHEN {month} THEN '{SEASONS[MONTH_SEASON[month]]}'"
+                     for month in range(1, 13))
+    return (f"CASE CAST(substr({date}, 6, 2) AS INTEGER) {cases} "
+            f"ELSE '{SEASONS[MONTH_SEASON[0]]}' END")
+
+
+def _discount_category_sql(column):
+    # pd.cut(..., right=False): [0, 10) -> '0-10%', ..., outside -> NULL
+    cases = ' '.join(
+        f"WHEN {column} >= {low} AND {column} < {high} THEN '{label}'"
+        for low, high, label in zip(DISCOUNT_BINS, DISCOUNT_BINS[1:],
+                                    DISCOUNT_LABELS))
+    return f'CASE {cases} END'
+
+
+# Generated columns in dependency order; each is computed on insert
+GENERATED = {
+    'DISCOUNT': 'ROUND(MAX((MSRP - UNIT_PRICE) * 1.0 / MSRP * 100, 0), 2)',
+    'DAY_OF_WEEK': _day_of_week_sql('ORDER_DATE'),
+    'SEASON': _season_sql('ORDER_DATE'),
+    'DISCOUNT_CATEGORY': _discount_category_sql('DISCOUNT'),
+    'COST': f'UNIT_PRICE * {COST_RATIO}',
+    'PROFIT': 'SALES - COST * QUANTITY_ORDERED',
+}
+
+
+def create_table_sql(header):
+    """CREATE TABLE for the cleaned rows of an export with columns ``header``."""
+    columns = [f'{RENAMED.get(column, column)} {RAW_TYPES.get(column, "TEXT")}'
+               for column in header if column not in DROPPED]
+    columns += [f'{column} GENERATED ALWAYS AS ({expression}) STORED'
+                for column, expression in GENERATED.items()]
+    return 'CREATE TABLE sales (\n    {}\n)'.format(',\n    '.join(columns))
+
+
+def connect(database=':memory:'):
+    """A connection to ``database``, tuned for a bulk load: the data can be
+    loaded again from the export, so no journal and no fsync."""
+    con = sqlite3.connect(database)
+    con.execute('PRAGMA journal_mode = OFF')
+    con.execute('PRAGMA synchronous = OFF')
+    return con
+
+
+def _iso_dates(texts):
+    # ISO text of each raw ORDER_DATE string, None where it doesn't parse
+    parsed, _ = normalize_order_dates(pd.Series(texts, dtype=object))
+    iso = parsed.dt.strftime('%Y-%m-%d %H:%M:%S').astype(object)
+    return dict(zip(texts, iso.where(parsed.notna(), None)))
+
+
+def _batches(reader, keep, date_column, batch_rows):
+    # Rows of the export with NULLs and cleaned dates, ``batch_rows`` at a
+    # time; each distinct date string is parsed once, with csa.dates
+    dates = {}
+    while True:
+        batch = [[None if row[i] in NULL_STRINGS else row[i] for i in keep]
+                 for row in islice(reader, batch_rows)]
+        if not batch:
+            return
+        new = {row[date_column] for row in batch}.difference(dates)
+        if new:
+            dates.update(_iso_dates(list(new)))
+        for row in batch:
+            row[date_column] = dates[row[date_column]]
+        yield batch
+
+
+def load_sales(con, source, batch_rows=BATCH_ROWS):
+    """Create and fill the ``sales`` table from a raw CSV export, then
+    index it; returns the number of rows loaded."""
+    with open(source, encoding='latin-1', newline='') as export, con:
+        reader = csv.reader(export)
+        header = next(reader)
+        keep = [i for i, column in enumerate(header) if column not in DROPPED]
+        columns = [RENAMED.get(header[i], header[i]) for i in keep]
+        con.execute('DROP TABLE IF EXISTS sales')
+        con.execute(create_table_sql(header))
+        insert = (f'INSERT INTO sales ({", ".join(columns)}) '
+                  f'VALUES ({", ".join("?" * len(columns))})')
+        with stage('ingest') as run:
+            for batch in _batches(reader, keep, columns.index('ORDER_DATE'),
+                                  batch_rows):
+                con.executemany(insert, batch)
+            run.rows_out = con.execute('SELECT COUNT(*) FROM sales').fetchone()[0]
+        with stage('index'):
+            for name, indexed in INDEXES.items():
+                con.execute(f'CREATE INDEX {name} ON sales ({", ".join(indexed)})')
+            con.execute('ANALYZE')
+    return run.rows_out
+
+
+def reduce_sales(con):
+    """The three reduced frames ``assemble_results`` needs."""
+    dimensions = ', '.join(rollup_dimensions())
+    measures = ', '.join(sorted({
+        f'SUM({spec.measure}) AS {partial_name(spec.measure, "sum")}'
+        for spec in rollup_specs()}))
+    cube = pd.read_sql_query(
+        f'SELECT {dimensions}, {measures} FROM sales GROUP BY {dimensions}', con)
+
+    customers = pd.read_sql_query("""
+        SELECT CUSTOMER_NAME,
+               MIN(ORDER_DATE) AS FIRST_ORDER_DATE,
+               MAX(ORDER_DATE) AS LAST_ORDER_DATE,
+               COUNT(ORDER_NUMBER) AS FREQUENCY,
+               COUNT(DISTINCT ORDER_NUMBER) AS ORDERS,
+               SUM(SALES) AS MONETARY
+        FROM sales
+        WHERE CUSTOMER_NAME IS NOT NULL
+        GROUP BY CUSTOMER_NAME
+        ORDER BY CUSTOMER_NAME
+    """, con, index_col='CUSTOMER_NAME',
+        parse_dates=['FIRST_ORDER_DATE', 'LAST_ORDER_DATE'])
+
+    customers_per_country = pd.read_sql_query("""
+        SELECT COUNTRY, COUNT(DISTINCT CUSTOMER_NAME) AS CUSTOMER_NAME
+        FROM sales
+        WHERE COUNTRY IS NOT NULL
+        GROUP BY COUNTRY
+    """, con, index_col='COUNTRY')['CUSTOMER_NAME']
+    return cube, customers, customers_per_country
+
+
+def analyze(source, database=':memory:'):
+    con = connect(database)
+    try:
+        load_sales(con, source)
+        return assemble_results(*reduce_sales(con))
+    finally:
+        con.close()
+
+
+def _group_sum(df, by, measure, alias):
+    return df.groupby(by, observed=True)[measure].sum().round(2).rename(alias)
+
+
+# The reports round to cents; a total summed in a different order can land
+# on the other side of a half cent
+ROUNDING = 0.01
+
+# name -> (SQL over ``sales``, the same report from a cleaned pandas frame);
+# each report is indexed by its grouping columns
+QUERIES = {
+    'sales_per_customer': (
+        'SELECT CUSTOMER_NAME, ROUND(SUM(SALES), 2) AS total_sales '
+        'FROM sales GROUP BY CUSTOMER_NAME ORDER BY total_sales DESC',
+        lambda df: _group_sum(df, 'CUSTOMER_NAME', 'SALES', 'total_sales')),
+    'monthly_sales': (
+        'SELECT MONTH_ID, ROUND(SUM(SALES), 2) AS total_sales '
+        'FROM sales GROUP BY MONTH_ID ORDER BY total_sales DESC',
+        lambda df: _group_sum(df, 'MONTH_ID', 'SALES', 'total_sales')),
+    'quarterly_sales': (
+        'SELECT QTR_ID, ROUND(SUM(SALES), 2) AS total_sales '
+        'FROM sales GROUP BY QTR_ID ORDER BY total_sales DESC',
+        lambda df: _group_sum(df, 'QTR_ID', 'SALES', 'total_sales')),
+    'yearly_sales': (
+        'SELECT YEAR_ID, ROUND(SUM(SALES), 2) AS total_sales '
+        'FROM sales GROUP BY YEAR_ID ORDER BY total_sales DESC',
+        lambda df: _group_sum(df, 'YEAR_ID', 'SALES', 'total_sales')),
+    'product_line_profit': (
+        'SELECT PRODUCT_LINE, ROUND(SUM(PROFIT), 2) AS total_profit '
+        'FROM sales GROUP BY PRODUCT_LINE ORDER BY total_profit DESC',
+        lambda df: _group_sum(df, 'PRODUCT_LINE', 'PROFIT', 'total_profit')),
+    'orders_per_customer': (
+        'SELECT CUSTOMER_NAME, COUNT(ORDER_NUMBER) AS total_orders '
+        'FROM sales GROUP BY CUSTOMER_NAME ORDER BY total_orders DESC',
+        lambda df: df.groupby('CUSTOMER_NAME', observed=True)['ORDER_NUMBER']
+        .count().rename('total_orders')),
+    'orders_by_status': (
+        'SELECT STATUS, COUNT(QUANTITY_ORDERED) AS total_qty '
+        'FROM sales GROUP BY STATUS ORDER BY total_qty DESC',
+        lambda df: df.groupby('STATUS', observed=True)['QUANTITY_ORDERED']
+        .count().rename('total_qty')),
+    'sales_by_day_of_week': (
+        'SELECT DAY_OF_WEEK, ROUND(SUM(SALES), 2) AS total_sales '
+        'FROM sales GROUP BY DAY_OF_WEEK ORDER BY total_sales',
+        lambda df: _group_sum(df, 'DAY_OF_WEEK', 'SALES', 'total_sales')),
+    'customer_sales_summary': (
+        'SELECT CUSTOMER_NAME, SUM(SALES) AS total_sales, '
+        'COUNT(ORDER_NUMBER) AS total_orders '
+        'FROM sales GROUP BY CUSTOMER_NAME',
+        lambda df: df.groupby('CUSTOMER_NAME', observed=True).agg(
+            total_sales=('SALES', 'sum'), total_orders=('ORDER_NUMBER', 'count'))),
+    'monthly_sales_trends': (
+        'SELECT YEAR_ID, MONTH_ID, SUM(SALES) AS total_sales, '
+        'COUNT(ORDER_NUMBER) AS total_orders '
+        'FROM sales GROUP BY YEAR_ID, MONTH_ID',
+        lambda df: df.groupby(['YEAR_ID', 'MONTH_ID'], observed=True).agg(
+            total_sales=('SALES', 'sum'), total_orders=('ORDER_NUMBER', 'count'))),
+}
+
+
+def run_query(con, name):
+    """Report ``name`` of ``QUERIES`` from the ``sales`` table, in SQL order."""
+    sql, _ = QUERIES[name]
+    with stage(f'sql:{name}'):
+        report = pd.read_sql_query(sql, con)
+    by = [column for column in report if column not in
+          {'total_sales', 'total_profit', 'total_orders', 'total_qty'}]
+    report = report.set_index(by)
+    return report.iloc[:, 0] if report.shape[1] == 1 else report
+
+
+def check_queries(source, frame=None, names=None, rtol=1e-9, atol=ROUNDING):
+    """Run the reports on ``source`` loaded into SQLite and compare each
+    with pandas on ``frame`` (``source`` loaded by the pandas engine by
+    default). Returns ``(name, message)`` pairs, empty when all agree."""
+    from csa.engines.pandas_engine import load_source
+
+    names = list(QUERIES) if names is None else list(names)
+    frame = load_source(source) if frame is None else frame
+    con = connect()
+    try:
+        load_sales(con, source)
+        actual = {name: run_query(con, name) for name in names}
+    finally:
+        con.close()
+    expected = {name: QUERIES[name][1](frame) for name in names}
+    return compare_results(expected, actual, rtol=rtol, atol=atol)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', default='sales_data_sample.csv')
+    parser.add_argument('queries', nargs='*', default=None,
+                        help=f'reports to check (default: all of {list(QUERIES)})')
+    parser.add_argument('--rtol', type=float, default=1e-9)
+    parser.add_argument('--atol', type=float, default=ROUNDING)
+    args = parser.parse_args(argv)
+
+    problems = check_queries(args.source, names=args.queries or None,
+                             rtol=args.rtol, atol=args.atol)
+    for name in args.queries or QUERIES:
+        messages = [message for failed, message in problems if failed == name]
+        print(f'{name}: {"MISMATCH " + "; ".join(messages) if messages else "ok"}')
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
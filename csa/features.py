@@ -0,0 +1,71 @@
+"""Vectorized kernels for the derived columns of the sales frame.
+
+Each kernel works on whole arrays: the season is a lookup table indexed by
+month, the weekday and discount bins become integer codes of a categorical
+without building one string per row, the discount is clipped with
+``np.clip`` and the cost and profit are computed in one buffer. Results are
+identical to the notebook's cells (``get_season`` through ``apply``,
+``max(x, 0)`` per element, ``day_name``, ``pd.cut``).
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.schema import DAY_OF_WEEK_DTYPE, SEASON_DTYPE
+
+# Season code per month, index 0 standing in for a missing month: the
+# notebook's ``get_season`` returns 'Fall' for anything that is not a month
+# of the other three seasons, NaN included
+MONTH_SEASON = np.array([3, 0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0], dtype=np.int8)
+
+
+def _date_field(dates, field, missing):
+    # One calendar field as integers, ``missing`` where the date is NaT
+    dates = pd.DatetimeIndex(dates)
+    return np.where(dates.isna(), missing, getattr(dates, field))
+
+
+def season(dates):
+    """``SEASON`` of each date, as a ``SEASON_DTYPE`` categorical."""
+    month = _date_field(dates, 'month', 0).astype(np.intp)
+    return pd.Categorical.from_codes(MONTH_SEASON[month], dtype=SEASON_DTYPE)
+
+
+def day_of_week(dates):
+    """Weekday name of each date, as a ``DAY_OF_WEEK_DTYPE`` categorical.
+
+    ``dayofweek`` (Monday is 0) is already the category code.
+    """
+    weekday = _date_field(dates, 'dayofweek', -1).astype(np.int8)
+    return pd.Categorical.from_codes(weekday, dtype=DAY_OF_WEEK_DTYPE)
+
+
+def discount(msrp, unit_price):
+    """Discount from MSRP in percent, floored at 0 and rounded to 2 places."""
+    msrp = np.asarray(msrp, dtype=np.float64)
+    # A zero MSRP gives inf/NaN silently, as the pandas expression does
+    with np.errstate(divide='ignore', invalid='ignore'):
+        percent = (msrp - np.asarray(unit_price, dtype=np.float64)) / msrp * 100
+    np.clip(percent, 0, None, out=percent)
+    return np.round(percent, 2, out=percent)
+
+
+def discount_category(discounts, bins, labels):
+    """``pd.cut(discounts, bins, labels=labels, right=False)`` by binary search.
+
+    Values outside ``[bins[0], bins[-1])`` and NaN get no category.
+    """
+    discounts = np.asarray(discounts, dtype=np.float64)
+    codes = np.searchsorted(bins, discounts, side='right') - 1
+    codes[(codes >= len(labels)) | np.isnan(discounts)] = -1
+    return pd.Categorical.from_codes(
+        codes, dtype=pd.CategoricalDtype(labels, ordered=True))
+
+
+def cost_and_profit(unit_price, sales, quantity, cost_ratio):
+    """``COST`` (``unit_price * cost_ratio``) and ``PROFIT`` (``sales`` minus
+    cost times ``quantity``), with one temporary for the profit."""
+    cost = np.multiply(unit_price, cost_ratio, dtype=np.float64)
+    profit = np.multiply(cost, quantity, dtype=np.float64)
+    np.subtract(sales, profit, out=profit)
+    return cost, profit
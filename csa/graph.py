@@ -0,0 +1,298 @@
+"""The analysis as a graph of memoized nodes, recomputed only where an
+input changed.
+
+Every derived column and result table is a ``Node``: a function of other
+nodes and of named parameters (the source file, the cost ratio, the
+discount bins). A node's key is a hash of its name, its parameters and the
+keys of its inputs, so it changes exactly when something upstream does.
+Results are memoized by key in a ``MemoCache``, in memory and optionally on
+disk, each bounded in bytes with least-recently-used eviction::
+
+    graph = Graph(source='sales_data_sample.csv', cache_dir='.csa_graph')
+    graph.results()                  # computes everything once
+    graph.set(cost_ratio=0.6)
+    graph.results()                  # COST, PROFIT and the profit tables only
+
+``graph.computed`` lists the nodes the last call actually ran. The source
+enters keys by its content hash, so an edited export invalidates everything
+and an unchanged one can be reused from disk by a later process.
+"""
+
+import hashlib
+import os
+import pickle
+import sys
+import tempfile
+from collections import OrderedDict
+from typing import Callable, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from csa import features
+from csa.cache import source_hash
+from csa.cleaning import (CLEANING_VERSION, COST_RATIO, DISCOUNT_BINS,
+                          DISCOUNT_LABELS, clean)
+from csa.customers import customer_metrics
+from csa.engines.results import CLV_FIGURES, REPORTS, assemble_results
+from csa.rollups import ROLLUPS, compute_rollup
+from csa.schema import load_compact
+from csa.trace import stage
+
+DEFAULT_MEMORY_BYTES = 512 << 20
+DEFAULT_DISK_BYTES = 2 << 30
+
+PARAMETERS = {
+    'source': 'sales_data_sample.csv',
+    'cost_ratio': COST_RATIO,
+    'discount_bins': DISCOUNT_BINS,
+    'discount_labels': DISCOUNT_LABELS,
+}
+
+
+class Node(NamedTuple):
+    """``func`` called with the values of the ``inputs`` nodes, then of the
+    ``params`` parameters, in order. Bump ``version`` when ``func`` changes
+    what it returns, so memoized results are not reused."""
+
+    func: Callable
+    inputs: tuple = ()
+    params: tuple = ()
+    version: int = 1
+    # Row-level frames are kept in memory only (``csa.cache`` stores those)
+    persist: bool = True
+
+
+def _frame(*columns):
+    # The named column Series of a node's inputs as one frame
+    return pd.concat(columns, axis=1)
+
+
+def _column(name):
+    return Node(lambda df: df[name], ('clean',))
+
+
+def _rollup(name):
+    by, measure, _ = ROLLUPS[name]
+    by = [by] if isinstance(by, str) else list(by)
+    return Node(lambda *columns: compute_rollup(_frame(*columns), name),
+                tuple(by) + (measure,))
+
+
+def _derived(name, func, inputs, params=()):
+    def column(*values):
+        index = values[0].index
+        return pd.Series(func(*values), index=index, name=name)
+    return Node(column, inputs, params)
+
+
+def _customer_report(name):
+    return Node(lambda customers: assemble_results(None, customers, None,
+                                                   [name])[name],
+                ('customers',))
+
+
+def _clv_figure(name):
+    return Node(lambda customers: assemble_results(None, customers, None,
+                                                   ['clv'])[name],
+                ('customers',))
+
+
+RAW_COLUMNS = ['ORDER_NUMBER', 'QUANTITY_ORDERED', 'UNIT_PRICE', 'ORDER_LINE_NUMBER',
+               'SALES', 'ORDER_DATE', 'QTR_ID', 'MONTH_ID', 'YEAR_ID',
+               'PRODUCT_LINE', 'MSRP', 'CUSTOMER_NAME', 'COUNTRY']
+
+NODES = {
+    'raw': Node(load_compact, params=('source',), persist=False),
+    'clean': Node(lambda raw: clean(raw)[0], ('raw',), version=CLEANING_VERSION,
+                  persist=False),
+    **{name: _column(name) for name in RAW_COLUMNS},
+    'DAY_OF_WEEK': _derived('DAY_OF_WEEK', features.day_of_week, ('ORDER_DATE',)),
+    'SEASON': _derived('SEASON', features.season, ('ORDER_DATE',)),
+    'DISCOUNT': _derived('DISCOUNT', features.discount, ('MSRP', 'UNIT_PRICE')),
+    'DISCOUNT_CATEGORY': _derived('DISCOUNT_CATEGORY', features.discount_category,
+                                  ('DISCOUNT',), ('discount_bins', 'discount_labels')),
+    'COST': _derived('COST', lambda price, ratio: np.multiply(
+                         price, ratio, dtype=np.float64),
+                     ('UNIT_PRICE',), ('cost_ratio',)),
+    # As ``features.cost_and_profit``, from the memoized cost
+    'PROFIT': _derived('PROFIT', lambda sales, cost, quantity: np.subtract(
+                           sales, np.multiply(cost, quantity, dtype=np.float64)),
+                       ('SALES', 'COST', 'QUANTITY_ORDERED')),
+    **{name: _rollup(name) for name in ROLLUPS},
+    'customers': Node(lambda *columns: customer_metrics(_frame(*columns)),
+                      ('CUSTOMER_NAME', 'ORDER_NUMBER', 'ORDER_DATE', 'SALES')),
+    'customer_distribution': Node(
+        lambda countries, customers: assemble_results(
+            None, None,
+            _frame(countries, customers).groupby('COUNTRY', observed=True)[
+                'CUSTOMER_NAME'].nunique(),
+            ['customer_distribution'])['customer_distribution'],
+        ('COUNTRY', 'CUSTOMER_NAME')),
+    'rfm': _customer_report('rfm'),
+    **{name: _clv_figure(name) for name in CLV_FIGURES if name != 'clv'},
+    'clv': Node(lambda aov, pf, years: round(aov * pf * years, 2),
+                ('aov', 'pf', 'avg_ls_years')),
+}
+
+
+def _size(value):
+    # Approximate bytes held by a memoized value
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if isinstance(value, pd.DataFrame) else usage)
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+class MemoCache:
+    """Values by key, in memory up to ``memory_bytes`` and, with a
+    ``cache_dir``, pickled on disk up to ``disk_bytes``; the least recently
+    used go first. A value larger than a budget is not kept there."""
+
+    def __init__(self, memory_bytes=DEFAULT_MEMORY_BYTES, cache_dir=None,
+                 disk_bytes=DEFAULT_DISK_BYTES):
+        self.memory_bytes = memory_bytes
+        self.cache_dir = cache_dir
+        self.disk_bytes = disk_bytes
+        self._entries = OrderedDict()  # key -> (value, size)
+        self._used = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f'{key}.pkl')
+
+    def get(self, key):
+        """``(True, value)`` if ``key`` is cached, else ``(False, None)``."""
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            return True, self._entries[key][0]
+        if self.cache_dir and os.path.exists(self._path(key)):
+            with open(self._path(key), 'rb') as stored:
+                value = pickle.load(stored)
+            os.utime(self._path(key))  # the modification time orders eviction
+            self._remember(key, value)
+            return True, value
+        return False, None
+
+    def put(self, key, value, persist=True):
+        self._remember(key, value)
+        if self.cache_dir and persist:
+            self._store(key, value)
+
+    def _remember(self, key, value):
+        size = _size(value)
+        if size > self.memory_bytes:
+            return
+        if key in self._entries:
+            self._used -= self._entries.pop(key)[1]
+        self._entries[key] = (value, size)
+        self._used += size
+        while self._used > self.memory_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._used -= evicted
+
+    def _store(self, key, value):
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.disk_bytes:
+            return
+        # A temporary file of its own, as processes may share the directory
+        with tempfile.NamedTemporaryFile(dir=self.cache_dir, suffix='.tmp',
+                                         delete=False) as partial:
+            partial.write(data)
+        os.replace(partial.name, self._path(key))
+        files = [os.path.join(self.cache_dir, name)
+                 for name in os.listdir(self.cache_dir) if name.endswith('.pkl')]
+        files.sort(key=os.path.getmtime)
+        used = sum(map(os.path.getsize, files))
+        for name in files:
+            if used <= self.disk_bytes:
+                break
+            used -= os.path.getsize(name)
+            os.remove(name)
+
+    def clear(self):
+        """Forget the values held in memory (the disk copies stay)."""
+        self._entries.clear()
+        self._used = 0
+
+
+class Graph:
+    """The nodes of ``NODES`` evaluated on demand for a set of parameters
+    (``PARAMETERS`` by default), memoized in ``cache``."""
+
+    def __init__(self, nodes=NODES, cache=None, cache_dir=None, **params):
+        unknown = set(params) - set(PARAMETERS)
+        if unknown:
+            raise ValueError(f'unknown parameters {sorted(unknown)}, expected '
+                             f'some of {sorted(PARAMETERS)}')
+        self.nodes = nodes
+        self.params = {**PARAMETERS, **params}
+        self.cache = cache or MemoCache(cache_dir=cache_dir)
+        self.computed = []
+        self._keys = {}
+
+    def set(self, **params):
+        """Change parameters; only the nodes depending on them are stale."""
+        unknown = set(params) - set(self.params)
+        if unknown:
+            raise ValueError(f'unknown parameters {sorted(unknown)}')
+        self.params.update(params)
+        self._keys = {}
+
+    def _param_token(self, name):
+        value = self.params[name]
+        if name == 'source':
+            # By content, so an edited export is never served from the cache
+            return source_hash(value)
+        return repr(value)
+
+    def key(self, name):
+        """Hash of node ``name``, its parameters and its inputs' keys."""
+        if name not in self._keys:
+            node = self.nodes[name]
+            digest = hashlib.sha256(f'{name}:{node.version}'.encode())
+            for param in node.params:
+                digest.update(f'|{param}={self._param_token(param)}'.encode())
+            for upstream in node.inputs:
+                digest.update(f'|{self.key(upstream)}'.encode())
+            self._keys[name] = digest.hexdigest()[:32]
+        return self._keys[name]
+
+    def compute(self, name):
+        """The value of node ``name``, from the cache where its key is."""
+        return self._evaluate([name])[name]
+
+    def _evaluate(self, names):
+        self.computed = []
+        # Values of this call, so nodes the cache can't hold (the row-level
+        # frames under a small budget) still run only once
+        values = {}
+        for name in names:
+            self._compute(name, values)
+        return values
+
+    def _compute(self, name, values):
+        if name in values:
+            return values[name]
+        key = self.key(name)
+        found, value = self.cache.get(key)
+        if not found:
+            node = self.nodes[name]
+            inputs = [self._compute(upstream, values) for upstream in node.inputs]
+            with stage(f'graph:{name}'):
+                value = node.func(*inputs, *(self.params[p] for p in node.params))
+            self.computed.append(name)
+            self.cache.put(key, value, node.persist)
+        values[name] = value
+        return value
+
+    def results(self, reports=None):
+        """The engines' results dict for ``reports`` (all by default)."""
+        reports = list(REPORTS) if reports is None else list(reports)
+        names = [figure for name in reports
+                 for figure in (CLV_FIGURES if name == 'clv' else [name])]
+        values = self._evaluate(names)
+        return {name: values[name] for name in names}
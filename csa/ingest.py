@@ -0,0 +1,132 @@
+"""Chunked ingestion of sales exports.
+
+``analyze_chunked`` reads the CSV ``chunksize`` rows at a time, cleans and
+enriches each chunk exactly like the notebook does for the whole frame, and
+folds it into mergeable accumulators. Peak memory is one chunk plus the
+accumulator state, which grows with the number of groups (customers, orders,
+months, ...) rather than with the number of rows.
+
+Sums are added chunk by chunk, so float totals can differ from the in-memory
+run in the last few bits; all other results are identical.
+"""
+
+import pandas as pd
+
+from csa.accumulators import (CustomerAccumulator, DistinctAccumulator,
+                              DistinctSketchAccumulator, SumAccumulator)
+from csa.cleaning import prepare
+from csa.customers import clv_summary, rfm_table
+from csa.dates import DateParseReport
+from csa.engines.results import TOP_COUNTRIES
+from csa.quantiles import QuantileTable
+from csa.rollups import ROLLUPS, rollup_spec, rollup_totals, shape_rollup
+from csa.schema import ENCODING, compact, read_dtypes
+from csa.sketches import precision_for
+from csa.topk import top_k
+from csa.trace import traced
+
+DEFAULT_CHUNKSIZE = 100_000
+
+
+class SalesAnalysis:
+    """Partial results of the analysis over the rows seen so far.
+
+    With ``sketch_error`` set, distinct orders and customers per country are
+    counted with HyperLogLog sketches of that relative error instead of
+    exact sets, so their state no longer grows with the number of orders.
+    ``distributions`` holds quantile sketches of ``SALES``, ``PROFIT`` and
+    ``DISCOUNT``, for the boxplot and histogram (``render_report``).
+    """
+
+    def __init__(self, sketch_error=None):
+        self.sketch_error = sketch_error
+        self.date_cache = {}
+        self.date_report = DateParseReport()
+        self.rows = 0
+        self.rollups = {}
+        for name in ROLLUPS:
+            spec = rollup_spec(name)
+            self.rollups[name] = SumAccumulator(spec.by, spec.measure,
+                                                observed=spec.observed)
+        self.customers = CustomerAccumulator()
+        self.orders = self._distinct(['ORDER_NUMBER'])
+        self.country_customers = self._distinct(['COUNTRY', 'CUSTOMER_NAME'])
+        self.distributions = QuantileTable()
+
+    def _distinct(self, columns):
+        if self.sketch_error is None:
+            return DistinctAccumulator(columns)
+        return DistinctSketchAccumulator(columns, precision_for(self.sketch_error))
+
+    def update_raw(self, chunk):
+        """Clean and enrich a chunk of the raw export, then fold it in."""
+        chunk, report = prepare(compact(chunk), date_cache=self.date_cache)
+        self.date_report.merge(report)
+        return self.update(chunk)
+
+    def update(self, frame):
+        """Fold in an already cleaned and enriched frame."""
+        self.rows += len(frame)
+        # All rollups of the chunk come from a single scan
+        for name, totals in rollup_totals(frame, self.rollups).items():
+            self.rollups[name].add(totals)
+        self.customers.update(frame)
+        self.orders.update(frame)
+        self.country_customers.update(frame)
+        self.distributions.update(frame)
+        return self
+
+    def merge(self, other):
+        """Combine with the partial results of another chunk or shard."""
+        self.date_report.merge(other.date_report)
+        self.rows += other.rows
+        for name, accumulator in self.rollups.items():
+            accumulator.merge(other.rollups[name])
+        self.customers.merge(other.customers)
+        self.orders.merge(other.orders)
+        self.country_customers.merge(other.country_customers)
+        self.distributions.merge(other.distributions)
+        return self
+
+    def results(self):
+        """Return the notebook's tables and figures, keyed by variable name."""
+        results = {name: shape_rollup(name, accumulator.result())
+                   for name, accumulator in self.rollups.items()}
+
+        results['customer_distribution'] = top_k(
+            self.country_customers.count(by='COUNTRY').rename('CUSTOMER_NAME'),
+            TOP_COUNTRIES)
+
+        customers = self.customers.result()
+        results['rfm'] = rfm_table(customers)
+        lifespan_days = (customers['LAST_ORDER_DATE']
+                         - customers['FIRST_ORDER_DATE']).dt.days
+        results.update(clv_summary(
+            total_sales=customers['MONETARY'].sum(),
+            order_rows=customers['FREQUENCY'].sum(),
+            unique_orders=self.orders.count(),
+            unique_customers=len(customers),
+            lifespan_days=lifespan_days,
+        ))
+        return results
+
+
+def read_chunks(path, chunksize=DEFAULT_CHUNKSIZE, **read_csv_kwargs):
+    """Iterate over a sales export in frames of at most ``chunksize`` rows.
+
+    The string columns are read as categoricals, with the categories of
+    each chunk inferred from that chunk.
+    """
+    return pd.read_csv(path, encoding=ENCODING, chunksize=chunksize,
+                       dtype=read_dtypes(read_csv_kwargs.get('usecols')),
+                       **read_csv_kwargs)
+
+
+@traced('analyze_chunked')
+def analyze_chunked(path, chunksize=DEFAULT_CHUNKSIZE, sketch_error=None):
+    """Run the analysis over ``path`` one chunk at a time."""
+    analysis = SalesAnalysis(sketch_error)
+    with read_chunks(path, chunksize) as chunks:
+        for chunk in chunks:
+            analysis.update_raw(chunk)
+    return analysis
@@ -0,0 +1,118 @@
+"""Multi-process analysis over shards of the export.
+
+The export is split by one of its natural partition keys (``YEAR_ID``,
+``TERRITORY`` or ``COUNTRY``) into shards, each shard is cleaned, enriched
+and reduced to a ``csa.ingest.SalesAnalysis`` in its own process, and the
+partial analyses are merged into the global results. Sums, row counts and
+first/last order dates merge by addition and min/max; distinct orders and
+customers per country are kept as exact sets, so ``nunique`` is exact even
+when a customer or an order spans shards.
+
+``split_by_key`` streams the export once and writes each shard as a
+directory of Parquet parts (needs ``pyarrow``); exports that already come
+one file per year or territory can be passed to ``analyze_shards`` as they
+are. The split is a serial parse of the whole CSV, about as long as a
+chunked run of the analysis itself, so it bounds the speedup of
+``analyze_partitioned``; the workers pay off on pre-partitioned exports or
+when the shards are analyzed more than once.
+"""
+
+import os
+import shutil
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+
+import pandas as pd
+
+from csa.ingest import DEFAULT_CHUNKSIZE, SalesAnalysis, read_chunks
+
+PARTITION_KEYS = ('YEAR_ID', 'TERRITORY', 'COUNTRY')
+
+# Shard name of the rows whose key is missing
+MISSING_KEY = '__missing__'
+
+
+def _shard_name(key, value):
+    value = MISSING_KEY if pd.isna(value) else str(value).replace(os.sep, '_')
+    return f'{key}={value}'
+
+
+def split_by_key(path, key, shard_dir, chunksize=DEFAULT_CHUNKSIZE):
+    """Write the rows of ``path`` to one directory per ``key`` value.
+
+    Each chunk of the export adds one Parquet part to the shard of every
+    key value it contains. A shard directory left in ``shard_dir`` by an
+    earlier split is emptied first, so its parts are never counted twice.
+    Returns the shard directories, sorted.
+    """
+    if key not in PARTITION_KEYS:
+        raise ValueError(f'unknown partition key {key!r}, expected one of '
+                         f'{list(PARTITION_KEYS)}')
+    shards = set()
+    with read_chunks(path, chunksize) as chunks:
+        for number, chunk in enumerate(chunks):
+            for value, rows in chunk.groupby(key, observed=True, dropna=False):
+                shard = os.path.join(shard_dir, _shard_name(key, value))
+                if shard not in shards:
+                    shutil.rmtree(shard, ignore_errors=True)
+                    os.makedirs(shard)
+                rows.to_parquet(os.path.join(shard, f'part-{number:05d}.parquet'),
+                                index=False)
+                shards.add(shard)
+    return sorted(shards)
+
+
+def _parts(shard):
+    if not os.path.isdir(shard):
+        return [shard]
+    return [os.path.join(shard, part) for part in sorted(os.listdir(shard))]
+
+
+def analyze_parts(parts, chunksize=DEFAULT_CHUNKSIZE, sketch_error=None):
+    """Partial analysis of Parquet parts and CSV files, in this process."""
+    analysis = SalesAnalysis(sketch_error)
+    for part in parts:
+        if part.endswith('.parquet'):
+            analysis.update_raw(pd.read_parquet(part))
+            continue
+        with read_chunks(part, chunksize) as chunks:
+            for chunk in chunks:
+                analysis.update_raw(chunk)
+    return analysis
+
+
+def analyze_shards(shards, workers=None, chunksize=DEFAULT_CHUNKSIZE,
+                   sketch_error=None):
+    """Analyze ``shards`` in a pool of ``workers`` processes and merge them.
+
+    A shard is a CSV file or a directory of Parquet parts. The parts of all
+    shards are dealt out to the workers, so a few large shards (three years)
+    still keep every worker busy; each worker returns one partial analysis.
+    ``workers`` defaults to one per CPU; with a single worker everything
+    runs in this process.
+    """
+    parts = [part for shard in shards for part in _parts(shard)]
+    workers = min(workers or os.cpu_count() or 1, max(len(parts), 1))
+    if workers == 1:
+        return analyze_parts(parts, chunksize, sketch_error)
+    groups = [parts[start::workers] for start in range(workers)]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        partials = pool.map(analyze_parts, groups, [chunksize] * workers,
+                            [sketch_error] * workers)
+        return reduce(SalesAnalysis.merge, partials, SalesAnalysis(sketch_error))
+
+
+def analyze_partitioned(path, key='YEAR_ID', workers=None, shard_dir=None,
+                        chunksize=DEFAULT_CHUNKSIZE, sketch_error=None):
+    """Split ``path`` by ``key`` and analyze the shards in parallel.
+
+    Shards are written to ``shard_dir`` and kept there, or to a temporary
+    directory that is removed afterwards.
+    """
+    if shard_dir is not None:
+        shards = split_by_key(path, key, shard_dir, chunksize)
+        return analyze_shards(shards, workers, chunksize, sketch_error)
+    with tempfile.TemporaryDirectory(prefix='csa-shards-') as shard_dir:
+        shards = split_by_key(path, key, shard_dir, chunksize)
+        return analyze_shards(shards, workers, chunksize, sketch_error)
@@ -0,0 +1,273 @@
+"""Mergeable quantile sketches for the distribution charts.
+
+``plt.boxplot(df['SALES'])`` and ``plt.hist(df['PROFIT'])`` sort or bin
+the whole column in memory. A ``QuantileSketch`` is a KLL sketch (Karnin,
+Lang and Liberty, 2016) plus the exact count, sum, minimum and maximum: it
+keeps a few hundred sampled values in levels of doubling weight, answers
+ranks and quantiles within about ``1.7 / k`` of the count (1% at the
+default ``k`` of 200; exactly while nothing has been compacted), and
+merges with the sketch of another chunk, shard or group.
+
+Boxplot statistics (quartiles, IQR fences, whiskers, fliers), percentiles
+and fixed-bin histograms are read off a sketch; ``QuantileTable`` keeps one
+sketch per column and group (e.g. ``PRODUCT_LINE``)::
+
+    table = QuantileTable(['SALES', 'PROFIT', 'DISCOUNT'], by='PRODUCT_LINE')
+    for chunk in chunks:
+        table.update(chunk)
+    table.sketch('SALES').boxplot_stats()
+    table.sketch('PROFIT', where={'PRODUCT_LINE': 'Ships'}).histogram(20)
+"""
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_K = 200
+MIN_CAPACITY = 8
+DISTRIBUTION_COLUMNS = ['SALES', 'PROFIT', 'DISCOUNT']
+# Whisker reach in IQRs, as matplotlib's boxplot
+WHISKER = 1.5
+_MAGIC = b'CSAKLL\x01'
+
+
+class QuantileSketch:
+    """KLL sketch of a stream of numbers, with its exact count, sum and
+    extremes."""
+
+    def __init__(self, k=DEFAULT_K, seed=0):
+        self.k = k
+        self.levels = [np.empty(0)]
+        self.count = 0
+        self.total = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+        self._rng = np.random.default_rng(seed)
+
+    def _capacity(self, level):
+        # Lower levels get geometrically less room, the top level k
+        depth = len(self.levels) - level - 1
+        return max(int(np.ceil(self.k * (2 / 3) ** depth)), MIN_CAPACITY)
+
+    def _compact(self):
+        # Halve the lowest level over its capacity until none is
+        while True:
+            full = [level for level, items in enumerate(self.levels)
+                    if len(items) > self._capacity(level)]
+            if not full:
+                return
+            level = full[0]
+            if level + 1 == len(self.levels):
+                self.levels.append(np.empty(0))
+            items = np.sort(self.levels[level])
+            # An odd item out stays; of the rest every other one, from a
+            # random start, moves up with twice the weight
+            keep = items[:len(items) % 2]
+            promoted = items[len(keep):][self._rng.integers(2)::2]
+            self.levels[level] = keep
+            self.levels[level + 1] = np.concatenate([self.levels[level + 1],
+                                                     promoted])
+
+    def update(self, values):
+        """Add an array or Series of values; NaN is ignored."""
+        values = np.asarray(values, dtype=np.float64)
+        values = values[~np.isnan(values)]
+        if not len(values):
+            return self
+        self.count += len(values)
+        self.total += float(values.sum())
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        self.levels[0] = np.concatenate([self.levels[0], values])
+        self._compact()
+        return self
+
+    def merge(self, other):
+        """Make this the sketch of both streams."""
+        while len(self.levels) < len(other.levels):
+            self.levels.append(np.empty(0))
+        for level, items in enumerate(other.levels):
+            self.levels[level] = np.concatenate([self.levels[level], items])
+        self.count += other.count
+        self.total += other.total
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compact()
+        return self
+
+    def _weighted(self):
+        # Retained items in order, and the cumulative weight up to each
+        items = np.concatenate(self.levels)
+        weights = np.concatenate([np.full(len(values), 1 << level, dtype=np.int64)
+                                  for level, values in enumerate(self.levels)])
+        order = np.argsort(items, kind='stable')
+        return items[order], np.cumsum(weights[order])
+
+    def rank(self, values, inclusive=False):
+        """Estimated number of values below (or up to) each of ``values``."""
+        items, cumulative = self._weighted()
+        side = 'right' if inclusive else 'left'
+        positions = np.searchsorted(items, np.asarray(values, dtype=np.float64),
+                                    side=side)
+        ranks = np.concatenate([[0], cumulative])[positions]
+        # Scale the sketch's total weight to the exact count
+        return ranks * (self.count / cumulative[-1]) if len(items) else ranks
+
+    def quantile(self, q):
+        """Estimated quantiles ``q`` (0-1), interpolated like ``np.percentile``."""
+        q = np.asarray(q, dtype=np.float64)
+        if not self.count:
+            return np.full(q.shape, np.nan)
+        items, cumulative = self._weighted()
+        # Item covering each 0-based rank, interpolating between the two
+        # ranks around the target
+        target = q * (cumulative[-1] - 1)
+        low = np.floor(target)
+        high = np.minimum(low + 1, cumulative[-1] - 1)
+        below = items[np.searchsorted(cumulative, low, side='right')]
+        above = items[np.searchsorted(cumulative, high, side='right')]
+        result = below + (above - below) * (target - low)
+        # The exact extremes are known
+        result = np.where(q <= 0, self.min, np.where(q >= 1, self.max, result))
+        return result if result.ndim else float(result)
+
+    def percentiles(self, percents):
+        """``np.percentile``-style estimates for ``percents`` (0-100)."""
+        return self.quantile(np.asarray(percents, dtype=np.float64) / 100)
+
+    def histogram(self, bins=10, range=None):
+        """``(counts, edges)`` like ``np.histogram(values, bins)``, with
+        estimated counts (exact while nothing has been compacted)."""
+        low, high = range if range is not None else (self.min, self.max)
+        if low == high:
+            low, high = low - 0.5, high + 0.5
+        edges = np.linspace(low, high, bins + 1)
+        below = self.rank(edges)
+        below[-1] = self.rank(edges[-1], inclusive=True)
+        return np.round(np.diff(below)).astype(np.int64), edges
+
+    def fences(self):
+        """``(q1, median, q3, lower fence, upper fence)``, fences at
+        ``WHISKER`` IQRs beyond the quartiles."""
+        q1, median, q3 = self.quantile([0.25, 0.5, 0.75])
+        iqr = q3 - q1
+        return q1, median, q3, q1 - WHISKER * iqr, q3 + WHISKER * iqr
+
+    def boxplot_stats(self, max_fliers=None):
+        """Statistics for ``Axes.bxp``, as ``matplotlib.cbook.boxplot_stats``
+        computes them from the values, with the retained values beyond the
+        fences as fliers (at most ``max_fliers``, evenly spaced)."""
+        q1, median, q3, low, high = self.fences()
+        iqr = q3 - q1
+        items = np.unique(np.concatenate(self.levels + [[self.min, self.max]]))
+        inside = items[(items >= low) & (items <= high)]
+        fliers = items[(items < low) | (items > high)]
+        if max_fliers is not None and len(fliers) > max_fliers:
+            fliers = fliers[np.linspace(0, len(fliers) - 1, max_fliers).astype(int)]
+        notch = 1.57 * iqr / np.sqrt(self.count)
+        return {
+            'mean': self.total / self.count, 'iqr': iqr,
+            'cilo': median - notch, 'cihi': median + notch,
+            'whislo': inside.min() if len(inside) else q1,
+            'whishi': inside.max() if len(inside) else q3,
+            'fliers': fliers, 'q1': q1, 'med': median, 'q3': q3,
+        }
+
+    def to_bytes(self):
+        header = np.array([self.k, self.count, len(self.levels)]
+                          + [len(items) for items in self.levels], dtype=np.int64)
+        extremes = np.array([self.total, self.min, self.max])
+        return (_MAGIC + header.tobytes() + extremes.tobytes()
+                + np.concatenate(self.levels).tobytes())
+
+    @classmethod
+    def from_bytes(cls, data):
+        if not data.startswith(_MAGIC):
+            raise ValueError('not a serialized quantile sketch')
+        offset = len(_MAGIC)
+        k, count, depth = np.frombuffer(data, np.int64, 3, offset)
+        sizes = np.frombuffer(data, np.int64, depth, offset + 24)
+        offset += 24 + 8 * int(depth)
+        total, low, high = np.frombuffer(data, np.float64, 3, offset)
+        items = np.frombuffer(data, np.float64, offset=offset + 24)
+        sketch = cls(int(k))
+        sketch.levels = [part.copy() for part in
+                         np.split(items, np.cumsum(sizes)[:-1])]
+        sketch.count, sketch.total = int(count), float(total)
+        sketch.min, sketch.max = float(low), float(high)
+        return sketch
+
+
+def _matches(label, condition):
+    if isinstance(condition, (list, tuple, set)):
+        return label in condition
+    return label == condition
+
+
+class QuantileTable:
+    """One ``QuantileSketch`` per column of ``columns`` and group of ``by``
+    (a single group when ``by`` is empty); mergeable like the sketches."""
+
+    def __init__(self, columns=DISTRIBUTION_COLUMNS, by=(), k=DEFAULT_K):
+        self.columns = list(columns)
+        self.by = [by] if isinstance(by, str) else list(by)
+        self.k = k
+        self.sketches = {}  # (group key, column) -> QuantileSketch
+
+    def _sketch(self, key, column):
+        sketch = self.sketches.get((key, column))
+        if sketch is None:
+            sketch = self.sketches[key, column] = QuantileSketch(self.k)
+        return sketch
+
+    def update(self, frame):
+        """Add the rows of ``frame``; rows with a missing group are left out."""
+        columns = [column for column in self.columns if column in frame]
+        if not self.by:
+            for column in columns:
+                self._sketch((), column).update(frame[column])
+            return self
+        values = {column: frame[column].to_numpy(dtype=np.float64)
+                  for column in columns}
+        groups = frame.groupby(self.by, observed=True, sort=False)
+        for key, indices in groups.indices.items():
+            key = key if isinstance(key, tuple) else (key,)
+            for column in columns:
+                self._sketch(key, column).update(values[column][indices])
+        return self
+
+    def merge(self, other):
+        if (other.columns, other.by) != (self.columns, self.by):
+            raise ValueError('cannot merge quantile tables of different '
+                             'columns or groups')
+        for (key, column), sketch in other.sketches.items():
+            self._sketch(key, column).merge(sketch)
+        return self
+
+    def sketch(self, column, where=None):
+        """The merged sketch of ``column`` over the groups matching
+        ``where``, a mapping of ``by`` columns to a label or list."""
+        positions = {self.by.index(level): condition
+                     for level, condition in (where or {}).items()}
+        merged = QuantileSketch(self.k)
+        for (key, name), sketch in self.sketches.items():
+            if name == column and all(_matches(key[i], condition)
+                                      for i, condition in positions.items()):
+                merged.merge(sketch)
+        return merged
+
+    def summary(self, column, percents=(1, 5, 25, 50, 75, 95, 99)):
+        """Count, mean, extremes and percentiles of ``column`` per group."""
+        rows = {}
+        for (key, name), sketch in self.sketches.items():
+            if name != column:
+                continue
+            row = {'count': sketch.count, 'mean': sketch.total / sketch.count,
+                   'min': sketch.min, 'max': sketch.max}
+            row.update(zip([f'p{p}' for p in percents],
+                           sketch.percentiles(percents)))
+            # One row per group, or a single row named after the column
+            rows[key[0] if len(key) == 1 else key or column] = row
+        summary = pd.DataFrame.from_dict(rows, orient='index')
+        if self.by:
+            summary.index.names = self.by
+        return summary.sort_index()
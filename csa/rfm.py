@@ -0,0 +1,158 @@
+"""Incremental RFM.
+
+``RFMStore`` keeps one row of state per customer (first and last order date,
+order-line count and sales sum) and folds in only newly arrived order rows,
+touching just the customers that appear in them. Scores are recomputed from
+that state without a full sort: recency and frequency are integers over a
+narrow range (days, counts), so their exact average ranks come from a
+``np.bincount`` of the values and its cumulative sum, in linear time, and
+monetary can optionally be ranked the same way by relative-width buckets
+instead of exactly (a sort).
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.customers import CUSTOMER_COLUMNS
+
+
+def _integer_offsets(values):
+    # Non-negative integers ordered (and tied) as ``values`` are, or None:
+    # dates as ticks and numbers as themselves, less the smallest, divided
+    # by the greatest common step (a day, for dates at midnight)
+    if values.dtype.kind == 'M':
+        keys = values.astype('datetime64[ns]').view(np.int64)
+    elif values.dtype.kind in 'iub':
+        keys = values.astype(np.int64)
+    elif (values.dtype.kind == 'f' and np.isfinite(values).all()
+          and (np.abs(values) < 2 ** 53).all() and (values == np.floor(values)).all()):
+        keys = values.astype(np.int64)
+    else:
+        return None
+    offsets = keys - keys.min()
+    step = np.gcd.reduce(offsets)
+    return offsets // step if step > 1 else offsets
+
+
+def _ranks_of_uniques(values, ascending):
+    # Average rank (as Series.rank gives it) of every row, computed from the
+    # counts of its distinct values: ties share the mean of their positions
+    if not len(values):
+        return np.empty(0)
+    offsets = _integer_offsets(values)
+    if offsets is not None and offsets.max() < max(4 * len(values), 1 << 16):
+        # Counted, not sorted: one bin per possible value
+        span = int(offsets.max()) + 1
+        if not ascending:
+            offsets = span - 1 - offsets
+        counts = np.bincount(offsets, minlength=span)
+        below = np.cumsum(counts) - counts
+        return (below + (counts + 1) / 2)[offsets]
+    uniques, inverse, counts = np.unique(values, return_inverse=True,
+                                         return_counts=True)
+    if not ascending:
+        counts = counts[::-1]
+        inverse = len(uniques) - 1 - inverse
+    below = np.cumsum(counts) - counts
+    return (below + (counts + 1) / 2)[inverse]
+
+
+def count_rank(values, ascending=True):
+    """Exact ``values.rank(ascending=ascending)``.
+
+    Linear in the number of rows for dates and integers whose range (in
+    steps of their greatest common difference) is at most a few times the
+    row count, as with days and order counts; other columns are sorted.
+    """
+    ranks = np.full(len(values), np.nan)
+    present = values.notna().to_numpy()
+    ranks[present] = _ranks_of_uniques(values.to_numpy()[present], ascending)
+    return pd.Series(ranks, index=values.index, name=values.name)
+
+
+def bucketed_rank(values, relative_error=1e-3, ascending=True):
+    """Approximate rank: values within ``relative_error`` of each other
+    (on a log scale) share a bucket and the bucket's average rank. The
+    bucket ids are integers over a narrow range, so they are counted, not
+    sorted."""
+    numbers = values.to_numpy(dtype=np.float64)
+    width = np.log1p(relative_error)
+    buckets = np.sign(numbers) * np.floor(np.log1p(np.abs(numbers)) / width)
+    return count_rank(pd.Series(buckets, index=values.index, name=values.name),
+                      ascending)
+
+
+def _summarize(rows):
+    names = rows['CUSTOMER_NAME'].astype(str)
+    return rows.groupby(names).agg(
+        FIRST_ORDER_DATE=('ORDER_DATE', 'min'),
+        LAST_ORDER_DATE=('ORDER_DATE', 'max'),
+        FREQUENCY=('ORDER_NUMBER', 'count'),
+        MONETARY=('SALES', 'sum'),
+    ).rename_axis('CUSTOMER_NAME')
+
+
+class RFMStore:
+    """Per-customer RFM state that grows with each batch of new orders."""
+
+    def __init__(self, customers=None):
+        if customers is None:
+            customers = pd.DataFrame(columns=CUSTOMER_COLUMNS).astype({
+                'FIRST_ORDER_DATE': 'datetime64[ns]',
+                'LAST_ORDER_DATE': 'datetime64[ns]',
+                'FREQUENCY': 'int64',
+                'MONETARY': 'float64',
+            }).rename_axis('CUSTOMER_NAME')
+        self.customers = customers[CUSTOMER_COLUMNS]
+
+    @classmethod
+    def from_frame(cls, df):
+        """Build the state from a full history of cleaned order rows."""
+        return cls(_summarize(df))
+
+    def update(self, rows):
+        """Fold newly arrived, cleaned order rows into the state.
+
+        Only the customers present in ``rows`` are touched. Returns the
+        number of customers seen for the first time.
+        """
+        delta = _summarize(rows)
+        known = delta.index.isin(self.customers.index)
+        seen, new = delta[known], delta[~known]
+        if len(seen):
+            current = self.customers.loc[seen.index]
+            self.customers.loc[seen.index, 'FIRST_ORDER_DATE'] = np.minimum(
+                current['FIRST_ORDER_DATE'], seen['FIRST_ORDER_DATE'])
+            self.customers.loc[seen.index, 'LAST_ORDER_DATE'] = np.maximum(
+                current['LAST_ORDER_DATE'], seen['LAST_ORDER_DATE'])
+            self.customers.loc[seen.index, 'FREQUENCY'] += seen['FREQUENCY']
+            self.customers.loc[seen.index, 'MONETARY'] += seen['MONETARY']
+        if len(new):
+            self.customers = pd.concat([self.customers, new])
+        return len(new)
+
+    def table(self, relative_error=None):
+        """The notebook's ``rfm`` frame, scored from the current state.
+
+        ``R_SCORE`` and ``F_SCORE`` are exact. ``M_SCORE`` is exact too
+        unless ``relative_error`` is given, in which case sales sums within
+        that relative distance of each other are ranked as ties.
+        """
+        rfm = self.customers[['LAST_ORDER_DATE', 'FREQUENCY', 'MONETARY']]
+        rfm = rfm.reset_index()
+        rfm['R_SCORE'] = count_rank(rfm['LAST_ORDER_DATE'], ascending=False)
+        rfm['F_SCORE'] = count_rank(rfm['FREQUENCY'])
+        if relative_error is None:
+            rfm['M_SCORE'] = rfm['MONETARY'].rank(ascending=True)
+        else:
+            rfm['M_SCORE'] = bucketed_rank(rfm['MONETARY'], relative_error)
+        rfm['RFM_SCORE'] = rfm['R_SCORE'] + rfm['F_SCORE'] + rfm['M_SCORE']
+        return rfm
+
+    def save(self, path):
+        """Persist the state as Parquet (needs pyarrow)."""
+        self.customers.to_parquet(path)
+
+    @classmethod
+    def load(cls, path):
+        return cls(pd.read_parquet(path))
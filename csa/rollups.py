@@ -0,0 +1,84 @@
+"""The notebook's rollup tables and their layouts.
+
+Every rollup is a sum of one measure over one (or two) dimensions; what
+differs between the notebook cells is only the layout of the result. Keeping
+that in one place lets any engine that produces the raw per-group sums hand
+back exactly the frames the notebook shows.
+"""
+
+from csa.aggregate import RollupSpec, aggregate
+from csa.trace import stage, traced
+
+# name -> (group by, measure, layout)
+#   sorted: groupby(as_index=False) sorted by the measure, descending
+#   reset:  groupby(...).sum().reset_index()
+#   series: groupby(...).sum() as a Series
+#   pivot:  pivot_table(index=by[0], columns=by[1], aggfunc='sum')
+ROLLUPS = {
+    'sales_by_day': ('DAY_OF_WEEK', 'SALES', 'sorted'),
+    'sales_by_season': ('SEASON', 'SALES', 'sorted'),
+    'sales_by_qtr': ('QTR_ID', 'SALES', 'sorted'),
+    'sales_by_month': ('MONTH_ID', 'SALES', 'sorted'),
+    'sales_by_year': ('YEAR_ID', 'SALES', 'sorted'),
+    'sales_vol_by_discount': ('DISCOUNT_CATEGORY', 'QUANTITY_ORDERED', 'reset'),
+    'sales_by_prod_cat': ('PRODUCT_LINE', 'SALES', 'reset'),
+    'qty_ordered_per_line': ('ORDER_LINE_NUMBER', 'QUANTITY_ORDERED', 'series'),
+    'profit_by_product': ('PRODUCT_LINE', 'PROFIT', 'sorted'),
+    'profit_over_qtr': ('QTR_ID', 'PROFIT', 'reset'),
+    'sales_by_month_and_product': (('MONTH_ID', 'PRODUCT_LINE'), 'SALES', 'pivot'),
+}
+
+# Rollups whose categorical key keeps unobserved categories (observed=False)
+ALL_CATEGORIES = {'sales_vol_by_discount'}
+
+
+def rollup_spec(name):
+    """The ``RollupSpec`` computing the raw sums of one named rollup."""
+    by, measure, _ = ROLLUPS[name]
+    return RollupSpec(by, measure, 'sum', observed=name not in ALL_CATEGORIES)
+
+
+def shape_rollup(name, totals):
+    """Lay out the per-group sums ``totals`` (a Series) like the notebook."""
+    by, measure, layout = ROLLUPS[name]
+    totals = totals.rename(measure)
+    if layout == 'sorted':
+        return totals.reset_index().sort_values(by=measure, ascending=False)
+    if layout == 'reset':
+        return totals.reset_index()
+    if layout == 'pivot':
+        return totals.unstack(by[1])
+    return totals
+
+
+def stage_name(name):
+    """Name of the ``csa.trace`` stage computing rollup ``name``."""
+    kind = 'pivot' if ROLLUPS[name][2] == 'pivot' else 'rollup'
+    return f'{kind}:{name}'
+
+
+def compute_rollup(df, name):
+    """Compute one rollup directly from a full frame (the reference path)."""
+    spec = rollup_spec(name)
+    by = spec.by if len(spec.by) > 1 else spec.by[0]
+    with stage(stage_name(name), rows_in=len(df)) as run:
+        totals = df.groupby(by, observed=spec.observed)[spec.measure].sum()
+        result = shape_rollup(name, totals)
+        run.rows_out = len(result)
+    return result
+
+
+@traced('rollups')
+def rollup_totals(df, names=None):
+    """Raw per-group sums of the named rollups (all by default), from one
+    scan of ``df``."""
+    names = list(ROLLUPS) if names is None else list(names)
+    totals = aggregate(df, [rollup_spec(name) for name in names])
+    return dict(zip(names, totals))
+
+
+def compute_rollups(df, names=None):
+    """The named rollups (all by default) in the notebook's layout, from one
+    scan of ``df``."""
+    return {name: shape_rollup(name, totals)
+            for name, totals in rollup_totals(df, names).items()}
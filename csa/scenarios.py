@@ -0,0 +1,153 @@
+"""What-if scenarios for the cost ratio and the discount buckets, evaluated
+together.
+
+The notebook fixes ``COST = UNIT_PRICE * 0.7`` and the discount bins at
+``[0, 10, 20, 30, 50, 100]``; trying another assumption means rewriting the
+columns and rerunning. Profit is linear in the cost ratio::
+
+    PROFIT = SALES - ratio * UNIT_PRICE * QUANTITY_ORDERED
+
+so with the sums of ``SALES`` and ``UNIT_PRICE * QUANTITY_ORDERED`` per
+quarter and product line taken once, the profit tables of any number of
+scenarios, with one ratio per product line if need be, are a single matrix
+product. Discount volumes for any bucketing come from one sort of
+``DISCOUNT`` and a cumulative sum of the quantities, a binary search per
+bin edge. The base frame is read, never copied or modified::
+
+    base = ScenarioBase(df)
+    base.profit_by_product([0.6, 0.7, {'Classic Cars': 0.8, 'Ships': 0.65}])
+    base.sales_vol_by_discount([[0, 10, 20, 30, 50, 100], [0, 5, 15, 100]])
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.cleaning import COST_RATIO
+from csa.trace import stage
+
+
+def _codes(column):
+    # Integer codes and labels of a key column, labels sorted like groupby
+    codes, labels = pd.factorize(column, sort=True)
+    return codes, pd.Index(labels, name=column.name)
+
+
+def bin_labels(bins):
+    """Labels of the buckets of ``bins``, in the notebook's ``'0-10%'`` style."""
+    return [f'{low:g}-{high:g}%' for low, high in zip(bins[:-1], bins[1:])]
+
+
+class ScenarioBase:
+    """The per-group sums every scenario is computed from, taken once from
+    a cleaned, enriched frame."""
+
+    def __init__(self, df):
+        with stage('scenario_base', rows_in=len(df)):
+            line_codes, self.lines = _codes(df['PRODUCT_LINE'])
+            qtr_codes, self.quarters = _codes(df['QTR_ID'])
+            sales = df['SALES'].to_numpy(dtype=np.float64)
+            price_quantity = (df['UNIT_PRICE'].to_numpy(dtype=np.float64)
+                              * df['QUANTITY_ORDERED'].to_numpy(dtype=np.float64))
+            shape = (len(self.quarters), len(self.lines))
+            cells = qtr_codes * len(self.lines) + line_codes
+            keep = (line_codes >= 0) & (qtr_codes >= 0)
+            # (quarter, product line) sums of SALES and of price x quantity
+            self.sales = np.bincount(cells[keep], weights=sales[keep],
+                                     minlength=shape[0] * shape[1]).reshape(shape)
+            self.price_quantity = np.bincount(
+                cells[keep], weights=price_quantity[keep],
+                minlength=shape[0] * shape[1]).reshape(shape)
+            # Row arrays for row-level profit, read without a copy
+            self._row_sales = sales
+            self._row_price_quantity = price_quantity
+            self._row_lines = line_codes
+
+            discount = df['DISCOUNT'].to_numpy(dtype=np.float64)
+            order = np.argsort(discount, kind='stable')
+            self._discounts = discount[order]
+            # In int64, so the volumes are integers like the notebook's
+            quantity = np.nan_to_num(df['QUANTITY_ORDERED'].to_numpy(
+                dtype=np.float64)).astype(np.int64)[order]
+            self._quantity_before = np.concatenate([[0], np.cumsum(quantity)])
+
+    def ratio_matrix(self, scenarios):
+        """The cost ratio per scenario (rows) and product line (columns).
+
+        ``scenarios`` is a list of ratios or of ``{product line: ratio}``
+        dicts (lines not given keep ``COST_RATIO``), or a DataFrame of
+        ratios with product lines as columns.
+        """
+        if isinstance(scenarios, pd.DataFrame):
+            return scenarios.reindex(columns=self.lines, fill_value=COST_RATIO)
+        rows, names = [], []
+        for scenario in scenarios:
+            if isinstance(scenario, dict):
+                unknown = set(scenario) - set(self.lines)
+                if unknown:
+                    raise ValueError(f'unknown product lines {sorted(unknown)}')
+                rows.append([scenario.get(line, COST_RATIO) for line in self.lines])
+                names.append(', '.join(f'{line}={ratio:g}'
+                                       for line, ratio in scenario.items()))
+            else:
+                rows.append([scenario] * len(self.lines))
+                names.append(f'{scenario:g}')
+        return pd.DataFrame(rows, index=pd.Index(names, name='SCENARIO'),
+                            columns=self.lines, dtype=np.float64)
+
+    def _profit(self, ratios):
+        # (scenario, quarter, product line) profit sums
+        return (self.sales[None, :, :]
+                - ratios.to_numpy()[:, None, :] * self.price_quantity[None, :, :])
+
+    def profit_by_product(self, scenarios):
+        """Total ``PROFIT`` per scenario (rows) and product line."""
+        ratios = self.ratio_matrix(scenarios)
+        with stage('scenarios:profit_by_product'):
+            totals = self._profit(ratios).sum(axis=1)
+        return pd.DataFrame(totals, index=ratios.index, columns=self.lines)
+
+    def profit_over_qtr(self, scenarios):
+        """Total ``PROFIT`` per scenario (rows) and quarter."""
+        ratios = self.ratio_matrix(scenarios)
+        with stage('scenarios:profit_over_qtr'):
+            totals = self._profit(ratios).sum(axis=2)
+        return pd.DataFrame(totals, index=ratios.index, columns=self.quarters)
+
+    def profit(self, scenarios):
+        """Row-level ``PROFIT``, one column per scenario: (rows, scenarios)."""
+        ratios = self.ratio_matrix(scenarios).to_numpy()
+        # NaN where the product line is missing, as the ratio is unknown
+        row_ratios = np.full((len(self._row_lines), len(ratios)), np.nan)
+        known = self._row_lines >= 0
+        row_ratios[known] = ratios.T[self._row_lines[known]]
+        return self._row_sales[:, None] - row_ratios * self._row_price_quantity[:, None]
+
+    def sales_vol_by_discount(self, bin_sets, labels=None):
+        """``QUANTITY_ORDERED`` per discount bucket for each set of bins, as
+        ``sales_vol_by_discount`` lays it out (a frame per set of bins).
+
+        Buckets are ``[low, high)`` as in the notebook's ``pd.cut(...,
+        right=False)``; discounts outside every bucket are left out.
+        """
+        tables = []
+        for i, bins in enumerate(bin_sets):
+            bins = np.asarray(bins, dtype=np.float64)
+            if np.any(np.diff(bins) <= 0):
+                raise ValueError(f'bins must increase, got {list(bins)}')
+            edges = np.searchsorted(self._discounts, bins, side='left')
+            volumes = np.diff(self._quantity_before[edges])
+            names = labels[i] if labels is not None else bin_labels(bins)
+            tables.append(pd.DataFrame({
+                'DISCOUNT_CATEGORY': pd.Categorical(names, categories=names,
+                                                    ordered=True),
+                'QUANTITY_ORDERED': volumes}))
+        return tables
+
+    def evaluate(self, cost_scenarios, bin_sets=(), labels=None):
+        """The profit tables of every cost scenario and the discount
+        volumes of every set of bins, in one dict."""
+        return {
+            'profit_by_product': self.profit_by_product(cost_scenarios),
+            'profit_over_qtr': self.profit_over_qtr(cost_scenarios),
+            'sales_vol_by_discount': self.sales_vol_by_discount(bin_sets, labels),
+        }
@@ -0,0 +1,97 @@
+"""Compact column types for the sales frame.
+
+``read_csv`` loads every string column as Python objects and every integer as
+int64. The repeated strings (country, product line, customer, ...) are stored
+as categoricals instead, so they take one small integer code per row and
+``groupby`` works on the codes; integers are downcast to the smallest type
+that holds them. Floats can optionally go to float32 where no value changes.
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.trace import traced
+
+ENCODING = 'unicode_escape'
+
+# Raw string columns with few distinct values compared to the row count
+CATEGORICAL_COLUMNS = ['STATUS', 'PRODUCT_LINE', 'PRODUCT_CODE',
+                       'CUSTOMER_NAME', 'CITY', 'STATE', 'COUNTRY',
+                       'TERRITORY', 'DEAL_SIZE']
+
+INTEGER_COLUMNS = ['ORDER_NUMBER', 'QUANTITY_ORDERED', 'ORDER_LINE_NUMBER',
+                   'QTR_ID', 'MONTH_ID', 'YEAR_ID', 'MSRP']
+
+FLOAT_COLUMNS = ['SALES', 'PRICE_EACH', 'UNIT_PRICE']
+
+# Derived columns have a fixed set of values, in their natural order
+DAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday',
+             'Saturday', 'Sunday']
+SEASONS = ['Winter', 'Spring', 'Summer', 'Fall']
+DAY_OF_WEEK_DTYPE = pd.CategoricalDtype(DAY_NAMES)
+SEASON_DTYPE = pd.CategoricalDtype(SEASONS)
+
+
+def read_dtypes(columns=None):
+    """``dtype=`` argument for ``read_csv`` loading the string columns as
+    categoricals directly, so the object columns are never materialized."""
+    return {column: 'category' for column in CATEGORICAL_COLUMNS
+            if columns is None or column in columns}
+
+
+def _downcast_float(values):
+    narrow = values.astype(np.float32)
+    same = (narrow.astype(np.float64) == values) | values.isna()
+    return narrow if same.all() else values
+
+
+@traced('compact')
+def compact(df, float32=False):
+    """Return ``df`` with categorical and downcast integer columns.
+
+    Every conversion is lossless: integers go to the smallest type holding
+    their range. With ``float32=True`` a float column is also narrowed if
+    every value survives the round trip through float32; this is off by
+    default because pandas then sums the column in float32 too, and totals
+    like ``sales_by_year`` lose their cents.
+    """
+    df = df.copy()
+    for column in df.columns.intersection(CATEGORICAL_COLUMNS):
+        df[column] = df[column].astype('category')
+    for column in df.columns.intersection(INTEGER_COLUMNS):
+        if pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+    for column in df.columns.intersection(FLOAT_COLUMNS if float32 else []):
+        if pd.api.types.is_float_dtype(df[column]):
+            df[column] = _downcast_float(df[column])
+    if 'DAY_OF_WEEK' in df:
+        df['DAY_OF_WEEK'] = df['DAY_OF_WEEK'].astype(DAY_OF_WEEK_DTYPE)
+    if 'SEASON' in df:
+        df['SEASON'] = df['SEASON'].astype(SEASON_DTYPE)
+    return df
+
+
+def memory_report(before, after):
+    """Per-column dtype and deep memory usage of two versions of a frame."""
+    report = pd.DataFrame({
+        'DTYPE_BEFORE': before.dtypes.astype(str),
+        'BYTES_BEFORE': before.memory_usage(index=False, deep=True),
+        'DTYPE_AFTER': after.dtypes.astype(str),
+        'BYTES_AFTER': after.memory_usage(index=False, deep=True),
+    })
+    report.loc['TOTAL', ['BYTES_BEFORE', 'BYTES_AFTER']] = (
+        report[['BYTES_BEFORE', 'BYTES_AFTER']].sum())
+    report[['BYTES_BEFORE', 'BYTES_AFTER']] = (
+        report[['BYTES_BEFORE', 'BYTES_AFTER']].astype('int64'))
+    report['SAVED_%'] = round(
+        (1 - report['BYTES_AFTER'] / report['BYTES_BEFORE']) * 100, 1)
+    return report
+
+
+@traced('ingest')
+def load_compact(path, **read_csv_kwargs):
+    """Read a sales export straight into the compact types."""
+    df = pd.read_csv(path, encoding=ENCODING,
+                     dtype=read_dtypes(read_csv_kwargs.get('usecols')),
+                     **read_csv_kwargs)
+    return compact(df)
@@ -0,0 +1,264 @@
+"""A local HTTP service for the analysis results.
+
+The enriched frame is loaded once, the unfiltered reports are computed up
+front, and each request for a report, optionally filtered by year, country
+and product line, is answered as JSON or CSV::
+
+    python -m csa.server sales_data_sample.csv --port 8000
+    curl 'localhost:8000/reports/rfm?country=USA,France&format=csv'
+    curl 'localhost:8000/reports/sales_by_month_and_product?year=2004'
+
+Built on ``asyncio`` streams with no dependency beyond pandas. Filtered
+results go to a ``TTLCache`` (least recently used out first, entries
+expiring after ``ttl`` seconds); concurrent requests for the same result
+share one computation; and the aggregations run in a thread pool, so the
+event loop keeps accepting requests while they do. The pool does not add
+cores: the pandas work holds the GIL for much of its time, so a burst of
+uncached, filtered requests still slows the loop and the other requests.
+With ``CSA_TRACE`` set, the workers' stages are traced per thread (see
+``csa.trace``). ``GET /reports`` lists the reports, ``GET /stats`` shows
+the cache counters.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import pandas as pd
+
+from csa.engines.pandas_engine import analyze_frame, load_source
+from csa.engines.results import CLV_FIGURES, REPORTS
+
+DEFAULT_PORT = 8000
+DEFAULT_TTL = 300
+DEFAULT_CACHE_SIZE = 256
+# Query parameter -> column it filters on
+FILTERS = {'year': 'YEAR_ID', 'country': 'COUNTRY', 'product_line': 'PRODUCT_LINE'}
+FORMATS = {'json': 'application/json', 'csv': 'text/csv; charset=utf-8'}
+REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+           405: 'Method Not Allowed', 500: 'Internal Server Error'}
+
+
+class TTLCache:
+    """At most ``size`` values, each for ``ttl`` seconds; the least recently
+    used is evicted first."""
+
+    def __init__(self, size=DEFAULT_CACHE_SIZE, ttl=DEFAULT_TTL,
+                 clock=time.monotonic):
+        self.size = size
+        self.ttl = ttl
+        self.clock = clock
+        self._entries = OrderedDict()  # key -> (expiry, value)
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        """``(True, value)`` while ``key`` is fresh, else ``(False, None)``."""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > self.clock():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return True, entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return False, None
+
+    def put(self, key, value):
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+
+def parse_filters(query):
+    """``{column: [values]}`` from the query string's filter parameters;
+    values are comma-separated, years are integers."""
+    filters = {}
+    for parameter, column in FILTERS.items():
+        values = [value for raw in query.get(parameter, [])
+                  for value in raw.split(',') if value]
+        if not values:
+            continue
+        if column == 'YEAR_ID':
+            try:
+                values = [int(value) for value in values]
+            except ValueError:
+                raise ValueError(f'{parameter} must be a year, got {values}') from None
+        filters[column] = sorted(set(values))
+    return filters
+
+
+def select_rows(df, filters):
+    """The rows of ``df`` matching every filter."""
+    keep = pd.Series(True, index=df.index)
+    for column, values in filters.items():
+        keep &= df[column].isin(values)
+    return df[keep.to_numpy()]
+
+
+def _as_table(name, value):
+    # A report as a flat frame, its labels as columns
+    if name == 'clv':
+        return pd.DataFrame({'figure': list(value), 'value': list(value.values())})
+    if isinstance(value, pd.Series) or value.index.name is not None:
+        return value.reset_index()
+    return value
+
+
+def encode(name, value, fmt):
+    """A report (``clv``: the dict of its figures) as JSON or CSV bytes.
+
+    Missing and non-finite numbers, e.g. the CLV figures of a filter no row
+    matches, are JSON ``null``.
+    """
+    if fmt == 'csv':
+        return _as_table(name, value).to_csv(index=False).encode()
+    if name == 'clv':
+        figures = {key: float(figure) if math.isfinite(figure) else None
+                   for key, figure in value.items()}
+        return json.dumps(figures, allow_nan=False).encode()
+    table = _as_table(name, value)
+    table.columns = [str(column) for column in table.columns]
+    return table.to_json(orient='records', date_format='iso').encode()
+
+
+class ReportService:
+    """Reports of ``df`` for any filter, cached, coalesced and computed in a
+    pool of ``workers`` threads."""
+
+    def __init__(self, df, cache=None, workers=None):
+        self.df = df
+        self.cache = cache if cache is not None else TTLCache()
+        self.pool = ThreadPoolExecutor(max_workers=workers)
+        self.coalesced = 0
+        self._pending = {}
+        # The unfiltered reports never go stale, so they stay out of the cache
+        self.base = self._reports({}, REPORTS)
+
+    def _reports(self, filters, names):
+        results = analyze_frame(select_rows(self.df, filters), names)
+        reports = {name: results[name] for name in names if name != 'clv'}
+        if 'clv' in names:
+            reports['clv'] = {figure: results[figure] for figure in CLV_FIGURES}
+        return reports
+
+    def _compute(self, name, filters, fmt):
+        value = (self.base[name] if not filters
+                 else self._reports(filters, [name])[name])
+        return encode(name, value, fmt)
+
+    async def report(self, name, filters, fmt='json'):
+        """The encoded report ``name`` of the rows matching ``filters``."""
+        if name not in REPORTS:
+            raise KeyError(name)
+        key = (name, fmt, tuple(sorted((column, tuple(values))
+                                       for column, values in filters.items())))
+        found, body = self.cache.get(key)
+        if found:
+            return body
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            return await asyncio.shield(pending)
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.pool, self._compute, name, filters, fmt)
+        self._pending[key] = future
+        try:
+            body = await asyncio.shield(future)
+        finally:
+            del self._pending[key]
+        self.cache.put(key, body)
+        return body
+
+    def stats(self):
+        return {'cached': len(self.cache), 'hits': self.cache.hits,
+                'misses': self.cache.misses, 'evictions': self.cache.evictions,
+                'coalesced': self.coalesced, 'rows': len(self.df)}
+
+    async def handle(self, reader, writer):
+        """Serve one HTTP/1.1 request, then close the connection."""
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            line = request.split(b'\r\n', 1)[0].decode('latin-1')
+            method, target, _ = line.split(' ', 2)
+            status, content_type, body = await self._route(method, target)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status, content_type, body = _error(400, 'malformed request')
+        head = (f'HTTP/1.1 {status} {REASONS[status]}\r\n'
+                f'Content-Type: {content_type}\r\n'
+                f'Content-Length: {len(body)}\r\n'
+                'Connection: close\r\n\r\n')
+        writer.write(head.encode('latin-1') + body)
+        try:
+            await writer.drain()
+        finally:
+            writer.close()
+
+    async def _route(self, method, target):
+        if method != 'GET':
+            return _error(405, f'{method} is not supported, use GET')
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = parse_qs(url.query)
+        if parts in ([], ['reports']):
+            return 200, FORMATS['json'], json.dumps(list(REPORTS)).encode()
+        if parts == ['stats']:
+            return 200, FORMATS['json'], json.dumps(self.stats()).encode()
+        if len(parts) != 2 or parts[0] != 'reports' or parts[1] not in REPORTS:
+            return _error(404, f'no such report: {url.path}')
+        fmt = query.get('format', ['json'])[0]
+        if fmt not in FORMATS:
+            return _error(400, f'format must be one of {list(FORMATS)}')
+        try:
+            filters = parse_filters(query)
+        except ValueError as error:
+            return _error(400, str(error))
+        try:
+            body = await self.report(parts[1], filters, fmt)
+        except Exception as error:  # reported to the client, not fatal
+            return _error(500, f'{type(error).__name__}: {error}')
+        return 200, FORMATS[fmt], body
+
+
+def _error(status, message):
+    return status, FORMATS['json'], json.dumps({'error': message}).encode()
+
+
+async def serve(service, host='127.0.0.1', port=DEFAULT_PORT):
+    """Serve ``service`` until cancelled."""
+    server = await asyncio.start_server(service.handle, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('source', nargs='?', default='sales_data_sample.csv')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--ttl', type=float, default=DEFAULT_TTL,
+                        help='seconds a filtered result stays cached')
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args(argv)
+
+    service = ReportService(load_source(args.source),
+                            TTLCache(args.cache_size, args.ttl), args.workers)
+    print(f'serving {len(service.df)} rows on http://{args.host}:{args.port}/reports')
+    try:
+        asyncio.run(serve(service, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,227 @@
+"""Synthetic sales exports shaped like ``sales_data_sample.csv``.
+
+``SampleProfile.from_csv`` learns the sample's product catalog, customer
+records and the empirical distributions of order size, status, quantity,
+price relative to MSRP and order month. ``generate`` then draws any number
+of rows in the raw export layout:
+
+- orders belong to one customer, date and status and have 1-18 lines of
+  distinct products, drawn with the sample's skewed product mix;
+- customers are the sample's customers, cloned (``"<name> 2"``, ...) to keep
+  the sample's rows per customer as the row count grows, each clone with
+  the original's country, territory and order frequency;
+- ``ORDER_DATE`` uses both of the export's layouts: ``05-07-2003 00:00`` for
+  days up to the 12th and ``2/24/2003 0:00`` after;
+- ``PRICE_EACH`` is capped at 100 like in the export, while ``SALES`` is
+  computed from the uncapped price, and ``DEAL_SIZE`` follows ``SALES``.
+
+Run ``python -m csa.synthetic 1000000 sales_1m.csv`` to write a file.
+"""
+
+import argparse
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from csa.schema import ENCODING
+
+SAMPLE_PATH = 'sales_data_sample.csv'
+FIRST_ORDER_NUMBER = 10100
+PRICE_CAP = 100
+DEAL_SIZE_BINS = [3000, 7000]
+DEAL_SIZES = np.array(['Small', 'Medium', 'Large'], dtype=object)
+
+COLUMNS = ['ORDER_NUMBER', 'QUANTITY_ORDERED', 'PRICE_EACH', 'ORDER_LINE_NUMBER',
+           'SALES', 'ORDER_DATE', 'STATUS', 'QTR_ID', 'MONTH_ID', 'YEAR_ID',
+           'PRODUCT_LINE', 'MSRP', 'PRODUCT_CODE', 'CUSTOMER_NAME', 'PHONE',
+           'ADDRESS_LINE1', 'ADDRESS_LINE2', 'CITY', 'STATE', 'POSTAL_CODE',
+           'COUNTRY', 'TERRITORY', 'CONTACT_LAST_NAME', 'CONTACT_FIRST_NAME',
+           'DEAL_SIZE']
+PRODUCT_COLUMNS = ['PRODUCT_CODE', 'PRODUCT_LINE', 'MSRP']
+CUSTOMER_COLUMNS = ['CUSTOMER_NAME', 'PHONE', 'ADDRESS_LINE1', 'ADDRESS_LINE2',
+                    'CITY', 'STATE', 'POSTAL_CODE', 'COUNTRY', 'TERRITORY',
+                    'CONTACT_LAST_NAME', 'CONTACT_FIRST_NAME']
+
+
+@dataclass
+class SampleProfile:
+    """What ``generate`` draws from, learned from a sample export."""
+
+    rows: int
+    products: pd.DataFrame   # PRODUCT_COLUMNS and WEIGHT (row share)
+    customers: pd.DataFrame  # CUSTOMER_COLUMNS and WEIGHT (order share)
+    lines_per_order: np.ndarray
+    statuses: np.ndarray     # one per order
+    quantities: np.ndarray   # one per row
+    price_ratios: np.ndarray  # uncapped unit price / MSRP, one per row
+    months: pd.DataFrame     # YEAR, MONTH and WEIGHT (order share)
+
+    @classmethod
+    def from_csv(cls, path=SAMPLE_PATH):
+        raw = pd.read_csv(path, encoding=ENCODING, keep_default_na=False,
+                          dtype={column: str for column in CUSTOMER_COLUMNS})
+        orders = raw.groupby('ORDER_NUMBER').agg(
+            CUSTOMER_NAME=('CUSTOMER_NAME', 'first'),
+            STATUS=('STATUS', 'first'),
+            YEAR=('YEAR_ID', 'first'),
+            MONTH=('MONTH_ID', 'first'),
+            LINES=('ORDER_LINE_NUMBER', 'size'),
+        )
+        products = raw.groupby(PRODUCT_COLUMNS).size().rename('WEIGHT')
+        customers = (raw.drop_duplicates('CUSTOMER_NAME')[CUSTOMER_COLUMNS]
+                     .set_index('CUSTOMER_NAME'))
+        customers['WEIGHT'] = orders['CUSTOMER_NAME'].value_counts()
+        months = orders.groupby(['YEAR', 'MONTH']).size().rename('WEIGHT')
+        return cls(
+            rows=len(raw),
+            products=_normalized(products.reset_index()),
+            customers=_normalized(customers.reset_index()),
+            lines_per_order=orders['LINES'].to_numpy(),
+            statuses=orders['STATUS'].to_numpy(dtype=object),
+            quantities=raw['QUANTITY_ORDERED'].to_numpy(),
+            price_ratios=(raw['SALES'] / raw['QUANTITY_ORDERED']
+                          / raw['MSRP']).to_numpy(),
+            months=_normalized(months.reset_index()),
+        )
+
+    def customer_count(self, rows):
+        """Customers in a file of ``rows`` rows, at the sample's density."""
+        sample = len(self.customers)
+        return max(sample, round(sample * rows / self.rows))
+
+
+def _normalized(frame):
+    frame['WEIGHT'] = frame['WEIGHT'] / frame['WEIGHT'].sum()
+    return frame
+
+
+def _customer_table(profile, count):
+    # Clone the sample's customers until there are ``count`` of them
+    base = profile.customers
+    clone = np.arange(count) // len(base)
+    table = base.iloc[np.arange(count) % len(base)].reset_index(drop=True)
+    suffix = pd.Series(clone + 1, dtype=str).radd(' ').where(clone > 0, '')
+    table['CUSTOMER_NAME'] = table['CUSTOMER_NAME'] + suffix
+    table['WEIGHT'] = table['WEIGHT'] / table['WEIGHT'].sum()
+    return table
+
+
+def _order_dates(rng, profile, count):
+    month = profile.months.iloc[rng.choice(len(profile.months), count,
+                                           p=profile.months['WEIGHT'])]
+    start = pd.to_datetime(pd.DataFrame({'year': month['YEAR'].to_numpy(),
+                                         'month': month['MONTH'].to_numpy(),
+                                         'day': 1}))
+    days = start.dt.days_in_month.to_numpy()
+    offset = (rng.random(count) * days).astype(np.int64)
+    return (start + pd.to_timedelta(offset, unit='D')).to_numpy()
+
+
+def _format_dates(dates):
+    # Both layouts of the export, chosen by day of month as in the sample;
+    # formatted once per distinct date
+    distinct, inverse = np.unique(dates, return_inverse=True)
+    stamps = pd.DatetimeIndex(distinct)
+    dashed = stamps.strftime('%m-%d-%Y %H:%M')
+    slashed = [f'{stamp.month}/{stamp.day:02d}/{stamp.year} 0:00'
+               for stamp in stamps]
+    text = np.where(stamps.day <= 12, dashed, slashed).astype(object)
+    return text[inverse]
+
+
+def _order_products(rng, weights, lines):
+    # Distinct products per order, weighted, by the Gumbel top-k trick:
+    # the k largest of log(weight) + Gumbel noise are a weighted draw of k
+    # products without replacement
+    keys = np.log(weights) + rng.gumbel(size=(len(lines), len(weights)))
+    ranked = np.argsort(-keys, axis=1)
+    take = np.arange(ranked.shape[1]) < lines[:, None]
+    return ranked[take]
+
+
+def _order_chunk(rng, profile, customers, first_order, rows):
+    # Orders adding up to at least ``rows`` lines, lines of the last one cut
+    estimate = int(rows / profile.lines_per_order.mean() * 1.1) + 1
+    lines = rng.choice(profile.lines_per_order, estimate)
+    while lines.sum() < rows:
+        lines = np.concatenate([lines, rng.choice(profile.lines_per_order,
+                                                  estimate)])
+    count = int(np.searchsorted(np.cumsum(lines), rows) + 1)
+    lines = lines[:count]
+    lines[-1] -= lines.sum() - rows
+
+    order = np.repeat(np.arange(count), lines)
+    line_number = np.arange(rows) - np.repeat(np.cumsum(lines) - lines, lines) + 1
+    product = profile.products.iloc[
+        _order_products(rng, profile.products['WEIGHT'].to_numpy(), lines)]
+    customer = customers.iloc[
+        rng.choice(len(customers), count, p=customers['WEIGHT'])[order]]
+    dates = _order_dates(rng, profile, count)[order]
+    return order + first_order, line_number, product, customer, dates, count
+
+
+def generate(rows, seed=0, chunk_rows=1_000_000, profile=None, customers=None):
+    """Yield frames of a synthetic export, ``rows`` rows in all.
+
+    Each frame has at most ``chunk_rows`` rows in the raw export's columns
+    and text formats; the last order of a frame is cut short rather than
+    continued in the next. ``customers`` defaults to the sample's rows per
+    customer.
+    """
+    profile = profile or SampleProfile.from_csv()
+    rng = np.random.default_rng(seed)
+    table = _customer_table(profile, customers or profile.customer_count(rows))
+    first_order = FIRST_ORDER_NUMBER
+    for start in range(0, rows, chunk_rows):
+        size = min(chunk_rows, rows - start)
+        order, line_number, product, customer, dates, count = _order_chunk(
+            rng, profile, table, first_order, size)
+        first_order += count
+
+        quantity = rng.choice(profile.quantities, size)
+        msrp = product['MSRP'].to_numpy()
+        price = np.round(msrp * rng.choice(profile.price_ratios, size), 2)
+        sales = np.round(quantity * price, 2)
+        stamps = pd.DatetimeIndex(dates)
+        frame = pd.DataFrame({
+            'ORDER_NUMBER': order,
+            'QUANTITY_ORDERED': quantity,
+            'PRICE_EACH': np.minimum(price, PRICE_CAP),
+            'ORDER_LINE_NUMBER': line_number,
+            'SALES': sales,
+            'ORDER_DATE': _format_dates(dates),
+            'STATUS': rng.choice(profile.statuses, count)[order - order[0]],
+            'QTR_ID': stamps.quarter,
+            'MONTH_ID': stamps.month,
+            'YEAR_ID': stamps.year,
+            'PRODUCT_LINE': product['PRODUCT_LINE'].to_numpy(),
+            'MSRP': msrp,
+            'PRODUCT_CODE': product['PRODUCT_CODE'].to_numpy(),
+            'DEAL_SIZE': DEAL_SIZES[np.searchsorted(DEAL_SIZE_BINS, sales,
+                                                    side='right')],
+        })
+        for column in CUSTOMER_COLUMNS:
+            frame[column] = customer[column].to_numpy()
+        yield frame[COLUMNS]
+
+
+def write_csv(path, rows, seed=0, chunk_rows=1_000_000, **options):
+    """Write a synthetic export of ``rows`` rows to ``path``; returns ``path``."""
+    with open(path, 'w', encoding='latin-1', errors='replace', newline='') as out:
+        for number, frame in enumerate(generate(rows, seed, chunk_rows, **options)):
+            frame.to_csv(out, header=number == 0, index=False)
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('rows', type=lambda text: int(float(text)))
+    parser.add_argument('path')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    write_csv(args.path, args.rows, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,246 @@
+"""Sales over time: period series and rolling windows.
+
+``sales_series`` sums ``SALES`` per day, week or month of ``ORDER_DATE``,
+optionally one column per ``PRODUCT_LINE``, ``COUNTRY`` or other group,
+with every period from the first to the last present (zero where nothing
+was sold). On such a regular series a window of ``w`` rows is ``w`` days
+(weeks, months), which the notebook's ``df['SALES'].rolling(3)`` over rows
+in file order is not.
+
+``rolling_stats`` computes the mean, sum and standard deviation of several
+windows at once, vectorized over the whole series.
+``RollingWindows`` keeps the last values and the running sums of every
+window, so appending the next period costs O(windows), not a recompute::
+
+    daily = sales_series(df, freq='D')
+    history = rolling_stats(daily, windows=[7, 30, 90])
+    windows = RollingWindows.from_series(daily, windows=[7, 30, 90])
+    windows.extend(sales_series(new_rows, freq='D'))
+"""
+
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+
+from csa.trace import traced
+
+WINDOWS = (7, 30, 90)
+STATS = ('mean', 'sum', 'std')
+
+
+def _columns(windows, stats, groups):
+    names = [f'{stat}_{window}' for window in windows for stat in stats]
+    if groups is None:
+        return pd.Index(names)
+    return pd.MultiIndex.from_product([groups, names])
+
+
+def _as_matrix(series):
+    # (periods, groups) float values and the group labels (None for a Series)
+    if isinstance(series, pd.DataFrame):
+        return series.to_numpy(dtype=np.float64), series.columns
+    return series.to_numpy(dtype=np.float64)[:, None], None
+
+
+@traced('timeseries')
+def sales_series(df, freq='D', by=None, measure='SALES'):
+    """``measure`` summed per ``freq`` period (``'D'``, ``'W'``, ``'M'``, or
+    any pandas period alias) of ``ORDER_DATE``.
+
+    Returns a Series indexed by the start of each period, or with ``by`` a
+    DataFrame with one column per group. Rows without a date (or group)
+    are left out.
+    """
+    dates = df['ORDER_DATE']
+    keep = dates.notna().to_numpy()
+    values = np.nan_to_num(df[measure].to_numpy(dtype=np.float64)[keep])
+    ordinals = pd.PeriodIndex(dates[keep], freq=freq).asi8
+    if not len(ordinals):
+        return pd.Series([], index=pd.DatetimeIndex([], name='ORDER_DATE'),
+                         dtype=np.float64, name=measure)
+    first = ordinals.min()
+    count = int(ordinals.max() - first + 1)
+    index = pd.period_range(pd.Period(ordinal=first, freq=freq), periods=count)
+    index = index.to_timestamp().rename('ORDER_DATE')
+    if by is None:
+        totals = np.bincount(ordinals - first, weights=values, minlength=count)
+        return pd.Series(totals, index=index, name=measure)
+
+    codes, groups = pd.factorize(df[by][keep], sort=True)
+    has_group = codes >= 0
+    cells = (ordinals - first)[has_group] * len(groups) + codes[has_group]
+    totals = np.bincount(cells, weights=values[has_group],
+                         minlength=count * len(groups))
+    return pd.DataFrame(totals.reshape(count, len(groups)), index=index,
+                        columns=pd.Index(groups, name=by))
+
+
+@traced('rolling')
+def rolling_stats(series, windows=WINDOWS, stats=STATS):
+    """Rolling ``stats`` over each of ``windows`` periods of ``series``.
+
+    Matches ``series.rolling(window).agg(stats)`` (NaN until a window is
+    full, sample standard deviation) for every window. Sums and means of
+    all windows come from one cumulative sum; standard deviations are
+    taken over strided views of the windows, without copying them, because
+    a difference of cumulative sums of squares loses the small variances.
+    Columns are ``'<stat>_<window>'``, under each group for a DataFrame of
+    groups.
+    """
+    values, groups = _as_matrix(series)
+    periods, width = values.shape
+    # Shifted by their mean, the cumulative sums stay small
+    shift = np.nan_to_num(np.nanmean(values, axis=0)) if periods else 0
+    sums = np.zeros((periods + 1, width))
+    np.cumsum(values - shift, axis=0, out=sums[1:])
+
+    result = np.full((periods, width, len(windows), len(stats)), np.nan)
+    for i, window in enumerate(windows):
+        if window > periods:
+            continue
+        total = sums[window:] - sums[:-window] + window * shift
+        for j, stat in enumerate(stats):
+            if stat == 'std':
+                views = sliding_window_view(values, window, axis=0)
+                column = views.std(axis=-1, ddof=1) if window > 1 else np.nan
+            else:
+                column = _stat(stat, total, window)
+            result[window - 1:, :, i, j] = column
+    return pd.DataFrame(result.reshape(periods, -1), index=series.index,
+                        columns=_columns(windows, stats, groups))
+
+
+def _stat(stat, total, window, m2=None):
+    # One statistic of a full window from its sum (and squared deviations)
+    if stat == 'sum':
+        return total
+    if stat == 'mean':
+        return total / window
+    if stat == 'std':
+        if window < 2:
+            return np.full_like(total, np.nan)
+        return np.sqrt(np.maximum(m2, 0) / (window - 1))
+    raise ValueError(f'unknown statistic {stat!r}, expected one of {STATS}')
+
+
+class RollingWindows:
+    """Mean and squared deviations of several windows over a period series,
+    advanced one period at a time.
+
+    The last ``max(windows)`` values sit in a ring buffer. Appending a
+    period replaces the value leaving each window with the new one in the
+    window's mean and sum of squared deviations (Welford's update), in
+    O(1) per window. Every ``window`` periods both are recomputed from the
+    buffer, O(1) amortized, so rounding errors don't build up.
+    """
+
+    def __init__(self, windows=WINDOWS, stats=STATS, groups=None, freq='D'):
+        self.windows = list(windows)
+        self.stats = list(stats)
+        self.groups = groups
+        self.freq = freq
+        width = 1 if groups is None else len(groups)
+        self.buffer = np.zeros((max(self.windows), width))
+        self.count = 0
+        self.last = None
+        # Length of the run of equal values ending at the latest one: a
+        # window inside it has no deviation at all (as pandas reports it)
+        self.run = np.zeros(width, dtype=np.int64)
+        self.means, self.m2 = {}, {}
+        for window in self.windows:
+            self._resync(window)
+
+    @classmethod
+    def from_series(cls, series, windows=WINDOWS, stats=STATS, freq='D'):
+        """Windows positioned at the end of ``series`` (a ``sales_series``
+        result of the same ``freq``), ready to ``extend`` with the periods
+        that follow it. Only the last ``max(windows)`` periods are read."""
+        values, groups = _as_matrix(series)
+        rolling = cls(windows, stats, groups, freq=freq)
+        size = len(rolling.buffer)
+        tail = np.nan_to_num(values[-size:])
+        rolling.buffer[np.arange(len(values) - len(tail), len(values)) % size] = tail
+        rolling.count = len(values)
+        for previous, row in zip(np.concatenate([tail[:1], tail[:-1]]), tail):
+            rolling._track_run(row, previous)
+        rolling.last = series.index[-1] if len(series) else None
+        for window in rolling.windows:
+            rolling._resync(window)
+        return rolling
+
+    def _window(self, window):
+        # The last ``window`` values (fewer at the start), oldest first
+        size = len(self.buffer)
+        filled = min(self.count, window)
+        return self.buffer[np.arange(self.count - filled, self.count) % size]
+
+    def _resync(self, window):
+        values = self._window(window)
+        mean = values.mean(axis=0) if len(values) else np.zeros(self.buffer.shape[1])
+        self.means[window] = mean
+        self.m2[window] = ((values - mean) ** 2).sum(axis=0)
+
+    def _track_run(self, x, previous):
+        same = (x == previous) & (self.run > 0)
+        self.run = np.where(same, self.run + 1, 1)
+
+    def append(self, values):
+        """Add the next period's value (one per group)."""
+        size = len(self.buffer)
+        x = np.nan_to_num(np.asarray(values, dtype=np.float64))
+        self._track_run(x, self.buffer[(self.count - 1) % size])
+        for window in self.windows:
+            mean = self.means[window]
+            if self.count < window:
+                delta = x - mean
+                self.means[window] = mean + delta / (self.count + 1)
+                self.m2[window] += delta * (x - self.means[window])
+            else:
+                old = self.buffer[(self.count - window) % size]
+                delta = x - old
+                self.means[window] = mean + delta / window
+                self.m2[window] += delta * (x - self.means[window] + old - mean)
+        self.buffer[self.count % size] = x
+        self.count += 1
+        for window in self.windows:
+            if self.count % window == 0:
+                self._resync(window)
+
+    def current(self):
+        """The stats of the latest period, laid out like a ``rolling_stats``
+        row (NaN for windows not yet full)."""
+        values = np.full((self.buffer.shape[1], len(self.windows),
+                          len(self.stats)), np.nan)
+        for i, window in enumerate(self.windows):
+            if self.count < window:
+                continue
+            total = self.means[window] * window
+            m2 = np.where(self.run >= window, 0, self.m2[window])
+            for j, stat in enumerate(self.stats):
+                values[:, i, j] = _stat(stat, total, window, m2)
+        return pd.Series(values.ravel(),
+                         index=_columns(self.windows, self.stats, self.groups))
+
+    def extend(self, series):
+        """Append the periods of ``series`` (starting after the last period
+        seen, gaps counting as zero sales); returns their stats like
+        ``rolling_stats``."""
+        if isinstance(series, pd.DataFrame) and self.groups is not None:
+            series = series.reindex(columns=self.groups, fill_value=0)
+        if self.last is not None and len(series):
+            if series.index[0] <= self.last:
+                raise ValueError(f'periods from {series.index[0]} are not after '
+                                 f'the last one seen, {self.last}')
+            start = pd.Period(self.last, freq=self.freq) + 1
+            periods = pd.period_range(start, pd.Period(series.index[-1],
+                                                       freq=self.freq))
+            series = series.reindex(periods.to_timestamp(), fill_value=0)
+        values, _ = _as_matrix(series)
+        rows = []
+        for row in values:
+            self.append(row)
+            rows.append(self.current())
+        if len(series):
+            self.last = series.index[-1]
+        return pd.DataFrame(rows, index=series.index,
+                            columns=_columns(self.windows, self.stats, self.groups))
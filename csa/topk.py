@@ -0,0 +1,132 @@
+"""Top-K selection and leaderboards without sorting whole tables.
+
+``series.sort_values(ascending=False).head(k)`` sorts every customer or
+product code to keep ``k`` of them. ``top_k`` selects them by partition
+(``np.partition``, O(n)) and sorts only those ``k``, with the same result
+as a stable sort: ties in their original order, NaN last.
+
+A ``Leaderboard`` keeps the per-group totals (or distinct counts) of a
+stream of chunks, like the accumulators of ``csa.ingest``, and its current
+top ``k``. While values can only grow, as sums of positive sales and
+distinct counts do, a chunk can only promote the groups it touches, so the
+new top is selected among the old top and those groups alone::
+
+    board = Leaderboard('PRODUCT_CODE', 'PROFIT', k=10)
+    for chunk in chunks:
+        board.update(chunk)
+    board.top()
+
+``LEADERBOARDS`` names the usual ones: top customers by sales, product
+codes by profit and countries by distinct customers.
+"""
+
+import numpy as np
+import pandas as pd
+
+from csa.accumulators import DistinctAccumulator, SumAccumulator
+
+DEFAULT_K = 10
+# name -> (group by, summed measure, or None for distinct values of...)
+LEADERBOARDS = {
+    'top_customers': ('CUSTOMER_NAME', 'SALES', None),
+    'top_products': ('PRODUCT_CODE', 'PROFIT', None),
+    'top_countries': ('COUNTRY', None, 'CUSTOMER_NAME'),
+}
+
+
+def top_positions(values, k, ascending=False):
+    """Positions of the ``k`` largest (``ascending``: smallest) of
+    ``values``, in order, ties by position and NaN last."""
+    values = np.asarray(values, dtype=np.float64)
+    valid = np.flatnonzero(~np.isnan(values))
+    # Smallest key first either way
+    keys = values[valid] if ascending else -values[valid]
+    if 0 < k < len(keys):
+        kth = np.partition(keys, k - 1)[k - 1]
+        # Every value up to the k-th, ties included, then sort those only
+        chosen = np.flatnonzero(keys <= kth)
+    else:
+        chosen = np.arange(len(keys))
+    order = chosen[np.lexsort((chosen, keys[chosen]))][:max(k, 0)]
+    positions = valid[order]
+    if len(positions) < k:
+        missing = np.flatnonzero(np.isnan(values))[:k - len(positions)]
+        positions = np.concatenate([positions, missing])
+    return positions
+
+
+def top_k(series, k=DEFAULT_K, ascending=False):
+    """``series.sort_values(ascending=ascending, kind='stable').head(k)``."""
+    return series.iloc[top_positions(series.to_numpy(), k, ascending)]
+
+
+def top_rows(df, column, k=DEFAULT_K, ascending=False):
+    """``df.sort_values(column, ascending=ascending, kind='stable').head(k)``."""
+    return df.iloc[top_positions(df[column].to_numpy(), k, ascending)]
+
+
+class Leaderboard:
+    """The top ``k`` groups of ``by`` by the sum of ``measure``, or by the
+    number of distinct values of ``distinct``, over the rows seen so far."""
+
+    def __init__(self, by, measure=None, k=DEFAULT_K, distinct=None,
+                 ascending=False):
+        if (measure is None) == (distinct is None):
+            raise ValueError('a leaderboard ranks by a measure or by distinct '
+                             'values, give exactly one')
+        self.by = by
+        self.k = k
+        self.ascending = ascending
+        self.accumulator = (SumAccumulator(by, measure) if distinct is None
+                            else DistinctAccumulator([by, distinct]))
+        self.labels = pd.Index([])
+
+    @classmethod
+    def named(cls, name, k=DEFAULT_K):
+        """One of ``LEADERBOARDS``."""
+        by, measure, distinct = LEADERBOARDS[name]
+        return cls(by, measure, k, distinct)
+
+    def values(self):
+        """The value of every group seen, in label order."""
+        if isinstance(self.accumulator, DistinctAccumulator):
+            return self.accumulator.count(by=self.by)
+        totals = self.accumulator.result()
+        return totals if totals is not None else pd.Series(dtype=np.float64)
+
+    def update(self, frame):
+        """Fold in a chunk of rows."""
+        if isinstance(self.accumulator, DistinctAccumulator):
+            self.accumulator.update(frame)
+            grows = True
+        else:
+            part = frame.groupby(self.by, observed=True)[
+                self.accumulator.measure].sum()
+            self.accumulator.add(part)
+            grows = bool((part >= 0).all())
+        touched = pd.Index(frame[self.by].unique())
+        # Growing values can't push an untouched group past the old top
+        self._select(touched if grows and not self.ascending else None)
+        return self
+
+    def merge(self, other):
+        """Combine with the leaderboard of another chunk or shard."""
+        self.accumulator.merge(other.accumulator)
+        self._select(None)
+        return self
+
+    def _select(self, touched):
+        values = self.values()
+        if touched is not None:
+            values = values[values.index.isin(self.labels)
+                            | values.index.isin(touched)]
+        self.labels = top_k(values, self.k, self.ascending).index
+
+    def top(self):
+        """The top groups and their values, best first."""
+        return self.values().loc[self.labels]
+
+
+def leaderboard(df, name, k=DEFAULT_K):
+    """Leaderboard ``name`` (see ``LEADERBOARDS``) of an in-memory frame."""
+    return Leaderboard.named(name, k).update(df).top()
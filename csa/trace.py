@@ -0,0 +1,297 @@
+"""Per-stage timing and memory instrumentation.
+
+The pipeline's stages (ingest, clean, derive, profit, each rollup, pivot,
+customers, RFM, CLV, render) are wrapped with ``traced`` or ``stage``.
+While a ``Tracer`` is enabled each of them records its wall and CPU time,
+resident memory at entry and the peak above it (sampled by a background
+thread), the input and output row counts, and its nesting depth within its
+thread. Disabled, which is the default, a stage costs one global lookup
+and, for ``stage``, an empty placeholder object.
+
+Stages may run in several threads at once (the report server's pool).
+Stages run in worker processes are not captured: the shard analysis of
+``csa.parallel`` and the charts rendered by ``csa.charts`` with
+``workers > 1`` appear as the one stage around the pool in the parent.
+
+Records export to a JSON file, or to a Chrome trace (``chrome://tracing``,
+Perfetto, speedscope) that shows the stages as a flame graph::
+
+    from csa import trace
+
+    tracer = trace.enable()
+    df = load('sales_data_sample.csv')
+    ...
+    trace.disable()
+    tracer.write_json('trace.json')
+    tracer.write_chrome_trace('trace.chrome.json')
+
+Setting ``CSA_TRACE=trace.json`` (and optionally
+``CSA_TRACE_CHROME=trace.chrome.json``) traces a whole run, e.g. of the
+notebook's script, and writes the files when the interpreter exits.
+"""
+
+import atexit
+import functools
+import json
+import os
+import platform
+import threading
+import time
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+_tracer = None
+
+
+def current_rss():
+    """Resident set size of this process in bytes, ``None`` if unknown."""
+    try:
+        with open('/proc/self/statm') as statm:
+            return int(statm.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+@dataclass
+class StageRecord:
+    """Measurements of one run of one stage."""
+
+    name: str
+    start_us: float   # since the tracer was created
+    wall_s: float
+    cpu_s: float
+    rss_start: Optional[int]
+    peak_rss_delta: Optional[int]
+    rows_in: Optional[int]
+    rows_out: Optional[int]
+    depth: int
+    pid: int
+    tid: int
+
+
+class _Stage:
+    """A stage being measured; set ``rows_out`` on it before it ends."""
+
+    def __init__(self, tracer, name, rows_in):
+        self.tracer = tracer
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+
+    def __enter__(self):
+        self.rss_start = self.peak = current_rss()
+        self.depth = self.tracer._enter(self)
+        self.cpu = time.process_time()
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter_ns()
+        cpu = time.process_time() - self.cpu
+        tracer = self.tracer
+        tracer._exit(self)
+        rss = current_rss()
+        if rss is not None:
+            self.peak = max(self.peak, rss)
+        record = StageRecord(
+            name=self.name,
+            start_us=(self.start - tracer.origin) / 1e3,
+            wall_s=(end - self.start) / 1e9,
+            cpu_s=cpu,
+            rss_start=self.rss_start,
+            peak_rss_delta=(None if self.rss_start is None
+                            else self.peak - self.rss_start),
+            rows_in=self.rows_in,
+            rows_out=self.rows_out,
+            depth=self.depth,
+            pid=os.getpid(),
+            tid=threading.get_ident(),
+        )
+        with tracer._lock:
+            tracer.records.append(record)
+        return False
+
+
+class _NullStage:
+    """What ``stage`` returns while tracing is off: does nothing. A new
+    one per call, as callers set ``rows_out`` on it."""
+
+    __slots__ = ('rows_out',)
+
+    def __init__(self):
+        self.rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class Tracer:
+    """Collects ``StageRecord``s; samples memory while stages are open."""
+
+    def __init__(self, sample_interval=0.005):
+        self.sample_interval = sample_interval
+        self.records = []
+        self.origin = time.perf_counter_ns()
+        # Open stages of all threads, for the sampler, and of each thread,
+        # for the nesting depth
+        self._open = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._stopped = threading.Event()
+        self._sampler = None
+
+    def stage(self, name, rows_in=None):
+        if self._sampler is None and current_rss() is not None:
+            self._stopped.clear()
+            self._sampler = threading.Thread(target=self._sample, daemon=True,
+                                             name='csa-trace-sampler')
+            self._sampler.start()
+        return _Stage(self, name, rows_in)
+
+    def _enter(self, open_stage):
+        # Depth of the new stage in its thread
+        stack = self._local.__dict__.setdefault('stack', [])
+        stack.append(open_stage)
+        with self._lock:
+            self._open.append(open_stage)
+        return len(stack) - 1
+
+    def _exit(self, open_stage):
+        self._local.stack.remove(open_stage)
+        with self._lock:
+            self._open.remove(open_stage)
+
+    def _sample(self):
+        while not self._stopped.wait(self.sample_interval):
+            if not self._open:
+                continue
+            rss = current_rss()
+            with self._lock:
+                open_stages = list(self._open)
+            for open_stage in open_stages:
+                open_stage.peak = max(open_stage.peak, rss)
+
+    def close(self):
+        """Stop the memory sampler."""
+        self._stopped.set()
+        if self._sampler is not None:
+            self._sampler.join()
+            self._sampler = None
+
+    def summary(self):
+        """Total wall and CPU seconds and call count per stage name, as text."""
+        totals = {}
+        for record in self.records:
+            wall, cpu, calls = totals.get(record.name, (0.0, 0.0, 0))
+            totals[record.name] = (wall + record.wall_s, cpu + record.cpu_s,
+                                   calls + 1)
+        lines = [f'{"stage":<40} {"wall s":>9} {"cpu s":>9} {"calls":>6}']
+        for name, (wall, cpu, calls) in sorted(totals.items(),
+                                               key=lambda item: -item[1][0]):
+            lines.append(f'{name:<40} {wall:9.3f} {cpu:9.3f} {calls:6d}')
+        return '\n'.join(lines)
+
+    def write_json(self, path):
+        """Write the records, with the Python and platform versions, as JSON."""
+        document = {
+            'meta': {'python': platform.python_version(),
+                     'platform': platform.platform(),
+                     'cpu_count': os.cpu_count()},
+            'stages': [asdict(record) for record in self.records],
+        }
+        with open(path, 'w') as out:
+            json.dump(document, out, indent=1)
+        return path
+
+    def write_chrome_trace(self, path):
+        """Write the records in the Chrome trace event format."""
+        events = [{
+            'name': record.name, 'cat': 'stage', 'ph': 'X',
+            'ts': record.start_us, 'dur': record.wall_s * 1e6,
+            'pid': record.pid, 'tid': record.tid,
+            'args': {'cpu_s': record.cpu_s,
+                     'peak_rss_delta': record.peak_rss_delta,
+                     'rows_in': record.rows_in, 'rows_out': record.rows_out},
+        } for record in self.records]
+        with open(path, 'w') as out:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, out)
+        return path
+
+
+def enable(tracer=None):
+    """Start recording stages into ``tracer`` (a new one by default)."""
+    global _tracer
+    _tracer = tracer or Tracer()
+    return _tracer
+
+
+def disable():
+    """Stop recording; returns the tracer that was active, if any."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is not None:
+        tracer.close()
+    return tracer
+
+
+def stage(name, rows_in=None):
+    """Context manager measuring the block as stage ``name`` while enabled."""
+    tracer = _tracer
+    if tracer is None:
+        return _NullStage()
+    return tracer.stage(name, rows_in)
+
+
+def _rows(value):
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    shape = getattr(value, 'shape', None)
+    return shape[0] if shape else None
+
+
+def traced(name):
+    """Decorator measuring every call as stage ``name`` while enabled.
+
+    Row counts are taken from the first argument and from the result (or
+    its first element, for functions returning a tuple) when they are
+    frames or arrays.
+    """
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _tracer.stage(name, _rows(args[0]) if args else None) as run:
+                result = function(*args, **kwargs)
+                run.rows_out = _rows(result)
+            return result
+        return wrapper
+    return decorate
+
+
+def _enable_from_environment():
+    json_path = os.environ.get('CSA_TRACE')
+    chrome_path = os.environ.get('CSA_TRACE_CHROME')
+    if not (json_path or chrome_path):
+        return
+    # Worker processes inherit the environment; only the process that saw it
+    # first writes the files
+    owner = os.environ.setdefault('CSA_TRACE_OWNER', str(os.getpid()))
+    if owner != str(os.getpid()):
+        return
+    tracer = enable()
+
+    def write():
+        disable()
+        if json_path:
+            tracer.write_json(json_path)
+        if chrome_path:
+            tracer.write_chrome_trace(chrome_path)
+
+    atexit.register(write)
+
+
+_enable_from_environment()